@@ -1,9 +1,23 @@
 import streamlit as st
-import re
-import random
-import zipfile
 import io
-from xml.dom import minidom
+import os
+import uuid
+
+from tronde import BundleCache, bundle_base_name, bundle_key, configure_json_logging, regenerate_version
+from tronde.cache import lineage_key
+from tronde.compression import DEFAULT_PRESET, PRESETS
+from tronde.bundle import plan_source
+from tronde.incremental import BundleUpdate, read_manifest
+from tronde.preview import preview_html
+from tronde.template import ExamTemplate
+from tronde.jobs import CANCELLED, ERROR, QUEUED, JobQueue
+from tronde.bank import PARTS as BANK_PARTS, QuestionBank
+from tronde.grading import grade, grading_xlsx_bytes, load_answer_key, read_table
+from tronde.roster import Roster, version_filename
+from tronde.sampler import SamplerConstraints
+
+# Số liệu mỗi lần trộn được ghi ra log máy chủ (stderr), mỗi dòng 1 bản ghi JSON
+configure_json_logging()
 
 # ==================== CẤU HÌNH TRANG ====================
 
@@ -109,460 +123,150 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ==================== LOGIC XỬ LÝ WORD (CORE) ====================
-
-W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
-
-def shuffle_array(arr):
-    out = arr.copy()
-    for i in range(len(out) - 1, 0, -1):
-        j = random.randint(0, i)
-        out[i], out[j] = out[j], out[i]
-    return out
+# ==================== GIAO DIỆN STREAMLIT ====================
+@st.cache_resource
+def get_bundle_cache():
+    """Cache gói .zip trên đĩa, dùng chung cho mọi phiên"""
+    return BundleCache()
 
-def get_text(block):
-    texts = []
-    t_nodes = block.getElementsByTagNameNS(W_NS, "t")
-    for t in t_nodes:
-        if t.firstChild and t.firstChild.nodeValue:
-            texts.append(t.firstChild.nodeValue)
-    return "".join(texts).strip()
+@st.cache_resource
+def get_job_queue():
+    """Hàng đợi trộn đề dùng chung cho mọi phiên: 1 pool tiến trình, chia lượt công bằng giữa các phiên"""
+    return JobQueue(get_bundle_cache(), workers=os.cpu_count() or 1)
 
-def is_marked_correct(node):
-    """Kiểm tra gạch chân, màu đỏ, highlight"""
-    u_nodes = node.getElementsByTagNameNS(W_NS, "u")
-    for u in u_nodes:
-        val = u.getAttributeNS(W_NS, "val")
-        if val and val != "none": return True
-    
-    color_nodes = node.getElementsByTagNameNS(W_NS, "color")
-    for c in color_nodes:
-        val = c.getAttributeNS(W_NS, "val")
-        if val and val not in ["auto", "000000"]: return True
-            
-    highlight_nodes = node.getElementsByTagNameNS(W_NS, "highlight")
-    for h in highlight_nodes:
-        val = h.getAttributeNS(W_NS, "val")
-        if val and val != "none": return True
-    
-    shd_nodes = node.getElementsByTagNameNS(W_NS, "shd")
-    for s in shd_nodes:
-        val = s.getAttributeNS(W_NS, "fill")
-        if val and val not in ["auto", "FFFFFF", "000000"]: return True
+def session_id():
+    if "session_id" not in st.session_state: st.session_state["session_id"] = uuid.uuid4().hex
+    return st.session_state["session_id"]
 
-    return False
+STAGE_NAMES = {
+    "unzip": "Giải nén", "parse": "Đọc XML", "segment": "Phân đoạn", "shuffle": "Hoán vị",
+    "relabel": "Đổi nhãn", "serialize": "Ghép XML", "rezip": "Nén file", "answer_key": "Bảng đáp án",
+}
 
-# --- HÀM LỌC ĐÁP ÁN P3: CẮT BỎ CÁC TỪ THỪA ---
-def extract_highlighted_text(blocks):
-    """Lấy text đáp án và làm sạch"""
-    extracted_text = []
-    for block in blocks:
-        runs = block.getElementsByTagNameNS(W_NS, "r")
-        for run in runs:
-            if is_marked_correct(run): 
-                t_nodes = run.getElementsByTagNameNS(W_NS, "t")
-                for t in t_nodes:
-                    if t.firstChild and t.firstChild.nodeValue:
-                        extracted_text.append(t.firstChild.nodeValue)
-    
-    full_text = "".join(extracted_text).strip()
-    
-    # Lọc bỏ "Câu 1.", "Câu 1:", "ĐS:", "Đáp số:", "KQ:"...
-    full_text = re.sub(r'^(Câu\s*\d+[\.\:]\s*)?', '', full_text, flags=re.IGNORECASE)
-    full_text = re.sub(r'^(ĐS|Đáp số|Đáp án|KQ|Kết quả)[\.\:]?\s*', '', full_text, flags=re.IGNORECASE)
-    
-    return full_text.strip()
+def show_metrics(metrics):
+    """Bảng chi tiết 1 lần trộn: kích thước, số khối/câu/run, ảnh, thời gian từng bước, bộ nhớ"""
+    with st.expander("🔍 Chi tiết xử lý", expanded=False):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("File gốc", f"{metrics.bytes_in / 1024:,.0f} KB")
+        c2.metric("Gói tải về", f"{metrics.bytes_out / 1024:,.0f} KB")
+        c3.metric("Thời gian", f"{metrics.seconds:.2f} s")
+        c4.metric("Bộ nhớ đỉnh", f"{metrics.peak_rss_mb or 0:,.0f} MB")
+        st.caption(f"{metrics.blocks} khối · {metrics.questions} câu hỏi · {metrics.runs} run · "
+                   f"{metrics.media} ảnh ({metrics.media_bytes / 1024:,.0f} KB) · {metrics.workers} tiến trình")
+        stages = [(STAGE_NAMES.get(name, name), round(seconds * 1000, 1)) for name, seconds in metrics.as_dict()["stages"].items()]
+        st.table({"Bước": [name for name, _ in stages], "Thời gian (ms)": [ms for _, ms in stages]})
+        if metrics.error: st.warning(metrics.error)
 
-def style_run_blue_bold(run):
-    doc = run.ownerDocument
-    rPr_list = run.getElementsByTagNameNS(W_NS, "rPr")
-    if rPr_list: rPr = rPr_list[0]
+@st.fragment(run_every=1.0)
+def show_job_progress(job_id):
+    """Tiến độ job đang chờ/chạy, tự cập nhật mỗi giây; job xong thì chạy lại cả trang để hiện kết quả"""
+    job = get_job_queue().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    if job.state == QUEUED:
+        ahead = get_job_queue().position(job)
+        st.progress(0.0, text=f"⏳ Đang chờ đến lượt ({ahead} yêu cầu phía trước)..." if ahead else "⏳ Đang chờ đến lượt...")
     else:
-        rPr = doc.createElementNS(W_NS, "w:rPr")
-        run.insertBefore(rPr, run.firstChild)
-    
-    color_list = rPr.getElementsByTagNameNS(W_NS, "color")
-    if color_list: color_el = color_list[0]
-    else:
-        color_el = doc.createElementNS(W_NS, "w:color")
-        rPr.appendChild(color_el)
-    color_el.setAttributeNS(W_NS, "w:val", "0000FF")
-    
-    b_list = rPr.getElementsByTagNameNS(W_NS, "b")
-    if not b_list:
-        b_el = doc.createElementNS(W_NS, "w:b")
-        rPr.appendChild(b_el)
-
-def update_mcq_label(paragraph, new_label):
-    t_nodes = paragraph.getElementsByTagNameNS(W_NS, "t")
-    if not t_nodes: return
-    new_letter = new_label[0].upper(); new_punct = "."
-    for i, t in enumerate(t_nodes):
-        if not t.firstChild or not t.firstChild.nodeValue: continue
-        txt = t.firstChild.nodeValue
-        m = re.match(r'^(\s*)([A-D])(\s*[\.\)])?', txt, re.IGNORECASE)
-        if not m: continue
-        leading_space = m.group(1) or ""; after_match = txt[m.end():]
-        t.firstChild.nodeValue = leading_space + new_letter + new_punct + after_match
-        run = t.parentNode
-        if run and run.localName == "r": style_run_blue_bold(run)
-        found_punct_in_regex = bool(m.group(3))
-        if not found_punct_in_regex:
-            for j in range(i + 1, len(t_nodes)):
-                t2 = t_nodes[j]
-                if not t2.firstChild or not t2.firstChild.nodeValue: continue
-                txt2 = t2.firstChild.nodeValue
-                if re.match(r'^[\.\)]', txt2): t2.firstChild.nodeValue = txt2[1:]; break
-                elif re.match(r'^\s*$', txt2): continue
-                else: break
-        break
-
-def update_tf_label(paragraph, new_label):
-    t_nodes = paragraph.getElementsByTagNameNS(W_NS, "t")
-    if not t_nodes: return
-    new_letter = new_label[0].lower(); new_punct = ")"
-    for i, t in enumerate(t_nodes):
-        if not t.firstChild or not t.firstChild.nodeValue: continue
-        txt = t.firstChild.nodeValue
-        m = re.match(r'^(\s*)([a-d])(\s*[\.\)])?', txt, re.IGNORECASE)
-        if not m: continue
-        leading_space = m.group(1) or ""; after_match = txt[m.end():]
-        t.firstChild.nodeValue = leading_space + new_letter + new_punct + after_match
-        run = t.parentNode
-        if run and run.localName == "r": style_run_blue_bold(run)
-        found_punct_in_regex = bool(m.group(3))
-        if not found_punct_in_regex:
-            for j in range(i + 1, len(t_nodes)):
-                t2 = t_nodes[j]
-                if not t2.firstChild or not t2.firstChild.nodeValue: continue
-                txt2 = t2.firstChild.nodeValue
-                if re.match(r'^\)', txt2): t2.firstChild.nodeValue = txt2[1:]; break
-                elif re.match(r'^\s*$', txt2): continue
-                else: break
-        break
+        text = f"🚀 Đã trộn xong mã đề {job.current_code} ({job.done}/{job.total})" if job.done else "🚀 Đang xử lý và tạo bảng đáp án..."
+        st.progress(job.progress, text=text)
+    if st.button("⛔ HỦY", key=f"cancel_{job_id}"):
+        get_job_queue().cancel(job_id, session_id())
+        st.rerun()
 
-def update_question_label(paragraph, new_label):
-    t_nodes = paragraph.getElementsByTagNameNS(W_NS, "t")
-    if not t_nodes: return
-    for i, t in enumerate(t_nodes):
-        if not t.firstChild or not t.firstChild.nodeValue: continue
-        txt = t.firstChild.nodeValue
-        m = re.match(r'^(\s*)(Câu\s*)(\d+)(\.)?', txt, re.IGNORECASE)
-        if not m: continue
-        leading_space = m.group(1) or ""; after_match = txt[m.end():]
-        t.firstChild.nodeValue = leading_space + new_label + after_match
-        run = t.parentNode
-        if run and run.localName == "r": style_run_blue_bold(run)
-        for j in range(i + 1, len(t_nodes)):
-            t2 = t_nodes[j]
-            if not t2.firstChild or not t2.firstChild.nodeValue: continue
-            txt2 = t2.firstChild.nodeValue
-            if re.match(r'^[\s0-9\.]*$', txt2) and txt2.strip(): t2.firstChild.nodeValue = ""
-            elif re.match(r'^\s*$', txt2): continue
-            else: break
-        break
-
-def find_part_index(blocks, part_number):
-    pattern = re.compile(rf'PHẦN\s*{part_number}\b', re.IGNORECASE)
-    for i, block in enumerate(blocks):
-        text = get_text(block)
-        if pattern.search(text): return i
-    return -1
-
-def parse_questions_in_range(blocks, start, end):
-    part_blocks = blocks[start:end]; intro = []; questions = []; i = 0
-    while i < len(part_blocks):
-        text = get_text(part_blocks[i])
-        if re.match(r'^Câu\s*\d+\b', text): break
-        intro.append(part_blocks[i]); i += 1
-    while i < len(part_blocks):
-        text = get_text(part_blocks[i])
-        if re.match(r'^Câu\s*\d+\b', text):
-            group = [part_blocks[i]]; i += 1
-            while i < len(part_blocks):
-                t2 = get_text(part_blocks[i])
-                if re.match(r'^Câu\s*\d+\b', t2): break
-                if re.match(r'^PHẦN\s*\d\b', t2, re.IGNORECASE): break
-                group.append(part_blocks[i]); i += 1
-            questions.append(group)
-        else: intro.append(part_blocks[i]); i += 1
-    return intro, questions
-
-def shuffle_mcq_options(question_blocks):
-    indices = []; correct_char = None
-    for i, block in enumerate(question_blocks):
-        text = get_text(block)
-        if re.match(r'^\s*[A-D][\.\)]', text, re.IGNORECASE): indices.append(i)
-    if len(indices) < 2: return question_blocks, None
-    original_options = [question_blocks[idx] for idx in indices]
-    marked_index = -1
-    for k, opt_block in enumerate(original_options):
-        if is_marked_correct(opt_block):
-            marked_index = k; break
-    shuffled_options = shuffle_array(original_options)
-    if marked_index != -1:
-        target_block = original_options[marked_index]
-        try:
-            new_pos = shuffled_options.index(target_block)
-            letters = ["A", "B", "C", "D"]
-            if new_pos < len(letters): correct_char = letters[new_pos]
-        except: pass
-    min_idx = min(indices); max_idx = max(indices)
-    return question_blocks[:min_idx] + shuffled_options + question_blocks[max_idx + 1:], correct_char
+def show_job_result(job):
+    if job.state == CANCELLED:
+        st.info("⛔ Đã hủy lượt trộn."); return
+    if job.state == ERROR:
+        st.error(f"❌ Lỗi: {job.error}"); return
+    if st.session_state.get("celebrated") != job.id:
+        st.balloons(); st.session_state["celebrated"] = job.id
+    if job.cached: st.success("⚡ Đề này đã được trộn trước đó với cùng cấu hình - tải lại ngay.")
+    if job.update and job.update["reused"]:
+        changed = len(job.update["changed_questions"])
+        st.info(f"♻️ Trộn lại từ lượt trước: giữ nguyên thứ tự câu và đáp án của mọi mã đề"
+                + (f", cập nhật {changed} câu đã sửa." if changed else ", chỉ cập nhật phần đã sửa."))
+    elif job.update:
+        st.warning("⚠️ Đề đã thêm/bớt câu hoặc phương án so với lượt trộn trước - các mã đề được trộn lại từ đầu.")
+    st.success("✅ THÀNH CÔNG! File tải về đã bao gồm Đề thi và Bảng đáp án (Word, Excel, CSV).")
+    try:
+        with open(job.path, "rb") as bundle:
+            st.download_button(label=f"📥 TẢI XUỐNG {job.filename}", data=bundle, file_name=job.filename,
+                               mime="application/zip", use_container_width=True)
+    except FileNotFoundError:   # gói đã bị dọn khỏi cache
+        st.warning("⚠️ Gói đã hết hạn trong bộ nhớ đệm - vui lòng bấm trộn lại.")
+    if not job.cached: show_metrics(job.metrics)
 
-def shuffle_tf_options(question_blocks):
-    option_indices = {}
-    for i, block in enumerate(question_blocks):
-        text = get_text(block)
-        m = re.match(r'^\s*([a-d])\)', text, re.IGNORECASE)
-        if m: option_indices[m.group(1).lower()] = i
-    abc_keys = [k for k in ['a', 'b', 'c'] if k in option_indices]
-    if len(abc_keys) < 2: return question_blocks, ""
-    items_to_shuffle = []
-    for k in abc_keys:
-        blk = question_blocks[option_indices[k]]
-        stat = 'Đ' if is_marked_correct(blk) else 'S'
-        items_to_shuffle.append({'block': blk, 'status': stat})
-    shuffled_items = shuffle_array(items_to_shuffle)
-    d_item = None
-    if 'd' in option_indices:
-        blk = question_blocks[option_indices['d']]
-        stat = 'Đ' if is_marked_correct(blk) else 'S'
-        d_item = {'block': blk, 'status': stat}
-    final_ordered_items = shuffled_items.copy()
-    if d_item: final_ordered_items.append(d_item)
-    ans_parts = [item['status'] for item in final_ordered_items]
-    ans_str = "-".join(ans_parts)
-    target_indices = sorted([v for k,v in option_indices.items() if k in ['a','b','c','d']])
-    new_blocks = question_blocks.copy()
-    for i, target_idx in enumerate(target_indices):
-        if i < len(final_ordered_items):
-            new_blocks[target_idx] = final_ordered_items[i]['block']
-    return new_blocks, ans_str
-
-def relabel_mcq_options(question_blocks):
-    letters = ["A", "B", "C", "D"]; option_blocks = []
-    for block in question_blocks:
-        text = get_text(block)
-        if re.match(r'^\s*[A-D][\.\)]', text, re.IGNORECASE): option_blocks.append(block)
-    for idx, block in enumerate(option_blocks):
-        letter = letters[idx] if idx < len(letters) else letters[-1]
-        update_mcq_label(block, f"{letter}.")
-
-def relabel_tf_options(question_blocks):
-    letters = ["a", "b", "c", "d"]; option_blocks = []
-    for block in question_blocks:
-        text = get_text(block)
-        if re.match(r'^\s*[a-d]\)', text, re.IGNORECASE): option_blocks.append(block)
-    for idx, block in enumerate(option_blocks):
-        letter = letters[idx] if idx < len(letters) else letters[-1]
-        update_tf_label(block, f"{letter})")
-
-def relabel_questions(questions, start_index=1):
-    for i, q_blocks in enumerate(questions):
-        if not q_blocks: continue
-        update_question_label(q_blocks[0], f"Câu {start_index + i}.")
-
-def process_part(blocks, start, end, part_type, start_number=1):
-    intro, questions = parse_questions_in_range(blocks, start, end)
-    questions_data = [] 
-    for q in questions:
-        if part_type == "PHAN1":
-            new_q_blocks, ans = shuffle_mcq_options(q)
-            questions_data.append((new_q_blocks, ans))
-        elif part_type == "PHAN2":
-            new_q_blocks, ans = shuffle_tf_options(q)
-            questions_data.append((new_q_blocks, ans))
-        elif part_type == "PHAN3":
-            ans = extract_highlighted_text(q) 
-            questions_data.append((q, ans))
+def show_question_bank(seed):
+    """Nạp file đề vào ngân hàng (SQLite) và ghép đề mới từ các câu đã lưu"""
+    bank_files = st.file_uploader("File đề nạp vào ngân hàng", type=["docx"], accept_multiple_files=True, key="bank_files")
+    tag_text = st.text_input("Thẻ gắn cho các câu (cách nhau bởi dấu phẩy), ví dụ: Toán 12, HK1", key="bank_tags")
+    if st.button("📥 NẠP VÀO NGÂN HÀNG", use_container_width=True):
+        if not bank_files:
+            st.warning("⚠️ Vui lòng chọn file Word cần nạp!")
         else:
-            questions_data.append((q, None))
-    shuffled_data = shuffle_array(questions_data)
-    final_questions_blocks = [x[0] for x in shuffled_data]
-    final_answers_list = [x[1] for x in shuffled_data]
-    relabel_questions(final_questions_blocks, start_number)
-    if part_type == "PHAN1":
-        for q in final_questions_blocks: relabel_mcq_options(q)
-    elif part_type == "PHAN2":
-        for q in final_questions_blocks: relabel_tf_options(q)
-    result = intro.copy()
-    for q in final_questions_blocks: result.extend(q)
-    part_answers = {}
-    for i, ans in enumerate(final_answers_list):
-        if ans: part_answers[start_number + i] = ans
-    next_number = start_number + len(final_questions_blocks)
-    return result, next_number, part_answers
+            tags = [tag.strip() for tag in tag_text.split(",") if tag.strip()]
+            with QuestionBank() as bank:
+                for bank_file in bank_files:
+                    report = bank.ingest(bank_file.getvalue(), bank_file.name, tags)
+                    st.write(f"**{bank_file.name}**: thêm {report.added} câu, trùng {report.duplicates} câu"
+                             + (f" - bỏ qua: {'; '.join(report.skipped)}" if report.skipped else ""))
+    with QuestionBank() as bank:
+        filter_tags = st.multiselect("Chỉ lấy câu có (mọi) thẻ", bank.tags(), key="bank_filter")
+        available = bank.counts(filter_tags)
+    columns = st.columns(len(BANK_PARTS)); counts = {}
+    for column, (part_type, (number, title, _)) in zip(columns, BANK_PARTS.items()):
+        with column:
+            counts[part_type] = st.number_input(f"PHẦN {number} (có {available[part_type]})", min_value=0,
+                                                max_value=available[part_type], value=0, key=f"bank_{part_type}")
+    if st.button("🧩 GHÉP ĐỀ TỪ NGÂN HÀNG", use_container_width=True):
+        with QuestionBank() as bank: docx_bytes, question_ids = bank.build(counts, filter_tags, seed)
+        st.success(f"✅ Đã ghép {len(question_ids)} câu - tải về rồi đưa vào bước 1 để trộn.")
+        st.download_button(label="📥 TẢI XUỐNG De_Ngan_Hang.docx", data=docx_bytes, file_name="De_Ngan_Hang.docx",
+                           mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                           use_container_width=True)
 
-def process_all_as_mcq(blocks):
-    intro, questions = parse_questions_in_range(blocks, 0, len(blocks))
-    questions_data = []
-    for q in questions:
-        b, a = shuffle_mcq_options(q)
-        questions_data.append((b, a))
-    shuffled = shuffle_array(questions_data)
-    final_blocks = [x[0] for x in shuffled]
-    final_ans = [x[1] for x in shuffled]
-    relabel_questions(final_blocks, 1)
-    for q in final_blocks: relabel_mcq_options(q)
-    result = intro.copy()
-    for q in final_blocks: result.extend(q)
-    answers = {}
-    for i, a in enumerate(final_ans):
-        if a: answers[i+1] = a
-    return result, answers
+def previous_manifest(lineage):
+    """Bản kê hoán vị của gói mới nhất cùng cấu hình (None nếu chưa trộn hoặc gói đã bị dọn)"""
+    path = get_bundle_cache().latest(lineage)
+    try:
+        return read_manifest(path) if path else None
+    except (OSError, ValueError):
+        return None
 
-def shuffle_docx(file_bytes, shuffle_mode="auto"):
-    input_buffer = io.BytesIO(file_bytes)
-    all_answers = {} 
-    with zipfile.ZipFile(input_buffer, 'r') as zin:
-        doc_xml = zin.read("word/document.xml").decode('utf-8')
-        dom = minidom.parseString(doc_xml)
-        body = dom.getElementsByTagNameNS(W_NS, "body")[0]
-        blocks = [c for c in body.childNodes if c.nodeType == c.ELEMENT_NODE and c.localName in ["p", "tbl"]]
-        
-        if shuffle_mode == "mcq":
-            new_blocks, ans = process_all_as_mcq(blocks)
-            all_answers["P1"] = ans
-        elif shuffle_mode == "tf":
-            new_blocks, _ = process_all_as_mcq(blocks)
-        else:
-            p1_idx = find_part_index(blocks, 1); p2_idx = find_part_index(blocks, 2)
-            p3_idx = find_part_index(blocks, 3); p4_idx = find_part_index(blocks, 4)
-            new_blocks = []; cursor = 0; curr_num = 1
-            if p1_idx >= 0:
-                new_blocks.extend(blocks[cursor:p1_idx + 1]); cursor = p1_idx + 1
-                end1 = len(blocks)
-                if p2_idx >= 0: end1 = p2_idx
-                elif p3_idx >= 0: end1 = p3_idx
-                elif p4_idx >= 0: end1 = p4_idx
-                p1_blocks, next_num, p1_ans = process_part(blocks, cursor, end1, "PHAN1", curr_num)
-                new_blocks.extend(p1_blocks)
-                all_answers["P1"] = p1_ans
-                curr_num = next_num; cursor = end1
-            if p2_idx >= 0:
-                new_blocks.append(blocks[p2_idx]); start2 = p2_idx + 1
-                end2 = len(blocks)
-                if p3_idx >= 0: end2 = p3_idx
-                elif p4_idx >= 0: end2 = p4_idx
-                p2_blocks, next_num, p2_ans = process_part(blocks, start2, end2, "PHAN2", curr_num)
-                new_blocks.extend(p2_blocks)
-                all_answers["P2"] = p2_ans 
-                all_answers["P2_Start"] = (curr_num - len(p2_ans)) if p2_ans else curr_num
-                all_answers["P2_Count"] = len(p2_ans) if p2_ans else 0
-                curr_num = next_num; cursor = end2
-            if p3_idx >= 0:
-                new_blocks.append(blocks[p3_idx]); start3 = p3_idx + 1
-                end3 = len(blocks)
-                if p4_idx >= 0: end3 = p4_idx
-                p3_blocks, next_num, p3_ans = process_part(blocks, start3, end3, "PHAN3", curr_num)
-                new_blocks.extend(p3_blocks)
-                all_answers["P3"] = p3_ans
-                all_answers["P3_Start"] = (curr_num - len(p3_ans)) if p3_ans else curr_num
-                all_answers["P3_Count"] = len(p3_ans) if p3_ans else 0
-                curr_num = next_num; cursor = end3
-            if p4_idx >= 0: new_blocks.extend(blocks[p4_idx:])
-            if p1_idx == -1 and p2_idx == -1 and p3_idx == -1 and p4_idx == -1:
-                new_blocks, ans = process_all_as_mcq(blocks)
-                all_answers["P1"] = ans
-        
-        other_nodes = [c for c in list(body.childNodes) if c.nodeType == c.ELEMENT_NODE and c.localName not in ["p", "tbl"]]
-        while body.firstChild: body.removeChild(body.firstChild)
-        for block in new_blocks: body.appendChild(block)
-        for node in other_nodes: body.appendChild(node)
-        
-        output_buffer = io.BytesIO()
-        with zipfile.ZipFile(output_buffer, 'w', zipfile.ZIP_DEFLATED) as zout:
-            for item in zin.infolist():
-                if item.filename == "word/document.xml": zout.writestr(item, dom.toxml().encode('utf-8'))
-                else: zout.writestr(item, zin.read(item.filename))
-        return output_buffer.getvalue(), all_answers
+@st.cache_resource(max_entries=8)
+def preview_template(file_bytes, shuffle_mode):
+    """Đề đã parse cho phần xem trước, dùng chung mọi phiên (xem trước chỉ đọc, không sửa template)"""
+    return ExamTemplate(file_bytes, shuffle_mode)
 
-def generate_answer_key_html(all_exam_data):
-    html = """
-    <html xmlns:o='urn:schemas-microsoft-com:office:office' xmlns:w='urn:schemas-microsoft-com:office:word' xmlns='http://www.w3.org/TR/REC-html40'>
-    <head><meta charset='utf-8'><title>Đáp án</title>
-    <style>
-        body { font-family: 'Times New Roman', serif; font-size: 12pt; }
-        h1, h2 { text-align: center; color: #C00000; margin: 5px 0; }
-        h3 { color: #002060; margin-top: 20px; margin-bottom: 5px; font-size: 13pt; }
-        table { border-collapse: collapse; width: 100%; margin-bottom: 15px; }
-        th, td { border: 1px solid black; padding: 5px; text-align: center; font-size: 11pt; }
-        th { background-color: #D9E2F3; font-weight: bold; }
-        .note { font-style: italic; font-size: 11pt; color: #002060; margin-bottom: 5px; }
-    </style>
-    </head><body>
-    """
-    html += """
-    <h1>TRƯỜNG THPT MINH ĐỨC</h1>
-    <h2>BẢNG ĐÁP ÁN</h2>
-    <p style='text-align:center; font-weight:bold;'>KIỂM TRA HỌC KỲ I - NĂM HỌC 2025 – 2026</p>
-    <br>
-    """
-    if not all_exam_data: return html + "</body></html>"
-    exam_codes = sorted(all_exam_data.keys())
-    sample_data = all_exam_data[exam_codes[0]]
-    if "P1" in sample_data and sample_data["P1"]:
-        html += "<h3>PHẦN I: Trắc nghiệm nhiều lựa chọn</h3>"
-        html += "<div class='note'>- Mỗi câu đúng được 0,25 điểm.</div>"
-        q_nums = sorted(sample_data["P1"].keys())
-        html += "<table><tr><th>Mã đề</th>"
-        for q in q_nums: html += f"<th>{q}</th>"
-        html += "</tr>"
-        for code in exam_codes:
-            html += f"<tr><td><b>{code}</b></td>"
-            ans_map = all_exam_data[code].get("P1", {})
-            for q in q_nums: html += f"<td><b>{ans_map.get(q, '')}</b></td>"
-            html += "</tr>"
-        html += "</table>"
-    if "P2" in sample_data and sample_data["P2"]:
-        count = sample_data.get("P2_Count", 0)
-        q_nums_p2 = sorted(sample_data["P2"].keys())
-        html += "<h3>PHẦN II: Trắc nghiệm đúng sai</h3>"
-        html += "<div class='note'>- Điểm tối đa mỗi câu là 1 điểm.</div>"
-        html += "<div class='note'>- Đúng 1 ý được 0,1 điểm; đúng 2 ý được 0,25 điểm; đúng 3 ý được 0,5 điểm; đúng 4 ý được 1 điểm.</div>"
-        html += "<table><tr><th>Mã đề</th>"
-        for q in q_nums_p2: html += f"<th>Câu {q}</th>"
-        html += "</tr>"
-        for code in exam_codes:
-            html += f"<tr><td><b>{code}</b></td>"
-            ans_map = all_exam_data[code].get("P2", {})
-            for q in q_nums_p2: html += f"<td><b>{ans_map.get(q, '')}</b></td>"
-            html += "</tr>"
-        html += "</table>"
-    if "P3" in sample_data and sample_data["P3"]:
-        q_nums_p3 = sorted(sample_data["P3"].keys())
-        html += "<h3>PHẦN III: Trắc nghiệm trả lời ngắn</h3>"
-        html += "<div class='note'>- Điểm tối đa mỗi câu là 0,5 điểm.</div>"
-        html += "<table><tr><th>Mã đề</th>"
-        for q in q_nums_p3: html += f"<th>Câu {q}</th>"
-        html += "</tr>"
-        for code in exam_codes:
-            html += f"<tr><td><b>{code}</b></td>"
-            ans_map = all_exam_data[code].get("P3", {})
-            for q in q_nums_p3: html += f"<td><b>{ans_map.get(q, '')}</b></td>"
-            html += "</tr>"
-        html += "</table>"
-    html += "</body></html>"
-    return html
+@st.cache_resource(max_entries=32)
+def preview_plans(file_bytes, shuffle_mode, seed, start_code, num_versions, balanced):
+    """Hàm mã đề -> hoán vị giống hệt lượt trộn thật (trộn cân bằng: cả loạt mã đề được sinh 1 lần)"""
+    constraints = SamplerConstraints() if balanced else None
+    return plan_source(preview_template(file_bytes, shuffle_mode), seed, range(start_code, start_code + num_versions),
+                       constraints)
 
-def create_zip_multiple(file_bytes, base_name, num_versions, shuffle_mode, start_code):
-    zip_buffer = io.BytesIO()
-    all_exam_data = {}
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zout:
-        for i in range(num_versions):
-            current_code = start_code + i
-            shuffled_bytes, exam_answers = shuffle_docx(file_bytes, shuffle_mode)
-            all_exam_data[current_code] = exam_answers
-            filename = f"{base_name}_{current_code}.docx"
-            zout.writestr(filename, shuffled_bytes)
-        try:
-            answer_key_html = generate_answer_key_html(all_exam_data)
-            zout.writestr("Bang_Dap_An.doc", answer_key_html.encode('utf-8'))
-        except Exception as e: print(f"Error creating answer key: {e}")
-    return zip_buffer.getvalue()
+@st.cache_resource(max_entries=4)
+def load_roster(data, name, start_code):
+    """Danh sách học sinh đã đọc (pandas/openpyxl), dùng chung mọi phiên"""
+    return Roster.from_table(io.BytesIO(data), name, start_code)
+
+def show_preview(file_bytes, shuffle_mode, seed, start_code, num_versions, balanced, lineage, roster=None):
+    """Xem trước 1 mã đề ngay trên trang (HTML, không tạo file Word) - cập nhật khi đổi kiểu trộn / số ngẫu nhiên"""
+    code = st.number_input("Mã đề xem trước", min_value=start_code, max_value=start_code + num_versions - 1,
+                           value=start_code, key="preview_code")
+    try:
+        template = preview_template(file_bytes, shuffle_mode)
+        manifest = previous_manifest(lineage)   # lượt trộn trước cùng cấu hình: job sẽ giữ hoán vị của gói đó
+        update = BundleUpdate(template, manifest) if manifest and str(code) in manifest["versions"] else None
+        if update is not None and update.compatible: plan = update.plan(code)
+        else: plan = preview_plans(file_bytes, shuffle_mode, seed, start_code, num_versions, balanced)(code)
+        html, _ = preview_html(template, plan, code)
+    except Exception as e:
+        st.error(f"❌ Không xem trước được: {str(e)}"); return
+    student = f" - {roster.ids[code - start_code]} {roster.names[code - start_code]}" if roster else ""
+    st.caption(f"Mã đề {code}{student}: thứ tự câu và nhãn như file tải về, đáp án đúng được tô vàng.")
+    st.markdown(html, unsafe_allow_html=True)
 
-# ==================== GIAO DIỆN STREAMLIT ====================
 def main():
     st.markdown("""
     <div class="header-card">
@@ -586,6 +290,7 @@ def main():
                 <li><strong>Phần 1 & 2:</strong> Vui lòng <b>Gạch chân</b> hoặc <b>Tô màu đỏ</b> ý đúng.</li>
                 <li><strong>Phần 3:</strong> Vui lòng <b>Gạch chân</b> hoặc <b>Tô màu đỏ</b> nội dung đáp án.</li>
             </ul>
+            <strong>MÃ ĐỀ TRÊN TỪNG FILE:</strong> gõ <b>{{MA_DE}}</b> ở đầu trang, chân trang hoặc trong đề - mỗi file sẽ tự điền mã đề của nó.
             <p style="margin-top: 5px;">📥 <a href="https://docs.google.com/document/d/1A3bm_KNbl0vmnuYDfWdkqifS30RD-mLh/edit?usp=sharing&ouid=112824050529887271694&rtpof=true&sd=true" target="_blank">Tải file mẫu tại đây</a></p>
         </div>
         """, unsafe_allow_html=True)
@@ -611,41 +316,117 @@ def main():
 
     with col_right:
         st.markdown('<div class="step-header">2️⃣ CẤU HÌNH MÃ ĐỀ</div>', unsafe_allow_html=True)
+        per_student = st.toggle("👩‍🎓 Mỗi học sinh 1 đề riêng (theo danh sách lớp)", value=False)
         c1, c2 = st.columns(2)
         with c1:
-            num_versions = st.number_input("Số lượng đề", min_value=1, max_value=50, value=4)
+            if per_student:
+                roster_file = st.file_uploader("Danh sách học sinh (CSV/XLSX: sbd, họ và tên, lớp)", type=["csv", "xlsx"],
+                                               key="roster_file")
+            else:
+                num_versions = st.number_input("Số lượng đề", min_value=1, max_value=50, value=4)
         with c2:
             start_code = st.number_input("Mã đề bắt đầu", min_value=0, value=101)
+        roster = None
+        if per_student:
+            num_versions = 1
+            if roster_file:
+                try:
+                    roster = load_roster(roster_file.getvalue(), roster_file.name, start_code); num_versions = len(roster)
+                except Exception as e:
+                    st.error(f"❌ Danh sách học sinh: {str(e)}")
+        seed = st.number_input("Số ngẫu nhiên (đổi số để có cách trộn khác)", min_value=0, value=2025)
+        balanced = st.checkbox("⚖️ Trộn cân bằng: các mã đề khác nhau nhiều nhất, đáp án chia đều A-D", value=False)
+        constraints = SamplerConstraints() if balanced else None
+        compression = st.selectbox("Mức nén gói tải về", options=list(PRESETS), index=list(PRESETS).index(DEFAULT_PRESET),
+                                   format_func=lambda x: {"fast": "⚡ Nhanh", "balanced": "⚖️ Cân bằng",
+                                                          "small": "🗜️ Gói nhỏ nhất"}[x])
         
-        if num_versions > 1:
+        if per_student:
+            if roster: st.info(f"👩‍🎓 Tạo {num_versions} đề cho {num_versions} học sinh: {start_code} ➝ {start_code + num_versions - 1}")
+            else: st.info("👩‍🎓 Chọn file danh sách học sinh để tạo mỗi em 1 đề.")
+        elif num_versions > 1:
             st.info(f"📦 Tạo {num_versions} đề: {start_code} ➝ {start_code + num_versions - 1}")
         else:
             st.info(f"📄 Tạo 1 đề: {start_code}")
 
+    base_name = bundle_base_name(uploaded_file.name) if uploaded_file else None
+    # Cùng cấu hình, file đã sửa: giữ nguyên hoán vị của lượt trộn trước
+    lineage = lineage_key(base_name=base_name, mode=shuffle_mode, start_code=start_code, num_versions=num_versions,
+                          seed=seed, balanced=balanced, roster=roster and roster.fingerprint())
+
+    with st.expander("👁️ Xem trước 1 mã đề (không cần trộn cả gói)", expanded=False):
+        if uploaded_file:
+            show_preview(uploaded_file.getvalue(), shuffle_mode, seed, start_code, num_versions, balanced, lineage, roster)
+        else: st.info("Chọn file Word để xem trước.")
+
     st.markdown('<div class="step-header">3️⃣ THỰC HIỆN</div>', unsafe_allow_html=True)
     if st.button("🎲 BẮT ĐẦU TRỘN ĐỀ & TẢI VỀ", type="primary", use_container_width=True):
         if not uploaded_file:
             st.warning("⚠️ Vui lòng chọn file Word trước khi trộn!")
+        elif per_student and roster is None:
+            st.warning("⚠️ Vui lòng chọn file danh sách học sinh!")
         else:
             try:
-                with st.spinner("🚀 Đang xử lý và tạo bảng đáp án..."):
-                    file_bytes = uploaded_file.read()
-                    base_name = re.sub(r'[^\w\s-]', '', uploaded_file.name.replace(".docx", "")).strip() or "De"
-                    
-                    if num_versions == 1:
-                        result = create_zip_multiple(file_bytes, base_name, 1, shuffle_mode, start_code)
-                        filename = f"{base_name}_Mix_{start_code}.zip"
-                    else:
-                        result = create_zip_multiple(file_bytes, base_name, num_versions, shuffle_mode, start_code)
-                        filename = f"{base_name}_Mix_From_{start_code}.zip"
-                    
-                    mime = "application/zip"
-                
-                st.balloons()
-                st.success("✅ THÀNH CÔNG! File tải về đã bao gồm Đề thi và Bảng đáp án.")
-                st.download_button(label=f"📥 TẢI XUỐNG {filename}", data=result, file_name=filename, mime=mime, use_container_width=True)
+                file_bytes = uploaded_file.getvalue()
+                key = bundle_key(file_bytes, base_name=base_name, mode=shuffle_mode, start_code=start_code,
+                                 num_versions=num_versions, seed=seed, balanced=balanced, compression=compression,
+                                 roster=roster and roster.fingerprint())
+                job = get_job_queue().submit(session_id(), key, file_bytes, base_name, num_versions, shuffle_mode,
+                                             start_code, seed, constraints=constraints, lineage=lineage,
+                                             compression=compression, roster=roster)
+                st.session_state["job_id"] = job.id
             except Exception as e:
                 st.error(f"❌ Lỗi: {str(e)}")
+    job = get_job_queue().get(st.session_state.get("job_id"))
+    if job is not None:
+        if job.finished: show_job_result(job)
+        else: show_job_progress(job.id)
+    
+    with st.expander("🖨️ Tạo lại 1 mã đề (cùng file, kiểu trộn và số ngẫu nhiên)", expanded=False):
+        redo_code = st.number_input("Mã đề cần tạo lại", min_value=0, value=start_code)
+        if st.button("🔁 TẠO LẠI MÃ ĐỀ NÀY", use_container_width=True):
+            if not uploaded_file:
+                st.warning("⚠️ Vui lòng chọn file Word trước khi trộn!")
+            else:
+                try:
+                    codes = range(start_code, start_code + num_versions)
+                    docx_bytes, _ = regenerate_version(uploaded_file.getvalue(), shuffle_mode, seed, redo_code,
+                                                       constraints=constraints, codes=codes,
+                                                       manifest=previous_manifest(lineage), compression=compression)
+                    docx_name = version_filename(base_name, redo_code, roster)
+                    st.download_button(label=f"📥 TẢI XUỐNG {docx_name}", data=docx_bytes, file_name=docx_name,
+                                       mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                                       use_container_width=True)
+                except Exception as e:
+                    st.error(f"❌ Lỗi: {str(e)}")
+    
+    with st.expander("📊 Chấm điểm bài làm (file quét phiếu)", expanded=False):
+        st.caption("Bảng đáp án: file Bang_Dap_An.csv hoặc .xlsx trong gói tải về. "
+                   "Bài làm: mỗi dòng 1 học sinh, cột SBD (hoặc ma_hs), ma_de, P1_1, P1_2, ..., P2_.., P3_..")
+        g1, g2 = st.columns(2)
+        with g1: key_file = st.file_uploader("Bảng đáp án", type=["csv", "xlsx"], key="grading_key")
+        with g2: responses_file = st.file_uploader("Bài làm", type=["csv", "xlsx"], key="grading_responses")
+        if st.button("📊 CHẤM ĐIỂM", use_container_width=True):
+            if not key_file or not responses_file:
+                st.warning("⚠️ Vui lòng chọn cả file bảng đáp án và file bài làm!")
+            else:
+                try:
+                    result = grade(read_table(responses_file), load_answer_key(key_file))
+                    if result.unknown_codes:
+                        st.warning(f"⚠️ Mã đề không có trong bảng đáp án (tính 0 điểm): {', '.join(result.unknown_codes)}")
+                    st.success(f"✅ Đã chấm {len(result.students)} bài - điểm trung bình {result.students['tong'].mean():.2f}")
+                    st.dataframe(result.students, use_container_width=True, hide_index=True)
+                    st.download_button(label="📥 TẢI KẾT QUẢ (Excel)", data=grading_xlsx_bytes(result),
+                                       file_name="Ket_Qua_Cham.xlsx", use_container_width=True,
+                                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                except Exception as e:
+                    st.error(f"❌ Lỗi: {str(e)}")
+    
+    with st.expander("🗃️ Ngân hàng câu hỏi (gom câu từ nhiều file, ghép đề mới)", expanded=False):
+        try:
+            show_question_bank(seed)
+        except Exception as e:
+            st.error(f"❌ Lỗi: {str(e)}")
     
     st.markdown("""
     <div class="footer">
@@ -0,0 +1,133 @@
+"""Fixture chung: đề giả lập (tronde.synthetic), file .docx tối thiểu dựng tay và cách đọc lại 1 file .docx đã trộn.
+
+Chạy từ thư mục gốc của repo: python -m pytest -q
+"""
+import io
+import re
+import zipfile
+from array import array
+from xml.sax.saxutils import escape
+
+import pytest
+
+from tronde.segment import PART_MCQ, PART_SHORT, PART_TF
+from tronde.synthetic import build_exam
+from tronde.template import ExamTemplate, option_count
+from tronde.word import element_children, get_text, parse_document
+
+RE_QUESTION = re.compile(r'^\s*Câu\s*(\d+)\.')
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+M_NS = "http://schemas.openxmlformats.org/officeDocument/2006/math"
+UNDERLINE = '<w:u w:val="single"/>'
+
+def run(text, props=""):
+    return f'<w:r><w:rPr>{props}</w:rPr><w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+def paragraph(*content, style=None):
+    """1 đoạn w:p; content: text (1 run) hoặc XML dựng sẵn (run, công thức...); style: kiểu đoạn (w:pStyle)"""
+    props = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return "<w:p>" + props + "".join(c if c.startswith("<") else run(c) for c in content) + "</w:p>"
+
+def make_docx(*paragraphs, styles="", parts=None):
+    """File .docx tối thiểu: paragraphs là text (1 đoạn 1 run) hoặc XML w:p; styles: các thẻ w:style của
+    styles.xml; parts: {tên member: XML} thêm vào gói (vd word/header1.xml)"""
+    body = "".join(p if p.startswith("<") else paragraph(p) for p in paragraphs)
+    members = {
+        "[Content_Types].xml": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/></Types>',
+        "_rels/.rels": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+            'officeDocument" Target="word/document.xml"/></Relationships>',
+        "word/document.xml": f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document xmlns:w="{W_NS}" '
+            f'xmlns:m="{M_NS}"><w:body>{body}<w:sectPr/></w:body></w:document>',
+        "word/styles.xml": f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles xmlns:w="{W_NS}">'
+            f'{styles}</w:styles>',
+        **(parts or {})}
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items(): z.writestr(name, data)
+    return buffer.getvalue()
+
+def mcq_question(number, text, correct, props=UNDERLINE):
+    """Các đoạn của 1 câu PHẦN 1: "Câu n. text" và A-D, phương án correct (0-3) mang định dạng props"""
+    return [f"Câu {number}. {text}"] + [paragraph(run(f"{letter}. "), run(f"Phương án {letter} của câu {number}",
+                                                                           props if k == correct else ""))
+                                         for k, letter in enumerate("ABCD")]
+
+@pytest.fixture(scope="session")
+def exam():
+    """Đề PHẦN 1-4 có nhãn "Câu n." bị tách run, run vụn, bảng, công thức và ảnh"""
+    return build_exam(mcq=12, tf=4, short=6, essay=1, fragment=3, tables=2, equations=4, images=(20_000, 5_000),
+                      seed=7)
+
+def identity_plan(template):
+    """Hoán vị giữ nguyên thứ tự câu và phương án của template"""
+    plan = array('H')
+    for kind, piece in template.pieces:
+        if kind != "part": continue
+        for slot in piece["questions"]: plan.extend(range(option_count(slot)))
+        plan.extend(range(len(piece["questions"])))
+    return plan
+
+def reread_answers(docx_bytes):
+    """Đáp án đọc lại từ chính file .docx (phương án được đánh dấu, ý Đ/S, đáp số) - không qua hoán vị nào"""
+    template = ExamTemplate(docx_bytes)
+    return template.build_version(identity_plan(template))[1]
+
+RE_OPTION = re.compile(r'^\s*([A-Da-d])[.)]\s*')
+
+def _strip(pattern, text):
+    return " ".join(pattern.sub("", text, count=1).split())
+
+def document_answers(source_bytes, docx_bytes):
+    """Đáp án đọc từ nội dung file đã trộn, đối chiếu với đề gốc theo text: câu nhận ra bằng nội dung,
+    phương án đúng (PHẦN I) và ý Đ/S (PHẦN II) bằng text của phương án - không dùng hoán vị hay nhãn đã tô."""
+    source = ExamTemplate(source_bytes); texts = source.index.texts; position = source.index.position
+    questions = {}
+    for kind, piece in source.pieces:
+        if kind != "part" or not piece["key"]: continue
+        for slot in piece["questions"]:
+            blocks = slot["blocks"]; option_text = lambda i: _strip(RE_OPTION, texts[position(blocks[i])])
+            info = {"key": piece["key"]}
+            if slot["kind"] == "mcq": info["correct"] = option_text(slot["options"][slot["marked"]])
+            elif slot["kind"] == "tf":
+                info["statuses"] = {option_text(i): status for i, status in zip(slot["options"], slot["statuses"])}
+                if slot["d"]: info["statuses"][option_text(slot["d"][0])] = slot["d"][1]
+            else: info["answer"] = slot["answer"]
+            questions[_strip(RE_QUESTION, texts[position(blocks[0])])] = info
+    answers = {}; current = None
+    for text in paragraph_texts(docx_bytes):
+        m = RE_QUESTION.match(text)
+        if m and _strip(RE_QUESTION, text) in questions:
+            number = int(m.group(1)); current = questions[_strip(RE_QUESTION, text)]
+            part = answers.setdefault(current["key"], {})
+            if "answer" in current: part[number] = current["answer"]
+            continue
+        m = RE_OPTION.match(text)
+        if current is None or not m: continue
+        if "correct" in current and _strip(RE_OPTION, text) == current["correct"]: part[number] = m.group(1)
+        elif "statuses" in current:
+            status = current["statuses"][_strip(RE_OPTION, text)]
+            part[number] = f"{part[number]}-{status}" if number in part else status
+    return answers
+
+def question_numbers(docx_bytes, part_types=(PART_MCQ, PART_TF, PART_SHORT)):
+    """Số "Câu n." in trong file, theo thứ tự, của các phần được trộn"""
+    template = ExamTemplate(docx_bytes)
+    numbers = []
+    for kind, piece in template.pieces:
+        if kind != "part" or piece["type"] not in part_types: continue
+        for slot in piece["questions"]:
+            text = template.index.texts[template.index.position(slot["blocks"][0])]
+            numbers.append(int(RE_QUESTION.match(text).group(1)))
+    return numbers
+
+def document_xml(docx_bytes):
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as z: return z.read("word/document.xml")
+
+def paragraph_texts(docx_bytes):
+    _, body = parse_document(document_xml(docx_bytes))
+    return [get_text(block) for block in element_children(body)]
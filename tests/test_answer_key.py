@@ -0,0 +1,33 @@
+"""Bảng đáp án dạng cột: thứ tự cột không phụ thuộc thứ tự mã đề xong, xuất CSV/XLSX đọc lại được."""
+import io
+import zipfile
+
+import pandas as pd
+
+from tronde.answer_key import AnswerStore, write_answer_keys
+
+ANSWERS = {101: {"P1": {1: "A", 2: "B"}, "P2": {3: "Đ-S-Đ-S"}}, 102: {"P1": {1: "C", 2: "D", 3: "A"}, "P3": {5: "1,5"}},
+           103: {"P1": {2: "A"}}}
+
+def test_answer_store_columns_do_not_depend_on_order():
+    layouts = set()
+    for order in ([101, 102, 103], [103, 102, 101], [102, 101, 103]):
+        store = AnswerStore()
+        for code in order: store.add(code, ANSWERS[code])
+        layouts.add((tuple(store.columns()), tuple((code, tuple(row)) for code, row in store.iter_flat_rows())))
+    assert len(layouts) == 1
+    assert next(iter(layouts))[0] == ("P1_1", "P1_2", "P1_3", "P2_3", "P3_5")
+
+def test_exported_keys_read_back():
+    store = AnswerStore()
+    for code, answers in ANSWERS.items(): store.add(code, answers)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zout: write_answer_keys(store, zout)
+    with zipfile.ZipFile(buffer) as z:
+        assert set(z.namelist()) == {"Bang_Dap_An.doc", "Bang_Dap_An.csv", "Bang_Dap_An.xlsx"}
+        csv_key = pd.read_csv(io.BytesIO(z.read("Bang_Dap_An.csv")), dtype=str, encoding="utf-8-sig").fillna("")
+        xlsx_key = pd.read_excel(io.BytesIO(z.read("Bang_Dap_An.xlsx")), sheet_name="Tổng hợp", dtype=str).fillna("")
+    assert csv_key.columns.tolist() == ["ma_de", "P1_1", "P1_2", "P1_3", "P2_3", "P3_5"]
+    assert csv_key.equals(xlsx_key)
+    assert csv_key.set_index("ma_de").loc["102"].tolist() == ["C", "D", "A", "", "1,5"]
+    assert csv_key.set_index("ma_de").loc["101", "P2_3"] == "Đ-S-Đ-S"
@@ -0,0 +1,52 @@
+"""Nạp đề vào ngân hàng câu hỏi rồi ghép đề mới: đủ câu, đúng đáp án, file .docx hợp lệ."""
+import io
+import zipfile
+
+from tronde.bank import QuestionBank
+from tronde.segment import PART_ESSAY, PART_MCQ, PART_SHORT, PART_TF
+
+from conftest import make_docx, mcq_question, paragraph, question_numbers, reread_answers, run
+
+def test_ingest_and_build_round_trip(exam):
+    with QuestionBank(":memory:") as bank:
+        report = bank.ingest(exam, "De.docx", tags=("Toán 12",))
+        assert (report.added, report.duplicates, report.skipped) == (23, 0, [])
+        assert bank.counts(("Toán 12",)) == {PART_MCQ: 12, PART_TF: 4, PART_SHORT: 6, PART_ESSAY: 1}
+        assert bank.ingest(exam, "De.docx").skipped       # cùng nội dung: không nạp lại
+
+        counts = {PART_MCQ: 5, PART_TF: 2, PART_SHORT: 3}
+        docx_bytes, question_ids = bank.build(counts, tags=("Toán 12",), seed=3)
+        stored = dict(bank.conn.execute(f"SELECT id, answer FROM questions WHERE id IN ({','.join('?' * len(question_ids))})",
+                                        question_ids).fetchall())
+
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as z:
+        assert z.testzip() is None
+        rels = z.read("word/_rels/document.xml.rels").decode("utf-8")
+        assert all(f"word/{target}" in z.NameToInfo for target in
+                   (part.split('"')[0] for part in rels.split('Target="')[1:]) if target.startswith("media/"))
+    answers = reread_answers(docx_bytes)
+    expected = [stored[qid] for qid in question_ids]
+    assert [answers["P1"][n] for n in range(1, 6)] == expected[:5]
+    assert [answers["P2"][n] for n in range(6, 8)] == expected[5:7]
+    assert [answers["P3"][n] for n in range(8, 11)] == expected[7:]
+    assert question_numbers(docx_bytes) == list(range(1, 11))
+
+def _power(exponent):
+    return (f'<m:oMath><m:sSup><m:e><m:r><m:t>x</m:t></m:r></m:e><m:sup><m:r><m:t>{exponent}</m:t></m:r></m:sup>'
+            '</m:sSup></m:oMath>')
+
+def _equation_exam(*questions):
+    """Đề PHẦN 1 mà các câu chỉ khác nhau ở công thức OMML: questions là (số câu, số mũ)"""
+    blocks = ["PHẦN 1. Trắc nghiệm"]
+    for number, exponent in questions:
+        blocks += [paragraph(run(f"Câu {number}. Tính đạo hàm của y = "), _power(exponent))] + mcq_question(1, "", 1)[1:]
+    return make_docx(*blocks)
+
+def test_questions_differing_only_in_equation_are_kept():
+    with QuestionBank(":memory:") as bank:
+        report = bank.ingest(_equation_exam((1, 2), (2, 3)), "De_1.docx")
+        assert (report.added, report.duplicates) == (2, 0)
+        # Cùng câu ở file khác, số câu khác: vẫn nhận ra là câu trùng
+        report = bank.ingest(_equation_exam((1, 4), (2, 2)), "De_2.docx")
+        assert (report.added, report.duplicates) == (1, 1)
+        assert sorted(xml.count(b"<m:t>") for (xml,) in bank.conn.execute("SELECT xml FROM questions")) == [2, 2, 2]
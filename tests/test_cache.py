@@ -0,0 +1,27 @@
+"""Dọn cache gói .zip: gói cũ nhất khi vượt dung lượng, file .part bỏ dở, con trỏ .latest mồ côi."""
+import os
+import tempfile
+
+from tronde.cache import BundleCache
+
+def _part(directory, mtime=None):
+    fd, path = tempfile.mkstemp(suffix=".part", dir=directory)
+    os.write(fd, b"x" * 1000); os.close(fd)
+    if mtime is not None: os.utime(path, (mtime, mtime))
+    return path
+
+def test_evict(tmp_path):
+    cache = BundleCache(str(tmp_path), max_bytes=10_000)
+    for i, key in enumerate(("old", "new")):
+        with open(cache.path(key), "wb") as f: f.write(b"x" * 6000)
+        os.utime(cache.path(key), (i, i))
+        cache.remember(f"lineage-{key}", key)
+    _part(tmp_path, 0); running = _part(tmp_path)
+    cache.evict(keep="new")
+    assert sorted(os.listdir(tmp_path)) == sorted(["new.zip", "lineage-new.latest", os.path.basename(running)])
+    assert cache.latest("lineage-new") == cache.path("new") and cache.latest("lineage-old") is None
+
+def test_stale_parts_removed_on_start(tmp_path):
+    stale = _part(tmp_path, 0)
+    BundleCache(str(tmp_path))
+    assert not os.path.exists(stale)
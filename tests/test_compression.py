@@ -0,0 +1,40 @@
+"""Kiểu nén chọn theo từng member: dữ liệu đã nén (.docx, ảnh) STORED, XML/văn bản DEFLATE theo mức của preset."""
+import io
+import random
+import zipfile
+
+import pytest
+
+from tronde.bundle import create_zip_multiple
+from tronde.compression import PRESETS, CompressionPolicy, compression_policy
+from tronde.template import ExamTemplate
+
+def _types(data):
+    with zipfile.ZipFile(io.BytesIO(data) if isinstance(data, bytes) else data) as z:
+        return {item.filename: item.compress_type for item in z.infolist()}
+
+@pytest.mark.parametrize("preset", sorted(PRESETS))
+def test_docx_members_follow_policy(exam, preset):
+    docx_bytes, _ = ExamTemplate(exam, compression=preset).build_version(rng=random.Random(0), code=101)
+    types = _types(docx_bytes)
+    assert any(name.endswith(".png") for name in types)
+    for name, compress_type in types.items():
+        expected = zipfile.ZIP_STORED if name.endswith(".png") else zipfile.ZIP_DEFLATED
+        assert compress_type == expected == compression_policy(preset).compress_type(name)
+
+@pytest.mark.parametrize("preset", sorted(PRESETS))
+def test_bundle_members_follow_policy(exam, preset, tmp_path):
+    bundle = create_zip_multiple(exam, "De", 2, "auto", 101, output=str(tmp_path / "de.zip"), seed=1, compression=preset)
+    types = _types(bundle)
+    assert {types[name] for name in types if name.endswith((".docx", ".xlsx"))} == {zipfile.ZIP_STORED}
+    assert {types[name] for name in types if name.endswith((".csv", ".doc", ".json"))} == {zipfile.ZIP_DEFLATED}
+
+def test_levels_and_custom_policy(exam):
+    def document_size(compression):
+        docx_bytes, _ = ExamTemplate(exam, compression=compression).build_version(rng=random.Random(0), code=101)
+        return zipfile.ZipFile(io.BytesIO(docx_bytes)).getinfo("word/document.xml").compress_size
+    assert document_size("small") < document_size("fast")
+    deflate_all = CompressionPolicy(store_precompressed=False)
+    assert deflate_all.compress_type("word/media/image1.png") == zipfile.ZIP_DEFLATED
+    assert _types(ExamTemplate(exam, compression=deflate_all).build_version(rng=random.Random(0))[0]).keys()
+    with pytest.raises(ValueError): compression_policy("ultra")
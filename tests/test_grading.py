@@ -0,0 +1,52 @@
+"""Chấm điểm theo bảng đáp án: điểm từng phần, chuẩn hóa cách ghi đáp án, mã đề lạ."""
+import io
+
+import pandas as pd
+import pytest
+
+from tronde.grading import P1_POINTS, P2_POINTS, P3_POINTS, answer_key_frame, grade, load_answer_key, read_table
+
+KEY = pd.DataFrame({"ma_de": ["101", "102"], "P1_1": ["A", "C"], "P1_2": ["B", "D"],
+                    "P2_3": ["Đ-S-Đ-S", "S-S-Đ-Đ"], "P3_4": ["1,5", "-2"]}, dtype=str)
+
+def _grade(rows):
+    responses = pd.DataFrame(rows, columns=["sbd", "ma_de", "P1_1", "P1_2", "P2_3", "P3_4"], dtype=str)
+    return grade(responses, answer_key_frame(KEY))
+
+def _score(result, student):
+    return result.students.set_index("ma_hs").loc[student]
+
+@pytest.mark.parametrize("answer, items", [("Đ-S-Đ-S", 4), ("Đ-S-Đ-Đ", 3), ("S-S-Đ-Đ", 2), ("S-Đ-Đ-Đ", 1),
+                                           ("S-Đ-S-Đ", 0), ("", 0), ("Đ-S", 2)])
+def test_true_false_partial_credit(answer, items):
+    result = _grade([["HS1", "101", "", "", answer, ""]])
+    assert _score(result, "HS1")["P2"] == pytest.approx(P2_POINTS[items])
+
+@pytest.mark.parametrize("answer", ["Đ-S-Đ-S", "dsds", "D S D S", "đ,s,đ,s", "ĐSĐS"])
+def test_true_false_notations(answer):
+    assert _score(_grade([["HS1", "101", "", "", answer, ""]]), "HS1")["P2"] == pytest.approx(P2_POINTS[4])
+
+@pytest.mark.parametrize("answer, right", [("1,5", True), ("1.5", True), (" 1, 5 ", True), ("1,50", False), ("15", False)])
+def test_short_answer_decimal_separator(answer, right):
+    assert _score(_grade([["HS1", "101", "", "", "", answer]]), "HS1")["P3"] == (P3_POINTS if right else 0)
+
+def test_total_and_per_code_keys():
+    result = _grade([["HS1", "101", "A", "b", "Đ-S-Đ-S", "1.5"], ["HS2", "102", "A", "D", "S-S-Đ-S", "-2"]])
+    assert _score(result, "HS1")["tong"] == pytest.approx(2 * P1_POINTS + P2_POINTS[4] + P3_POINTS)
+    assert _score(result, "HS2")["tong"] == pytest.approx(P1_POINTS + P2_POINTS[3] + P3_POINTS)
+    items = result.items.set_index(["ma_de", "cau"])["ti_le_dung"]
+    assert items[("101", "P1_1")] == 1 and items[("102", "P1_1")] == 0 and items[("102", "P2_3")] == 0.75
+
+def test_unknown_code_scores_zero():
+    result = _grade([["HS1", "999", "A", "B", "Đ-S-Đ-S", "1,5"], ["HS2", "101", "A", "", "", ""]])
+    assert _score(result, "HS1")[["P1", "P2", "P3", "tong"]].tolist() == [0, 0, 0, 0]
+    assert result.unknown_codes == ["999"] and set(result.items["ma_de"]) == {"101"}
+
+def test_xlsx_float_exam_codes():
+    # Phiếu quét xuất Excel hay ghi mã đề dạng số thực: "101.0" phải khớp mã đề 101 của bảng đáp án
+    buffer = io.BytesIO()
+    pd.DataFrame({"SBD": ["HS1"], "ma_de": ["101.0"], "P1_1": ["a"], "P1_2": ["B"]}).to_excel(buffer, index=False)
+    buffer.seek(0)
+    key = io.StringIO(); KEY.to_csv(key, index=False); key.seek(0)
+    result = grade(read_table(buffer, "bai_lam.xlsx"), load_answer_key(key, "Bang_Dap_An.csv"))
+    assert result.unknown_codes == [] and _score(result, "HS1")["tong"] == pytest.approx(2 * P1_POINTS)
@@ -0,0 +1,81 @@
+"""Trộn lại đề đã sửa từ gói trước (update_zip) cho cùng kết quả với trộn mới cùng seed."""
+import io
+import json
+import zipfile
+
+import pytest
+
+from tronde.bundle import create_zip_multiple
+from tronde.incremental import MANIFEST_NAME, update_zip
+
+SEED = 21
+
+def _edit(exam, old, new):
+    """Đề đã sửa: thay lần xuất hiện đầu tiên của old trong document.xml"""
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(exam)) as zin, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+        for item in zin.infolist():
+            data = zin.read(item)
+            if item.filename == "word/document.xml":
+                assert old.encode() in data
+                data = data.replace(old.encode(), new.encode(), 1)
+            zout.writestr(item, data)
+    return out.getvalue()
+
+def _versions(path):
+    """{tên file .docx: (document.xml, các member khác)} và bảng đáp án CSV của gói"""
+    with zipfile.ZipFile(path) as z:
+        versions = {}
+        for name in z.namelist():
+            if not name.endswith(".docx"): continue
+            data = z.read(name)
+            with zipfile.ZipFile(io.BytesIO(data)) as d:
+                versions[name] = {n: d.read(n) for n in d.namelist()}
+        return versions, z.read("Bang_Dap_An.csv")
+
+@pytest.fixture
+def previous(exam, tmp_path):
+    return create_zip_multiple(exam, "De", 4, "auto", 101, output=str(tmp_path / "old.zip"), seed=SEED)
+
+def test_unchanged_source_gives_same_bundle(exam, previous, tmp_path):
+    summary = update_zip(exam, previous, str(tmp_path / "new.zip"))
+    assert summary["reused"] and not summary["body_changed"] and not summary["recompressed"]
+    assert _versions(str(tmp_path / "new.zip")) == _versions(previous)
+
+def test_edited_source_matches_fresh_build(exam, previous, tmp_path):
+    edited = _edit(exam, "hàm số", "hàm số bậc ba")
+    summary = update_zip(edited, previous, str(tmp_path / "new.zip"))
+    assert summary["reused"] and summary["body_changed"]
+    fresh = create_zip_multiple(edited, "De", 4, "auto", 101, output=str(tmp_path / "fresh.zip"), seed=SEED)
+    assert _versions(str(tmp_path / "new.zip")) == _versions(fresh)
+
+def test_other_compression_is_not_reused(exam, tmp_path):
+    fast = create_zip_multiple(exam, "De", 2, "auto", 101, output=str(tmp_path / "fast.zip"), seed=SEED,
+                               compression="fast")
+    small = create_zip_multiple(exam, "De", 2, "auto", 101, output=str(tmp_path / "small.zip"), seed=SEED,
+                                compression="small")
+    summary = update_zip(exam, fast, str(tmp_path / "new.zip"), compression="small")
+    assert summary["recompressed"]
+    def sizes(path):
+        with zipfile.ZipFile(path) as z:
+            return {name: zipfile.ZipFile(io.BytesIO(z.read(name))).getinfo("word/document.xml").compress_size
+                    for name in z.namelist() if name.endswith(".docx")}
+    assert sizes(str(tmp_path / "new.zip")) == sizes(small)
+    with zipfile.ZipFile(str(tmp_path / "new.zip")) as z: manifest = json.loads(z.read(MANIFEST_NAME))
+    assert manifest["compression"]["xml_level"] == 9
+
+def test_added_question_is_rejected(exam, previous):
+    with zipfile.ZipFile(io.BytesIO(exam)) as z: xml = z.read("word/document.xml").decode("utf-8")
+    start = xml.rfind("<w:p>", 0, xml.index("PHẦN 2"))
+    edited = _edit(exam, xml[start:xml.index("PHẦN 2")], "<w:p><w:r><w:t>Câu 13. Câu mới</w:t></w:r></w:p>"
+                   + xml[start:xml.index("PHẦN 2")])
+    with pytest.raises(ValueError):
+        update_zip(edited, previous, io.BytesIO())
+
+def test_document_changes_only_where_edited(exam, previous, tmp_path):
+    edited = _edit(exam, "hàm số", "hàm số bậc ba")
+    update_zip(edited, previous, str(tmp_path / "new.zip"))
+    (old, _), (new, _) = _versions(previous), _versions(str(tmp_path / "new.zip"))
+    for name, members in old.items():
+        assert new[name].pop("word/document.xml") != members.pop("word/document.xml")
+        assert new[name] == members
@@ -0,0 +1,44 @@
+"""Hàng đợi job: kết quả trùng create_zip_multiple; lỗi của 1 job không làm dừng luồng điều phối."""
+import io
+import zipfile
+
+import pytest
+
+import tronde.jobs as jobs
+from tronde.bundle import create_zip_multiple
+from tronde.cache import BundleCache
+
+@pytest.fixture
+def job_queue(tmp_path):
+    job_queue = jobs.JobQueue(BundleCache(str(tmp_path / "cache")), workers=2)
+    yield job_queue
+    job_queue.shutdown()
+
+def _contents(bundle):
+    """Nội dung các đề (từng part của .docx) và bảng đáp án CSV trong gói"""
+    contents = {}
+    for name in bundle.namelist():
+        if name.endswith(".docx"):
+            with zipfile.ZipFile(io.BytesIO(bundle.read(name))) as docx:
+                contents[name] = {part: docx.read(part) for part in docx.namelist()}
+        elif name.endswith(".csv"): contents[name] = bundle.read(name)
+    return contents
+
+def test_job_matches_create_zip_multiple(exam, job_queue, tmp_path):
+    job = job_queue.submit("s", "k1", exam, "De", 4, "auto", 101, 5)
+    assert job.wait(60) and job.state == jobs.DONE
+    expected = create_zip_multiple(exam, "De", 4, "auto", 101, output=str(tmp_path / "seq.zip"), seed=5)
+    with zipfile.ZipFile(job.path) as got, zipfile.ZipFile(expected) as want:
+        assert _contents(got) == _contents(want)
+
+def test_failed_job_does_not_stop_queue(exam, job_queue, monkeypatch):
+    def broken(*args, **kwargs): raise KeyError("commit")
+    monkeypatch.setattr(job_queue.cache, "commit", broken)
+    failed = job_queue.submit("s", "k1", exam, "De", 2, "auto", 101, 1)
+    assert failed.wait(60) and failed.state == jobs.ERROR
+    monkeypatch.undo()
+    job_queue._pool.shutdown()          # pool đã đóng: submit báo RuntimeError
+    failed = job_queue.submit("s", "k2", exam, "De", 2, "auto", 101, 2)
+    assert failed.wait(60) and failed.state == jobs.ERROR
+    job = job_queue.submit("s", "k3", exam, "De", 2, "auto", 101, 3)
+    assert job.wait(60) and job.state == jobs.DONE
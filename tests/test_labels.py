@@ -0,0 +1,26 @@
+"""Đánh số lại nhãn câu / phương án, kể cả nhãn "Câu n." bị Word tách ra nhiều run."""
+import io
+import random
+import zipfile
+
+from tronde.template import ExamTemplate
+from tronde.word import element_children, get_text, parse_document
+
+from conftest import paragraph, make_docx, mcq_question, run, UNDERLINE
+
+def _texts(docx_bytes):
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as z: _, body = parse_document(z.read("word/document.xml"))
+    return [get_text(block) for block in element_children(body)]
+
+def test_split_question_labels_are_renumbered():
+    split = [paragraph(run("Câu "), run(f"{n}"), run(". "), run(f"Nội dung câu {n}.")) for n in (2, 3)]
+    options = lambda n: mcq_question(n, "", n % 4)[1:]
+    docx = make_docx("PHẦN 1. Trắc nghiệm", *mcq_question(1, "Nội dung câu 1.", 0), split[0], *options(2),
+                     split[1], *options(3))
+    template = ExamTemplate(docx)
+    for seed in range(5):
+        docx_bytes, answers = template.build_version(rng=random.Random(seed))
+        questions = [text for text in _texts(docx_bytes) if text.startswith("Câu")]
+        assert [q.split(".")[0] for q in questions] == ["Câu 1", "Câu 2", "Câu 3"]
+        assert sorted(q.split(". ", 1)[1] for q in questions) == [f"Nội dung câu {n}." for n in (1, 2, 3)]
+        assert sorted(answers["P1"]) == [1, 2, 3]
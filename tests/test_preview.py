@@ -0,0 +1,36 @@
+"""Xem trước HTML tô đúng đáp án của mã đề và đánh số câu như file .docx."""
+import re
+
+import pytest
+
+from tronde.bundle import version_plan
+from tronde.preview import preview_html
+from tronde.template import ExamTemplate
+
+from conftest import question_numbers
+
+RE_LINE = re.compile(r'<p class="([^"]*)"><span class="label">([^<]*)</span>.*?(?:<span class="badge[^"]*">([^<]*)</span>)?</p>')
+
+def _highlights(html):
+    """Đáp án đọc từ HTML: {"P1": {câu: chữ cái tô}, "P2": {câu: "Đ-S-..."}, "P3": {câu: đáp số}}, số các câu"""
+    found = {"P1": {}, "P2": {}, "P3": {}}; numbers = []; number = None
+    for classes, label, badge in RE_LINE.findall(html):
+        if label.startswith("Câu"):
+            number = int(label[4:-1]); numbers.append(number)
+            if badge: found["P3"][number] = badge.removeprefix("Đáp án: ")
+        elif label.endswith("."):
+            if "correct" in classes.split(): found["P1"][number] = label[0]
+        elif badge:
+            found["P2"][number] = f"{found['P2'][number]}-{badge}" if number in found["P2"] else badge
+    return found, numbers
+
+@pytest.mark.parametrize("seed", range(4))
+def test_preview_matches_answer_key(exam, seed):
+    template = ExamTemplate(exam)
+    plan = version_plan(template, seed, 101)
+    html, answers = preview_html(template, plan, 101)
+    docx_bytes, docx_answers = ExamTemplate(exam).build_version(plan, code=101)
+    assert answers == docx_answers
+    found, numbers = _highlights(html)
+    for key in ("P1", "P2", "P3"): assert found[key] == answers[key]
+    assert numbers == question_numbers(docx_bytes)
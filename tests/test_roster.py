@@ -0,0 +1,52 @@
+"""Danh sách học sinh: đọc CSV/XLSX, tên file theo học sinh (kể cả trùng họ tên), gói mỗi học sinh 1 đề."""
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from tronde.bundle import create_zip_multiple
+from tronde.grading import load_answer_key
+from tronde.roster import Roster
+
+ROWS = {"Số báo danh": ["HS01", "HS02", "", "HS03"], "Họ và tên": ["Nguyễn Văn An", "Nguyễn Văn An", "", "Lê Thị Bé/Út"],
+        "Lớp": ["12A1", "12A2", "", "12A1"]}
+
+def _csv():
+    buffer = io.BytesIO(); pd.DataFrame(ROWS).to_csv(buffer, index=False, encoding="utf-8-sig"); buffer.seek(0)
+    return buffer
+
+def _xlsx():
+    buffer = io.BytesIO(); pd.DataFrame(ROWS).to_excel(buffer, index=False); buffer.seek(0)
+    return buffer
+
+@pytest.mark.parametrize("source, name", [(_csv, "lop.csv"), (_xlsx, "lop.xlsx")])
+def test_roster_from_table(source, name):
+    roster = Roster.from_table(source(), name, start_code=1001)
+    assert roster.rows() == [["HS01", "Nguyễn Văn An", "12A1"], ["HS02", "Nguyễn Văn An", "12A2"],
+                             ["HS03", "Lê Thị Bé/Út", "12A1"]]
+    assert list(roster.codes) == [1001, 1002, 1003]
+
+def test_same_name_students_get_distinct_files():
+    roster = Roster(["HS01", "HS02", "HS03"], ["Nguyễn Văn An", "Nguyễn Văn An", "Lê Thị Bé/Út"])
+    names = [roster.filename("De", code) for code in roster.codes]
+    assert names == ["De_101_HS01_Nguyễn_Văn_An.docx", "De_102_HS02_Nguyễn_Văn_An.docx", "De_103_HS03_Lê_Thị_Bé_Út.docx"]
+    with pytest.raises(ValueError): roster.filename("De", 104)
+
+def test_invalid_rosters():
+    with pytest.raises(ValueError): Roster(["HS01", "HS01"])
+    with pytest.raises(ValueError): Roster(["HS01", " "])
+    with pytest.raises(ValueError): Roster.from_table(io.StringIO("ho_ten\nAn\n"), "lop.csv")
+
+def test_bundle_per_student(exam, tmp_path):
+    roster = Roster(["HS01", "HS02", "HS03"], ["Nguyễn Văn An", "Nguyễn Văn An", "Trần Bình"], ["12A1"] * 3, 201)
+    bundle = create_zip_multiple(exam, "De", len(roster), "auto", roster.start_code, output=str(tmp_path / "lop.zip"),
+                                 seed=2, roster=roster)
+    with zipfile.ZipFile(bundle) as z:
+        docx = sorted(name for name in z.namelist() if name.endswith(".docx"))
+        assert docx == sorted(roster.filename("De", code) for code in roster.codes)
+        per_student = load_answer_key(io.BytesIO(z.read("Dap_An_Hoc_Sinh.csv")), "Dap_An_Hoc_Sinh.csv")
+        per_code = load_answer_key(io.BytesIO(z.read("Bang_Dap_An.csv")), "Bang_Dap_An.csv")
+        assert z.getinfo("Dap_An_Hoc_Sinh.xlsx").compress_type == zipfile.ZIP_STORED
+    assert per_student.index.tolist() == ["201", "202", "203"]
+    assert per_student.equals(per_code)
@@ -0,0 +1,63 @@
+"""Hoán vị cả loạt (sample_plans): khoảng cách Hamming tối thiểu, đáp án chia đều A-D, giới hạn chuỗi cùng chữ,
+ý d) giữ nguyên chỗ."""
+from collections import Counter
+from itertools import combinations, groupby
+
+import pytest
+
+from tronde.sampler import SamplerConstraints, sample_plans
+from tronde.template import ExamTemplate, apply_option_order, option_count
+
+CODES = range(101, 125)
+
+@pytest.fixture(scope="module")
+def template(exam):
+    return ExamTemplate(exam)
+
+def _orders(template, plan):
+    """Đọc plan ra (thứ tự phương án từng câu [(slot, order)], thứ tự câu nối tiếp của mọi phần được trộn)"""
+    options = []; questions = []; cursor = 0
+    for kind, piece in template.pieces:
+        if kind != "part": continue
+        for slot in piece["questions"]:
+            n = option_count(slot)
+            options.append((slot, list(plan[cursor:cursor + n]))); cursor += n
+        questions.extend(plan[cursor:cursor + len(piece["questions"])]); cursor += len(piece["questions"])
+    assert cursor == len(plan)
+    return options, questions
+
+def _p1_letters(template, plan):
+    answers = template.build_version(plan)[1]["P1"]
+    return [answers[n] for n in sorted(answers)]
+
+def test_minimum_hamming_distance(template):
+    plans, report = sample_plans(template, 5, CODES, SamplerConstraints(min_distance=14))
+    orders = [_orders(template, plans[code])[1] for code in CODES]
+    distance = min(sum(a != b for a, b in zip(x, y)) for x, y in combinations(orders, 2))
+    assert report["unresolved"] == 0 and distance >= 14 and report["min_distance"] == distance
+
+@pytest.mark.parametrize("max_run", [1, 2, 3])
+def test_letters_balanced_and_runs_limited(template, max_run):
+    plans, report = sample_plans(template, 9, CODES, SamplerConstraints(max_run=max_run))
+    for code in CODES:
+        letters = _p1_letters(template, plans[code])
+        counts = Counter(letters)
+        assert len(letters) == 12 and set(counts) <= set("ABCD")
+        assert max(counts.values()) - min(counts[letter] for letter in "ABCD") <= 1
+        assert max(len(list(run)) for _, run in groupby(letters)) <= max_run
+    assert report["longest_run"] <= max_run
+
+def test_option_d_stays_last(template):
+    plans, _ = sample_plans(template, 3, CODES)
+    tf_slots = [slot for kind, piece in template.pieces if kind == "part" for slot in piece["questions"]
+                if slot["kind"] == "tf" and slot["d"]]
+    assert tf_slots and all(option_count(slot) == 3 for slot in tf_slots)
+    for code in CODES:
+        for slot, order in _orders(template, plans[code])[0]:
+            if slot["kind"] != "tf" or not slot["d"]: continue
+            blocks = [id(block) for block in apply_option_order(slot, order)[0]]
+            d_block = id(slot["blocks"][slot["d"][0]])
+            assert blocks.index(d_block) > max(blocks.index(id(slot["blocks"][k])) for k in slot["options"])
+
+def test_same_inputs_same_plans(template):
+    assert sample_plans(template, 4, CODES)[0] == sample_plans(template, 4, CODES)[0]
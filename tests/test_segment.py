@@ -0,0 +1,30 @@
+"""Phân đoạn đề: tiêu đề PHẦN n (kể cả n >= 10), câu hỏi nhắc tới "phần n" không mở phần mới."""
+from tronde.segment import PART_MCQ, PART_TF, RE_PART_START
+from tronde.template import ExamTemplate
+
+from conftest import make_docx, mcq_question, paragraph, run, UNDERLINE
+
+def _parts(template):
+    return [piece for kind, piece in template.pieces if kind == "part"]
+
+def test_part_heading_with_two_digits():
+    assert RE_PART_START.match("PHẦN 10. Tự luận") and RE_PART_START.match("PHẦN 12")
+    assert not RE_PART_START.match("Câu 2. Chia thành phần 5 và phần 6")
+
+def test_question_mentioning_part_number_stays_a_question():
+    docx = make_docx("PHẦN 1. Trắc nghiệm nhiều lựa chọn",
+                     *mcq_question(1, "Tính giá trị của biểu thức.", 0),
+                     *mcq_question(2, "Một tập hợp được chia thành phần 5 và phần 6, phần 2 có bao nhiêu phần tử?", 2),
+                     *mcq_question(3, "Chọn khẳng định đúng.", 3))
+    template = ExamTemplate(docx)
+    (part,) = _parts(template)
+    assert part["type"] == PART_MCQ and len(part["questions"]) == 3
+    _, answers = template.build_version()
+    assert sorted(answers["P1"]) == [1, 2, 3]
+
+def test_part_mentioned_mid_line_in_older_layouts():
+    docx = make_docx("I. TRẮC NGHIỆM (PHẦN 1)", *mcq_question(1, "Chọn đáp án đúng.", 1),
+                     "II. ĐÚNG SAI (PHẦN 2)", "Câu 1. Xét tính đúng sai của các mệnh đề.",
+                     *[paragraph(run(f"{letter}) "), run(f"Mệnh đề {letter}", UNDERLINE if letter in "ac" else ""))
+                       for letter in "abcd"])
+    assert [part["type"] for part in _parts(ExamTemplate(docx))] == [PART_MCQ, PART_TF]
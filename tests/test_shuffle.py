@@ -0,0 +1,52 @@
+"""Đáp án trả về khớp nội dung file .docx đã trộn; trộn song song cho cùng kết quả với tuần tự."""
+import io
+import random
+import zipfile
+
+import pytest
+
+from tronde.bundle import create_zip_multiple, version_plan
+from tronde.template import ExamTemplate
+
+from conftest import document_answers, question_numbers
+
+@pytest.mark.parametrize("seed", range(4))
+def test_answer_key_matches_document(exam, seed):
+    template = ExamTemplate(exam)
+    docx_bytes, answers = template.build_version(version_plan(template, seed, 101))
+    assert document_answers(exam, docx_bytes) == {key: answers[key] for key in ("P1", "P2", "P3")}
+    assert question_numbers(docx_bytes) == list(range(1, 12 + 4 + 6 + 1))
+
+def test_split_question_labels_are_renumbered(exam):
+    template = ExamTemplate(exam)
+    assert all(id(slot["blocks"][0]) in template.anchors
+               for kind, piece in template.pieces if kind == "part" for slot in piece["questions"])
+
+def test_minidom_backend_matches_lxml(exam):
+    plan = version_plan(ExamTemplate(exam), 3, 102)
+    lxml_docx, lxml_answers = ExamTemplate(exam, backend="lxml").build_version(plan)
+    dom_docx, dom_answers = ExamTemplate(exam, backend="minidom").build_version(plan)
+    assert lxml_answers == dom_answers
+    assert question_numbers(lxml_docx) == question_numbers(dom_docx)
+
+def _members(path):
+    with zipfile.ZipFile(path) as z:
+        members = {}
+        for name in z.namelist():
+            data = z.read(name)
+            if name.endswith((".docx", ".xlsx")):     # so nội dung từng part; docProps/core.xml mang thời điểm tạo file
+                with zipfile.ZipFile(io.BytesIO(data)) as x:
+                    data = {n: x.read(n) for n in x.namelist() if n != "docProps/core.xml"}
+            members[name] = data
+        return members
+
+def test_parallel_matches_sequential(exam, tmp_path):
+    sequential = create_zip_multiple(exam, "De", 6, "auto", 101, output=str(tmp_path / "seq.zip"), seed=11)
+    parallel = create_zip_multiple(exam, "De", 6, "auto", 101, output=str(tmp_path / "par.zip"), seed=11, workers=3)
+    assert _members(sequential) == _members(parallel)
+
+def test_same_seed_same_version(exam):
+    template = ExamTemplate(exam)
+    first = template.build_version(version_plan(template, 5, 104))
+    again = ExamTemplate(exam).build_version(rng=random.Random("5:104"))
+    assert first == again
@@ -0,0 +1,34 @@
+"""Mã đề được điền vào chỗ {{MA_DE}} ở đầu trang, chân trang và thân đề, kể cả khi Word tách chỗ đó ra nhiều run."""
+import io
+import random
+import zipfile
+
+from tronde.template import ExamTemplate
+from tronde.word import get_text, iter_paragraphs, parse_part
+
+from conftest import W_NS, make_docx, mcq_question, paragraph, run
+
+def _header(*runs):
+    return f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:hdr xmlns:w="{W_NS}"><w:p>{"".join(runs)}</w:p></w:hdr>'
+
+def _texts(docx_bytes, name):
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as z: root = parse_part(z.read(name))
+    return [get_text(p) for p in iter_paragraphs(root)]
+
+def test_placeholder_split_across_runs_is_stamped():
+    docx = make_docx(paragraph(run("Mã đề: {{MA_"), run("DE}}", "<w:b/>")), "PHẦN 1. Trắc nghiệm",
+                     *mcq_question(1, "Chọn đáp án đúng.", 0), *mcq_question(2, "Chọn đáp án sai.", 3),
+                     parts={"word/header1.xml": _header(run("Mã đề "), run("{{MA"), run("_DE"), run("}}", "<w:i/>")),
+                            "word/footer2.xml": _header(run("Trang 1 - mã {{MA_DE}}"))})
+    template = ExamTemplate(docx)
+    for code in (101, 245):
+        docx_bytes, _ = template.build_version(rng=random.Random(code), code=code)
+        assert _texts(docx_bytes, "word/header1.xml") == [f"Mã đề {code}"]
+        assert _texts(docx_bytes, "word/footer2.xml") == [f"Trang 1 - mã {code}"]
+        assert _texts(docx_bytes, "word/document.xml")[0] == f"Mã đề: {code}"
+
+def test_without_code_placeholder_is_kept():
+    docx = make_docx("PHẦN 1. Trắc nghiệm", *mcq_question(1, "Chọn đáp án đúng.", 0),
+                     parts={"word/header1.xml": _header(run("{{MA_"), run("DE}}"))})
+    docx_bytes, _ = ExamTemplate(docx).build_version(rng=random.Random(0))
+    assert _texts(docx_bytes, "word/header1.xml") == ["{{MA_DE}}"]
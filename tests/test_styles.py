@@ -0,0 +1,33 @@
+"""Đáp án đánh dấu chỉ qua kiểu trong styles.xml (w:rStyle / w:pStyle) vẫn được nhận ra."""
+from tronde.template import ExamTemplate
+
+from conftest import make_docx, mcq_question, paragraph, run
+
+STYLES = ('<w:style w:type="character" w:styleId="DapAn"><w:name w:val="Dap An"/>'
+          '<w:rPr><w:color w:val="FF0000"/></w:rPr></w:style>'
+          '<w:style w:type="paragraph" w:styleId="DoanDung"><w:name w:val="Doan Dung"/>'
+          '<w:rPr><w:u w:val="single"/></w:rPr></w:style>'
+          '<w:style w:type="character" w:styleId="Thuong"><w:name w:val="Thuong"/>'
+          '<w:rPr><w:b/></w:rPr></w:style>')
+
+def _marked(docx):
+    template = ExamTemplate(docx)
+    return [slot["marked"] for kind, piece in template.pieces if kind == "part" for slot in piece["questions"]]
+
+def test_answer_marked_by_character_style():
+    docx = make_docx("PHẦN 1. Trắc nghiệm", *mcq_question(1, "Chọn đáp án đúng.", 2, '<w:rStyle w:val="DapAn"/>'),
+                     *mcq_question(2, "Kiểu không đánh dấu.", 1, '<w:rStyle w:val="Thuong"/>'), styles=STYLES)
+    assert _marked(docx) == [2, -1]
+
+def test_answer_marked_by_paragraph_style():
+    options = [paragraph(run(f"{letter}. Phương án {letter}"), style="DoanDung" if letter == "B" else None)
+               for letter in "ABCD"]
+    docx = make_docx("PHẦN 1. Trắc nghiệm", "Câu 1. Chọn đáp án đúng.", *options, styles=STYLES)
+    assert _marked(docx) == [1]
+
+def test_direct_formatting_overrides_style():
+    # Run tắt gạch chân trực tiếp (w:u none) trong đoạn kiểu DoanDung: không còn là đáp án
+    options = [paragraph(run(f"{letter}. Phương án {letter}", '<w:u w:val="none"/>' if letter == "A" else ""),
+                         style="DoanDung" if letter in "AC" else None) for letter in "ABCD"]
+    docx = make_docx("PHẦN 1. Trắc nghiệm", "Câu 1. Chọn đáp án đúng.", *options, styles=STYLES)
+    assert _marked(docx) == [2]
@@ -0,0 +1,37 @@
+"""Trộn đề Word (.docx) theo cấu trúc PHẦN 1-4 và tạo bảng đáp án.
+
+Gói lõi không phụ thuộc Streamlit: dùng được từ script, cron hoặc `python -m tronde`.
+"""
+from .word import (DEFAULT_BACKEND, get_text, is_marked_correct, extract_highlighted_text,
+                   LabelAnchor, find_label_anchor, apply_label,
+                   update_mcq_label, update_tf_label, update_question_label)
+from .styles import StyleMarks
+from .segment import BlockIndex, Outline, PartSpan, QuestionSpan, segment_blocks
+from .template import ExamTemplate, shuffle_docx
+from .compression import PRESETS, CompressionPolicy, compression_policy
+from .answer_key import (AnswerStore, answer_key_html, generate_answer_key_html, write_answer_key_csv,
+                         write_answer_key_xlsx)
+from .bundle import (batch_plans, bundle_base_name, bundle_filename, create_zip_multiple, regenerate_version,
+                     version_plan, version_rng)
+from .cache import BundleCache, bundle_key, lineage_key
+from .incremental import BundleUpdate, read_manifest, update_zip
+from .preview import preview_html
+from .roster import Roster
+from .bank import IngestReport, QuestionBank
+from .jobs import Job, JobQueue
+from .metrics import JobMetrics, StageTimer, configure_json_logging
+
+__all__ = [
+    "DEFAULT_BACKEND", "get_text", "is_marked_correct", "extract_highlighted_text",
+    "LabelAnchor", "find_label_anchor", "apply_label",
+    "update_mcq_label", "update_tf_label", "update_question_label",
+    "StyleMarks", "BlockIndex", "Outline", "PartSpan", "QuestionSpan", "segment_blocks",
+    "ExamTemplate", "shuffle_docx", "generate_answer_key_html",
+    "PRESETS", "CompressionPolicy", "compression_policy",
+    "AnswerStore", "answer_key_html", "write_answer_key_csv", "write_answer_key_xlsx",
+    "bundle_base_name", "bundle_filename", "create_zip_multiple", "regenerate_version",
+    "batch_plans", "version_plan", "version_rng",
+    "BundleCache", "bundle_key", "lineage_key", "BundleUpdate", "read_manifest", "update_zip",
+    "preview_html", "Roster",
+    "IngestReport", "QuestionBank", "Job", "JobQueue", "JobMetrics", "StageTimer", "configure_json_logging",
+]
@@ -0,0 +1,175 @@
+"""Bảng đáp án của tất cả mã đề: kho đáp án dạng cột (AnswerStore) và các định dạng xuất
+(Word-HTML, Excel .xlsx ghi theo từng dòng, CSV cho phần mềm chấm phiếu/OMR)."""
+import csv
+import io
+import shutil
+import tempfile
+from array import array
+try:
+    import xlsxwriter
+except ImportError:  # Không có xlsxwriter -> bỏ qua file .xlsx
+    xlsxwriter = None
+
+XLSX_SPOOL_BYTES = 8 * 1024 ** 2     # file .xlsx lớn hơn mức này được ghi tạm ra đĩa trước khi chép vào gói
+
+# Các phần có đáp án: khóa -> (tiêu đề, tiền tố tiêu đề cột, tên sheet, ghi chú cách tính điểm)
+PARTS = {
+    "P1": ("PHẦN I: Trắc nghiệm nhiều lựa chọn", "", "Phần I",
+           ("- Mỗi câu đúng được 0,25 điểm.",)),
+    "P2": ("PHẦN II: Trắc nghiệm đúng sai", "Câu ", "Phần II",
+           ("- Điểm tối đa mỗi câu là 1 điểm.",
+            "- Đúng 1 ý được 0,1 điểm; đúng 2 ý được 0,25 điểm; đúng 3 ý được 0,5 điểm; đúng 4 ý được 1 điểm.")),
+    "P3": ("PHẦN III: Trắc nghiệm trả lời ngắn", "Câu ", "Phần III",
+           ("- Điểm tối đa mỗi câu là 0,5 điểm.",)),
+}
+
+class AnswerStore:
+    """Đáp án theo cột: mỗi phần 1 mảng phẳng (dòng = mã đề, cột = câu), mã đề trong array('l').
+
+    Các cột (số câu) của mỗi phần là hợp số câu của mọi mã đề đã thêm, sắp tăng dần - không phụ thuộc thứ tự
+    thêm (khi trộn song song, mã đề nào xong trước là ngẫu nhiên). Mọi mã đề trộn từ cùng 1 đề gốc nên thường
+    có cùng tập câu; nếu không, cột mới được chèn vào và các dòng đã có để trống ở cột đó.
+    Thêm mã đề theo thứ tự bất kỳ; khi xuất, các dòng được sắp theo mã đề.
+    """
+
+    def __init__(self):
+        self.codes = array('l')
+        self.questions = {}     # khóa phần -> danh sách số câu (cột), theo thứ tự PARTS
+        self.cells = {}         # khóa phần -> list phẳng len(codes) * len(questions)
+        self._known = {}        # khóa phần -> tập số câu đã có cột
+
+    @classmethod
+    def from_dict(cls, all_exam_data):
+        """Từ dict {mã đề: đáp án} (dạng trả về của shuffle_docx)"""
+        store = cls()
+        for code in sorted(all_exam_data): store.add(code, all_exam_data[code])
+        return store
+
+    def add(self, code, answers):
+        for key in PARTS:
+            part = answers.get(key)
+            if part and not part.keys() <= self._known.get(key, frozenset()): self._widen(key, part)
+        self.codes.append(code)
+        for key, q_nums in self.questions.items():
+            ans_map = answers.get(key, {})
+            self.cells[key].extend(ans_map.get(q, '') for q in q_nums)
+
+    def _widen(self, key, part):
+        """Thêm cột cho các câu của part chưa có; dòng đã có để trống ở cột mới"""
+        old = self.questions.get(key, []); known = self._known.setdefault(key, set())
+        known.update(part); q_nums = sorted(known)
+        old_cells = self.cells.get(key, []); width = len(old); cells = []
+        for i in range(len(self.codes)):
+            row = dict(zip(old, old_cells[i * width:(i + 1) * width]))
+            cells.extend(row.get(q, '') for q in q_nums)
+        self.questions[key] = q_nums; self.cells[key] = cells
+        self.questions = {k: self.questions[k] for k in PARTS if k in self.questions}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def order(self):
+        """Chỉ số dòng theo mã đề tăng dần"""
+        return sorted(range(len(self.codes)), key=self.codes.__getitem__)
+
+    def row(self, key, i):
+        width = len(self.questions[key])
+        return self.cells[key][i * width:(i + 1) * width]
+
+    def iter_rows(self, key):
+        """(mã đề, đáp án các câu) của 1 phần, theo mã đề tăng dần"""
+        for i in self.order(): yield self.codes[i], self.row(key, i)
+
+    def columns(self):
+        """Tiêu đề cột dạng "P1_5" của mọi phần, theo thứ tự phần"""
+        return [f"{key}_{q}" for key, q_nums in self.questions.items() for q in q_nums]
+
+    def iter_flat_rows(self):
+        """(mã đề, đáp án mọi phần nối tiếp) theo mã đề tăng dần"""
+        for i in self.order():
+            yield self.codes[i], [cell for key in self.questions for cell in self.row(key, i)]
+
+HTML_HEAD = """
+    <html xmlns:o='urn:schemas-microsoft-com:office:office' xmlns:w='urn:schemas-microsoft-com:office:word' xmlns='http://www.w3.org/TR/REC-html40'>
+    <head><meta charset='utf-8'><title>Đáp án</title>
+    <style>
+        body { font-family: 'Times New Roman', serif; font-size: 12pt; }
+        h1, h2 { text-align: center; color: #C00000; margin: 5px 0; }
+        h3 { color: #002060; margin-top: 20px; margin-bottom: 5px; font-size: 13pt; }
+        table { border-collapse: collapse; width: 100%; margin-bottom: 15px; }
+        th, td { border: 1px solid black; padding: 5px; text-align: center; font-size: 11pt; }
+        th { background-color: #D9E2F3; font-weight: bold; }
+        .note { font-style: italic; font-size: 11pt; color: #002060; margin-bottom: 5px; }
+    </style>
+    </head><body>
+    """ + """
+    <h1>TRƯỜNG THPT MINH ĐỨC</h1>
+    <h2>BẢNG ĐÁP ÁN</h2>
+    <p style='text-align:center; font-weight:bold;'>KIỂM TRA HỌC KỲ I - NĂM HỌC 2025 – 2026</p>
+    <br>
+    """
+
+def answer_key_html(store):
+    """File Word-HTML Bang_Dap_An.doc từ AnswerStore (ghép list, không cộng chuỗi lặp)"""
+    out = [HTML_HEAD]
+    for key, q_nums in store.questions.items():
+        title, prefix, _, notes = PARTS[key]
+        out.append(f"<h3>{title}</h3>")
+        out.extend(f"<div class='note'>{note}</div>" for note in notes)
+        out.append("<table><tr><th>Mã đề</th>")
+        out.extend(f"<th>{prefix}{q}</th>" for q in q_nums)
+        out.append("</tr>")
+        for code, row in store.iter_rows(key):
+            out.append(f"<tr><td><b>{code}</b></td>")
+            out.extend(f"<td><b>{ans}</b></td>" for ans in row)
+            out.append("</tr>")
+        out.append("</table>")
+    out.append("</body></html>")
+    return "".join(out)
+
+def generate_answer_key_html(all_exam_data):
+    return answer_key_html(AnswerStore.from_dict(all_exam_data))
+
+def write_answer_key_xlsx(store, output):
+    """Excel: 1 sheet mỗi phần + sheet "Tổng hợp" (1 dòng/mã đề, mọi câu). Chế độ constant_memory của
+    xlsxwriter ghi từng dòng xuống đĩa nên bộ nhớ không tăng theo số mã đề. output: đường dẫn hoặc file-like."""
+    if xlsxwriter is None: raise RuntimeError("Cần cài xlsxwriter để xuất file .xlsx")
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    header = workbook.add_format({"bold": True, "bg_color": "#D9E2F3", "border": 1, "align": "center"})
+    cell = workbook.add_format({"border": 1, "align": "center"})
+    try:
+        for key, q_nums in store.questions.items():
+            _, prefix, sheet_name, _ = PARTS[key]
+            sheet = workbook.add_worksheet(sheet_name)
+            sheet.write_row(0, 0, ["Mã đề"] + [f"{prefix}{q}" for q in q_nums], header)
+            for r, (code, row) in enumerate(store.iter_rows(key), start=1):
+                sheet.write_number(r, 0, code, header); sheet.write_row(r, 1, row, cell)
+        sheet = workbook.add_worksheet("Tổng hợp")
+        sheet.write_row(0, 0, ["ma_de"] + store.columns(), header)
+        for r, (code, row) in enumerate(store.iter_flat_rows(), start=1):
+            sheet.write_number(r, 0, code); sheet.write_row(r, 1, row)
+    finally:
+        workbook.close()
+
+def write_answer_key_csv(store, output):
+    """CSV cho máy chấm/OMR: cột ma_de, P1_1..., P2_n..., P3_n...; output là luồng văn bản"""
+    writer = csv.writer(output)
+    writer.writerow(["ma_de"] + store.columns())
+    for code, row in store.iter_flat_rows(): writer.writerow([code] + row)
+
+def write_xlsx_member(zout, name, write, policy=None):
+    """Ghi file .xlsx do write(file_tạm) tạo vào gói .zip đang mở. xlsxwriter cần file seek được: ghi vào
+    SpooledTemporaryFile (chỉ giữ trong RAM khi nhỏ) rồi chép từng khối vào member - không dựng cả file trong bộ nhớ.
+    policy: CompressionPolicy của gói (.xlsx đã nén sẵn -> STORED); None: kiểu nén mặc định của zout."""
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_BYTES) as spool:
+        write(spool)
+        spool.seek(0)
+        with (policy.open_member(zout, name) if policy is not None else zout.open(name, 'w')) as member:
+            shutil.copyfileobj(spool, member)
+
+def write_answer_keys(store, zout, base="Bang_Dap_An", policy=None):
+    """Ghi mọi định dạng bảng đáp án vào gói .zip đang mở (policy: xem write_xlsx_member)"""
+    zout.writestr(f"{base}.doc", answer_key_html(store).encode('utf-8'))
+    with zout.open(f"{base}.csv", 'w') as member:
+        with io.TextIOWrapper(member, encoding="utf-8-sig", newline="") as text: write_answer_key_csv(store, text)
+    if xlsxwriter is not None: write_xlsx_member(zout, f"{base}.xlsx", lambda output: write_answer_key_xlsx(store, output), policy)
@@ -0,0 +1,420 @@
+"""Ngân hàng câu hỏi (SQLite) gom từ nhiều file đề .docx; ghép đề mới từ ngân hàng không cần parse lại file nguồn.
+
+Nạp (ingest): file được phân đoạn bằng ExamTemplate (PHẦN -> câu hỏi -> phương án, cùng logic với trộn đề).
+Mỗi câu lưu: đoạn XML đã serialize sẵn (nhãn "Câu n." thay bằng QUESTION_SLOT), loại phần, đáp án, mã băm
+nội dung (câu trùng không lưu lại), các quan hệ rId nó dùng; ảnh/media lưu 1 lần theo SHA-256.
+
+Ghép đề (build): lấy ngẫu nhiên N câu mỗi phần (lọc theo thẻ), nối các đoạn XML vào "vỏ" của 1 file nguồn
+(phần đầu đề, w:sectPr, styles, header/footer...), đổi rId của từng câu sang rId mới trong document.xml.rels
+và chép media cần dùng. Kết quả là file .docx đề gốc, trộn tiếp như mọi đề khác.
+Kiểu (styles) và đánh số danh sách theo file vỏ; phần dẫn riêng của từng PHẦN không được lưu.
+
+    python -m tronde.bank ingest ngan_hang.db De_1.docx De_2.docx --tag "Toán 12"
+    python -m tronde.bank build ngan_hang.db -o De_moi.docx --mcq 12 --tf 4 --short 6 --tag "Toán 12"
+"""
+import argparse
+import hashlib
+import io
+import os
+import posixpath
+import random
+import re
+import sqlite3
+import sys
+import time
+import zipfile
+from dataclasses import dataclass, field
+from xml.dom import minidom
+from xml.sax.saxutils import escape, quoteattr
+
+from .segment import PART_MCQ, PART_TF, PART_SHORT, PART_ESSAY, analyze_question
+from .template import CODE_PLACEHOLDER, ExamTemplate
+from .splice import DocumentSplicer
+from .word import W_NS, find_label_anchor
+from .ziputil import iter_raw_members, write_raw_member
+
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+DOCUMENT_RELS = "word/_rels/document.xml.rels"
+CONTENT_TYPES = "[Content_Types].xml"
+
+QUESTION_SLOT = "Câu".encode("utf-8")     # chỗ nhãn "Câu n." trong đoạn XML đã lưu (ký tự vùng riêng)
+# Thứ tự phần trong đề ghép: loại phần -> (số PHẦN, tiêu đề, tên tham số dòng lệnh)
+PARTS = {
+    PART_MCQ: (1, "TRẮC NGHIỆM NHIỀU LỰA CHỌN", "mcq"),
+    PART_TF: (2, "TRẮC NGHIỆM ĐÚNG SAI", "tf"),
+    PART_SHORT: (3, "TRẮC NGHIỆM TRẢ LỜI NGẮN", "short"),
+    PART_ESSAY: (4, "TỰ LUẬN", "essay"),
+}
+
+RE_XMLNS = re.compile(rb'\sxmlns:([\w.-]+)="([^"]*)"')
+RE_ROOT_START = re.compile(rb'<[\w.-]+:document\b[^>]*>')
+# Thuộc tính / thẻ Word tự sinh khi lưu, không thuộc nội dung câu (bỏ khi băm)
+RE_VOLATILE = re.compile(rb'\s[\w.-]+:(?:rsid\w*|paraId|textId)="[^"]*"|<[\w.-]+:(?:proofErr|bookmarkStart|bookmarkEnd)\b[^>]*/>')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY, name TEXT, sha256 TEXT UNIQUE, added REAL,
+    package BLOB, prefix BLOB, head BLOB, trailer BLOB);
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY, source_id INTEGER REFERENCES sources(id), part_type TEXT, kind TEXT,
+    answer TEXT, text TEXT, content_hash TEXT UNIQUE, xml BLOB);
+CREATE INDEX IF NOT EXISTS questions_part ON questions(part_type);
+CREATE TABLE IF NOT EXISTS question_rels (
+    question_id INTEGER REFERENCES questions(id), rid TEXT, type TEXT, target TEXT, external INTEGER,
+    media TEXT REFERENCES media(sha256), PRIMARY KEY (question_id, rid));
+CREATE TABLE IF NOT EXISTS media (sha256 TEXT PRIMARY KEY, ext TEXT, content_type TEXT, data BLOB);
+CREATE TABLE IF NOT EXISTS tags (question_id INTEGER REFERENCES questions(id), tag TEXT, PRIMARY KEY (question_id, tag));
+CREATE INDEX IF NOT EXISTS tags_tag ON tags(tag);
+"""
+
+def default_bank_path():
+    return os.environ.get("TRONDE_BANK") or os.path.join(os.path.expanduser("~"), ".tronde", "ngan_hang.db")
+
+@dataclass
+class IngestReport:
+    """Kết quả nạp 1 file: số câu mới, số câu đã có (trùng nội dung), các câu bỏ qua kèm lý do"""
+    name: str
+    source_id: int = None
+    added: int = 0
+    duplicates: int = 0
+    skipped: list = field(default_factory=list)
+
+# ==================== ĐỌC GÓI .DOCX ====================
+
+def _namespaces(prefix):
+    """{tiền tố: URI} khai báo trên thẻ gốc w:document (nằm trong đoạn prefix của DocumentSplicer)"""
+    start = RE_ROOT_START.search(prefix)
+    if start is None: raise ValueError("Không tìm thấy thẻ w:document")
+    return {p.decode(): uri.decode() for p, uri in RE_XMLNS.findall(start.group())}
+
+def _prefix_of(namespaces, uri):
+    return next((p for p, u in namespaces.items() if u == uri), None)
+
+def _rid_pattern(namespaces):
+    """Thuộc tính tham chiếu quan hệ (r:id, r:embed, r:link...) theo tiền tố của namespace relationships"""
+    prefix = _prefix_of(namespaces, R_NS)
+    return re.compile(rb'(\s' + re.escape(prefix.encode()) + rb':\w+=")([^"]*)"') if prefix else None
+
+def _read_rels(zin):
+    """{rId: (Type, Target, External)} của document.xml.rels"""
+    if DOCUMENT_RELS not in zin.NameToInfo: return {}
+    dom = minidom.parseString(zin.read(DOCUMENT_RELS))
+    return {el.getAttribute("Id"): (el.getAttribute("Type"), el.getAttribute("Target"),
+                                   el.getAttribute("TargetMode") == "External")
+            for el in dom.getElementsByTagNameNS(REL_NS, "Relationship")}
+
+def _read_content_types(zin):
+    """({phần mở rộng: content type}, {đường dẫn part: content type})"""
+    dom = minidom.parseString(zin.read(CONTENT_TYPES))
+    defaults = {el.getAttribute("Extension").lower(): el.getAttribute("ContentType")
+                for el in dom.getElementsByTagNameNS(CT_NS, "Default")}
+    overrides = {el.getAttribute("PartName").lstrip("/"): el.getAttribute("ContentType")
+                 for el in dom.getElementsByTagNameNS(CT_NS, "Override")}
+    return defaults, overrides
+
+def _part_rels_name(path):
+    folder, name = posixpath.split(path)
+    return posixpath.join(folder, "_rels", name + ".rels")
+
+def _block_bytes(splicer, block, label_slot=None):
+    fragment = splicer.fragments[id(block)]
+    if type(fragment) is bytes: return fragment
+    if type(fragment) is tuple:
+        head, tail, label = fragment
+        return head + (label_slot or label) + tail
+    # Khối có chỗ mã đề: giữ nguyên placeholder để đề ghép vẫn điền được mã đề khi trộn
+    stamp = escape(CODE_PLACEHOLDER).encode("utf-8")
+    return b"".join(stamp if piece is None else (label_slot or piece[0]) if type(piece) is tuple else piece
+                    for piece in fragment)
+
+def _content_hash(part_type, xml, rid_pattern, question_rels):
+    """Mã băm đoạn XML đã lưu của câu (nhãn "Câu n." đã là QUESTION_SLOT), bỏ rsid/paraId/bookmark và thay rId
+    bằng SHA-256 media (hoặc đích liên kết ngoài): câu chỉ khác nhau ở công thức OMML, bảng, ảnh vẫn là 2 câu"""
+    targets = {rid: (sha or target).encode("utf-8") for rid, _, target, _, sha in question_rels}
+    xml = RE_VOLATILE.sub(b"", xml)
+    if rid_pattern is not None:
+        xml = rid_pattern.sub(lambda m: m.group(1) + targets.get(m.group(2).decode(), m.group(2)) + b'"', xml)
+    return hashlib.sha256(part_type.encode("utf-8") + b"\n" + xml).hexdigest()
+
+def _slot_answer(slot):
+    if slot["kind"] == "mcq": return "ABCD"[slot["marked"]] if 0 <= slot["marked"] < 4 else ""
+    if slot["kind"] == "tf":
+        statuses = list(slot["statuses"]) + ([slot["d"][1]] if slot["d"] else [])
+        return "-".join(statuses)
+    return slot.get("answer") or ""
+
+# ==================== NGÂN HÀNG ====================
+
+class QuestionBank:
+    """Ngân hàng câu hỏi trong 1 file SQLite. Dùng: with QuestionBank(path) as bank: ..."""
+
+    def __init__(self, path=None):
+        self.path = path or default_bank_path()
+        if self.path != ":memory:": os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- nạp ----------
+
+    def ingest(self, file_bytes, name, tags=()):
+        """Phân đoạn 1 file đề và lưu mọi câu hỏi (kèm thẻ tags); file đã nạp (cùng nội dung) được bỏ qua"""
+        report = IngestReport(name)
+        sha = hashlib.sha256(file_bytes).hexdigest()
+        row = self.conn.execute("SELECT id FROM sources WHERE sha256 = ?", (sha,)).fetchone()
+        if row:
+            report.source_id = row[0]; report.skipped.append("File đã có trong ngân hàng"); return report
+        template = ExamTemplate(file_bytes, "auto", style_labels=False)   # câu lưu giữ định dạng gốc của nhãn
+        index = template.index; splicer = self._question_splicer(template)
+        namespaces = _namespaces(splicer.prefix); rid_pattern = _rid_pattern(namespaces)
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as zin:
+            rels = _read_rels(zin); defaults, overrides = _read_content_types(zin)
+            head = b""
+            first = template.outline.parts[0]
+            if first.number is None and first.type is None:
+                head = b"".join(_block_bytes(splicer, index.blocks[pos]) for pos in first.blocks)
+            with self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO sources (name, sha256, added, package, prefix, head, trailer) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (name, sha, time.time(), file_bytes, splicer.prefix, head, splicer.trailer))
+                report.source_id = cursor.lastrowid
+                for part in template.outline.parts:
+                    if part.type is None: continue
+                    for number, question in enumerate(part.questions, 1):
+                        slot = analyze_question(question, part.type, index)
+                        blocks = slot["blocks"]
+                        xml = b"".join(_block_bytes(splicer, block, QUESTION_SLOT if i == 0 else None)
+                                       for i, block in enumerate(blocks))
+                        text = " ".join(index.texts[pos] for pos in question.blocks)
+                        try:
+                            question_rels = self._question_rels(zin, xml, rid_pattern, rels, defaults, overrides)
+                        except ValueError as e:
+                            report.skipped.append(f"{index.texts[question.blocks[0]][:40]}: {e}"); continue
+                        content_hash = _content_hash(part.type, xml, rid_pattern, question_rels)
+                        cursor = self.conn.execute(
+                            "INSERT OR IGNORE INTO questions (source_id, part_type, kind, answer, text, content_hash, xml)"
+                            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (report.source_id, part.type, slot["kind"], _slot_answer(slot), text, content_hash, xml))
+                        if not cursor.rowcount:
+                            report.duplicates += 1; continue
+                        question_id = cursor.lastrowid; report.added += 1
+                        self.conn.executemany("INSERT INTO question_rels VALUES (?, ?, ?, ?, ?, ?)",
+                                              [(question_id, *r) for r in question_rels])
+                        self.conn.executemany("INSERT OR IGNORE INTO tags VALUES (?, ?)",
+                                              [(question_id, tag) for tag in tags])
+        return report
+
+    @staticmethod
+    def _question_splicer(template):
+        """Splicer có chỗ nhãn ở mọi câu: PHẦN 4 (tự luận) không được trộn nên ExamTemplate không tách nhãn"""
+        anchors = dict(template.anchors)
+        for part in template.outline.parts:
+            if part.type is None: continue
+            for question in part.questions:
+                block = template.index.blocks[question.blocks[0]]
+                if id(block) in anchors: continue
+                anchor = find_label_anchor(block, "question")
+                if anchor is not None: anchors[id(block)] = anchor
+        if len(anchors) == len(template.anchors): return template.splicer
+        return DocumentSplicer(template.root, template.body, template.index.blocks, template.other_nodes, anchors,
+                               style_labels=False)
+
+    def _question_rels(self, zin, xml, rid_pattern, rels, defaults, overrides):
+        """Các quan hệ (rId, Type, Target, External, SHA-256 media) câu hỏi dùng; media được lưu vào bảng media"""
+        if rid_pattern is None: return []
+        found = []
+        for rid in dict.fromkeys(m.group(2).decode() for m in rid_pattern.finditer(xml)):
+            if rid not in rels: raise ValueError(f"quan hệ {rid} không tồn tại")
+            rel_type, target, external = rels[rid]
+            if external:
+                found.append((rid, rel_type, target, 1, None)); continue
+            path = posixpath.normpath(posixpath.join("word", target))
+            if path not in zin.NameToInfo: raise ValueError(f"thiếu {path}")
+            if _part_rels_name(path) in zin.NameToInfo: raise ValueError(f"{path} có quan hệ riêng (biểu đồ...), chưa hỗ trợ")
+            data = zin.read(path); sha = hashlib.sha256(data).hexdigest()
+            ext = posixpath.splitext(path)[1].lower()
+            content_type = overrides.get(path) or defaults.get(ext.lstrip("."), "application/octet-stream")
+            self.conn.execute("INSERT OR IGNORE INTO media VALUES (?, ?, ?, ?)", (sha, ext, content_type, data))
+            found.append((rid, rel_type, None, 0, sha))
+        return found
+
+    def add_tags(self, question_ids, tags):
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO tags VALUES (?, ?)",
+                                  [(qid, tag) for qid in question_ids for tag in tags])
+
+    # ---------- tra cứu ----------
+
+    def _select(self, part_type, tags=()):
+        sql = "SELECT id FROM questions WHERE part_type = ?"; params = [part_type]
+        for tag in tags:
+            sql += " AND id IN (SELECT question_id FROM tags WHERE tag = ?)"; params.append(tag)
+        return [row[0] for row in self.conn.execute(sql + " ORDER BY id", params)]
+
+    def counts(self, tags=()):
+        """Số câu mỗi loại phần khớp mọi thẻ trong tags"""
+        return {part_type: len(self._select(part_type, tags)) for part_type in PARTS}
+
+    def tags(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT tag FROM tags ORDER BY tag")]
+
+    # ---------- ghép đề ----------
+
+    def sample(self, counts, tags=(), seed=None):
+        """Chọn ngẫu nhiên counts[loại phần] câu mỗi phần; trả về [(loại phần, [id câu])] theo thứ tự PHẦN"""
+        rng = random.Random(seed); chosen = []
+        for part_type, (number, title, _) in PARTS.items():
+            n = counts.get(part_type, 0)
+            if not n: continue
+            ids = self._select(part_type, tags)
+            if len(ids) < n: raise ValueError(f"Ngân hàng chỉ có {len(ids)} câu PHẦN {number} ({title}) khớp bộ lọc, cần {n}")
+            chosen.append((part_type, rng.sample(ids, n)))
+        if not chosen: raise ValueError("Chưa chọn số câu cho phần nào")
+        return chosen
+
+    def build(self, counts, tags=(), seed=None, base=None, output=None):
+        """Ghép đề .docx từ ngân hàng; base: id file nguồn làm vỏ (mặc định file của câu đầu tiên).
+        Ghi ra output (đường dẫn hoặc file-like) nếu có, ngược lại trả về bytes; kèm danh sách id câu đã dùng."""
+        chosen = self.sample(counts, tags, seed)
+        question_ids = [qid for _, ids in chosen for qid in ids]
+        rows = {row[0]: row[1:] for row in self.conn.execute(
+            f"SELECT id, source_id, xml FROM questions WHERE id IN ({','.join('?' * len(question_ids))})", question_ids)}
+        if base is None: base = rows[question_ids[0]][0]
+        package, prefix, head, trailer = self.conn.execute(
+            "SELECT package, prefix, head, trailer FROM sources WHERE id = ?", (base,)).fetchone()
+        root_namespaces = _namespaces(prefix); w = _prefix_of(root_namespaces, W_NS) or "w"
+        extra_namespaces = {}; source_patterns = {}
+        rel_ids = {}; new_rels = []; media_members = {}
+        with zipfile.ZipFile(io.BytesIO(package)) as zin:
+            base_rel_ids = set(_read_rels(zin))
+            defaults, _ = _read_content_types(zin)
+
+        def new_rel(rel_type, target, external):
+            key = (rel_type, target, external)
+            if key not in rel_ids:
+                rid = f"rIdQb{len(rel_ids) + 1}"
+                while rid in base_rel_ids: rid += "x"
+                rel_ids[key] = rid; new_rels.append((rid, rel_type, target, external))
+            return rel_ids[key]
+
+        body = [head]; number = 1
+        for part_type, ids in chosen:
+            part_number, title, _ = PARTS[part_type]
+            if part_type == PART_ESSAY: number = 1      # tự luận đánh số lại từ Câu 1 như đề gốc
+            body.append(f'<{w}:p><{w}:r><{w}:rPr><{w}:b/></{w}:rPr><{w}:t xml:space="preserve">PHẦN {part_number}. {title}'
+                        f'</{w}:t></{w}:r></{w}:p>'.encode("utf-8"))
+            for qid in ids:
+                source_id, xml = rows[qid]
+                if source_id not in source_patterns:
+                    (source_prefix,) = self.conn.execute("SELECT prefix FROM sources WHERE id = ?", (source_id,)).fetchone()
+                    namespaces = _namespaces(source_prefix)
+                    for p, uri in namespaces.items():
+                        if root_namespaces.get(p, extra_namespaces.get(p, uri)) != uri:
+                            raise ValueError(f"Tiền tố XML {p} mang 2 nghĩa khác nhau giữa các file nguồn")
+                        if p not in root_namespaces: extra_namespaces[p] = uri
+                    source_patterns[source_id] = _rid_pattern(namespaces)
+                mapping = {}
+                for rid, rel_type, target, external, sha in self.conn.execute(
+                        "SELECT rid, type, target, external, media FROM question_rels WHERE question_id = ?", (qid,)):
+                    if sha:
+                        if sha not in media_members:
+                            ext, content_type = self.conn.execute(
+                                "SELECT ext, content_type FROM media WHERE sha256 = ?", (sha,)).fetchone()
+                            media_members[sha] = (f"media/bank_{sha[:16]}{ext}", ext, content_type)
+                        target = media_members[sha][0]
+                    mapping[rid.encode()] = new_rel(rel_type, target, bool(external)).encode()
+                if mapping:
+                    xml = source_patterns[source_id].sub(lambda m: m.group(1) + mapping.get(m.group(2), m.group(2)) + b'"', xml)
+                body.append(xml.replace(QUESTION_SLOT, f"Câu {number}.".encode("utf-8"), 1)); number += 1
+        if extra_namespaces:
+            declarations = b"".join(f' xmlns:{p}={quoteattr(uri)}'.encode("utf-8") for p, uri in extra_namespaces.items())
+            start = RE_ROOT_START.search(prefix)
+            prefix = prefix[:start.end() - 1] + declarations + prefix[start.end() - 1:]
+        document_xml = prefix + b"".join(body) + trailer
+
+        buffer = None
+        if output is None: output = buffer = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(package)) as zin, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zout:
+            rels_xml = zin.read(DOCUMENT_RELS) if DOCUMENT_RELS in zin.NameToInfo else (
+                f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{REL_NS}"></Relationships>'.encode())
+            content_types = zin.read(CONTENT_TYPES)
+            for item, raw in iter_raw_members(package):
+                if item.filename in ("word/document.xml", DOCUMENT_RELS, CONTENT_TYPES): continue
+                write_raw_member(zout, item, raw)
+            entries = "".join(
+                f'<Relationship Id="{rid}" Type={quoteattr(rel_type)} Target={quoteattr(target)}'
+                + (' TargetMode="External"/>' if external else '/>') for rid, rel_type, target, external in new_rels)
+            zout.writestr(CONTENT_TYPES, self._content_types(content_types, defaults, media_members.values()))
+            zout.writestr(DOCUMENT_RELS, rels_xml.replace(b"</Relationships>", entries.encode("utf-8") + b"</Relationships>"))
+            zout.writestr("word/document.xml", document_xml)
+            for sha, (member, _, _) in media_members.items():
+                (data,) = self.conn.execute("SELECT data FROM media WHERE sha256 = ?", (sha,)).fetchone()
+                zout.writestr(f"word/{member}", data)
+        return (buffer.getvalue() if buffer is not None else output), question_ids
+
+    @staticmethod
+    def _content_types(content_types, defaults, media):
+        missing = {}
+        for _, ext, content_type in media:
+            ext = ext.lstrip(".")
+            if ext and ext not in defaults: missing[ext] = content_type
+        entries = "".join(f'<Default Extension={quoteattr(ext)} ContentType={quoteattr(ct)}/>' for ext, ct in missing.items())
+        return content_types.replace(b"</Types>", entries.encode("utf-8") + b"</Types>")
+
+# ==================== DÒNG LỆNH ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tronde.bank", description="Ngân hàng câu hỏi: nạp file đề, ghép đề mới.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="nạp các file .docx vào ngân hàng")
+    ingest.add_argument("bank", help="file ngân hàng SQLite (chưa có thì tạo)")
+    ingest.add_argument("files", nargs="+", help="các file đề .docx")
+    ingest.add_argument("--tag", action="append", default=[], help="thẻ gắn cho mọi câu của các file (lặp lại được)")
+    build = commands.add_parser("build", help="ghép đề .docx từ ngân hàng")
+    build.add_argument("bank")
+    build.add_argument("-o", "--output", default="De_Ngan_Hang.docx")
+    for part_type, (number, title, option) in PARTS.items():
+        build.add_argument(f"--{option}", type=int, default=0, help=f"số câu PHẦN {number} ({title.lower()})")
+    build.add_argument("--tag", action="append", default=[], help="chỉ lấy câu có thẻ này (lặp lại: có mọi thẻ)")
+    build.add_argument("--seed", type=int, default=None)
+    build.add_argument("--base", type=int, default=None, help="id file nguồn làm vỏ đề (mặc định: file của câu đầu tiên)")
+    stats = commands.add_parser("stats", help="số câu mỗi phần")
+    stats.add_argument("bank")
+    stats.add_argument("--tag", action="append", default=[])
+    args = parser.parse_args(argv)
+
+    with QuestionBank(args.bank) as bank:
+        if args.command == "ingest":
+            status = 0
+            for path in args.files:
+                try:
+                    with open(path, "rb") as f: report = bank.ingest(f.read(), os.path.basename(path), args.tag)
+                except Exception as e:
+                    print(f"Lỗi {path}: {e}", file=sys.stderr); status = 1; continue
+                print(f"{path}: thêm {report.added} câu, trùng {report.duplicates}")
+                for reason in report.skipped: print(f"  bỏ qua: {reason}", file=sys.stderr)
+            return status
+        if args.command == "stats":
+            for part_type, count in bank.counts(args.tag).items(): print(f"PHẦN {PARTS[part_type][0]}: {count} câu")
+            return 0
+        counts = {part_type: getattr(args, option) for part_type, (_, _, option) in PARTS.items()}
+        try:
+            _, question_ids = bank.build(counts, args.tag, args.seed, args.base, output=args.output)
+        except ValueError as e:
+            print(f"Lỗi: {e}", file=sys.stderr)
+            return 1
+        print(f"{os.path.abspath(args.output)} ({len(question_ids)} câu)")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Đo hiệu năng từng bước trộn đề trên đề giả lập; kiểm tra kết quả không đổi (golden).
+
+    python -m tronde.bench                         # bảng thời gian: mọi cỡ đề x 1, 4, 20, 50 mã đề
+    python -m tronde.bench --sizes heavy -n 50 --json ket_qua.json
+    python -m tronde.bench --golden golden.json    # lần đầu: ghi; các lần sau: so sánh, khác -> mã lỗi 1
+
+Mỗi trường hợp chạy trong 1 tiến trình con riêng để số đo bộ nhớ đỉnh (RSS) không cộng dồn.
+"""
+import argparse
+import hashlib
+import io
+import json
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .answer_key import generate_answer_key_html
+from .bundle import version_plan
+from .metrics import STAGES, StageTimer, peak_rss_mb
+from .synthetic import build_exam
+from .template import ExamTemplate
+from .word import DEFAULT_BACKEND, element_children, get_text, parse_document
+
+# Cỡ đề giả lập: tham số của build_exam
+SIZES = {
+    "small": dict(mcq=12, tf=4, short=6, essay=1, tables=1, equations=2),
+    "typical": dict(mcq=40, tf=8, short=6, essay=2, fragment=2, tables=3, equations=12,
+                    images=(150_000, 60_000, 20_000)),
+    "heavy": dict(mcq=40, tf=8, short=6, essay=4, fragment=8, tables=12, equations=40,
+                  images=(2_000_000, 1_000_000, 500_000, 500_000, 200_000)),
+}
+VERSIONS = (1, 4, 20, 50)
+START_CODE = 101
+
+def document_text(docx_bytes):
+    """Text của document.xml theo từng khối cấp cao - dùng để so sánh kết quả giữa các lần chạy"""
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as z: _, body = parse_document(z.read("word/document.xml"))
+    return "\n".join(get_text(block) for block in element_children(body))
+
+def run_case(size, num_versions, shuffle_mode="auto", seed=2025, backend=DEFAULT_BACKEND, golden=False):
+    """Trộn num_versions mã đề của đề giả lập cỡ size; trả về số đo (và dữ liệu golden nếu cần)"""
+    file_bytes = build_exam(**SIZES[size])
+    timer = StageTimer(); bytes_out = 0; all_answers = {}; texts = {}
+    template = ExamTemplate(file_bytes, shuffle_mode, backend, timer=timer)
+    for code in range(START_CODE, START_CODE + num_versions):
+        output = io.BytesIO()
+        with timer.stage("shuffle"): plan = version_plan(template, seed, code)
+        all_answers[code] = template.write_version(output, plan, code=code)
+        bytes_out += output.tell()
+        if golden: texts[code] = hashlib.sha256(document_text(output.getvalue()).encode("utf-8")).hexdigest()
+    with timer.stage("answer_key"): generate_answer_key_html(all_answers)
+    result = {"size": size, "versions": num_versions, "mode": shuffle_mode, "backend": backend,
+              "bytes_in": len(file_bytes), "bytes_out": bytes_out, "blocks": len(template.index),
+              "stages": {name: round(timer.stages.get(name, 0.0), 4) for name in STAGES},
+              "total": round(timer.total(), 4), "peak_rss_mb": peak_rss_mb()}
+    if golden:
+        result["golden"] = {str(code): {"answers": json.loads(json.dumps(all_answers[code])), "text_sha256": texts[code]}
+                            for code in all_answers}
+    return result
+
+def run_isolated(*args, **kwargs):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(run_case, *args, **kwargs).result()
+
+def format_row(result):
+    cells = [f"{result['size']:<8}", f"{result['versions']:>4}"]
+    cells += [f"{result['stages'][name] * 1000:>9.1f}" for name in STAGES]
+    cells += [f"{result['total'] * 1000:>9.1f}", f"{result['total'] * 1000 / result['versions']:>8.1f}",
+              f"{result['peak_rss_mb'] or 0:>8.1f}"]
+    return " ".join(cells)
+
+def check_golden(results, path, update):
+    """So kết quả golden với file path (ghi mới nếu chưa có hoặc update); trả về danh sách khác biệt"""
+    current = {f"{r['size']}/{r['mode']}": r["golden"] for r in results}   # mọi backend phải cho cùng kết quả
+    try:
+        with open(path, encoding="utf-8") as f: expected = json.load(f)
+    except FileNotFoundError:
+        expected = None
+    if expected is None or update:
+        with open(path, "w", encoding="utf-8") as f: json.dump(current, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(f"Đã ghi golden: {path}")
+        return []
+    problems = []
+    for case, codes in current.items():
+        for code, data in codes.items():
+            old = expected.get(case, {}).get(code)
+            if old is None:
+                problems.append(f"{case} mã {code}: chưa có trong golden (chạy lại với --update-golden)"); continue
+            if old["answers"] != data["answers"]: problems.append(f"{case} mã {code}: đáp án khác")
+            if old["text_sha256"] != data["text_sha256"]: problems.append(f"{case} mã {code}: nội dung đề khác")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tronde.bench", description="Đo hiệu năng trộn đề trên đề giả lập.")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=list(SIZES), help="cỡ đề giả lập")
+    parser.add_argument("-n", "--versions", type=int, nargs="+", default=list(VERSIONS), help="số mã đề mỗi lần đo")
+    parser.add_argument("--mode", choices=("auto", "mcq", "tf"), default="auto")
+    parser.add_argument("--backend", choices=("lxml", "minidom"), default=DEFAULT_BACKEND)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--json", metavar="FILE", help="ghi toàn bộ số đo ra file JSON")
+    parser.add_argument("--golden", metavar="FILE", help="kiểm tra đáp án + nội dung đề với file golden (chưa có thì ghi)")
+    parser.add_argument("--update-golden", action="store_true", help="ghi đè file golden bằng kết quả hiện tại")
+    args = parser.parse_args(argv)
+
+    print(" ".join([f"{'size':<8}", f"{'n':>4}"] + [f"{name:>9}" for name in STAGES]
+                   + [f"{'total':>9}", f"{'/đề':>8}", f"{'RSS MB':>8}"]) + "   (ms)")
+    results = []
+    for size in args.sizes:
+        for num_versions in args.versions:
+            result = run_isolated(size, num_versions, args.mode, args.seed, args.backend, golden=False)
+            results.append(result); print(format_row(result), flush=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, ensure_ascii=False, indent=1)
+    if not args.golden: return 0
+    golden = [run_isolated(size, max(args.versions), args.mode, args.seed, args.backend, golden=True) for size in args.sizes]
+    problems = check_golden(golden, args.golden, args.update_golden)
+    for problem in problems: print(problem, file=sys.stderr)
+    if problems: return 1
+    print("Golden: khớp")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
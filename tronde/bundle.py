@@ -0,0 +1,179 @@
+"""Tạo gói .zip nhiều mã đề (tuần tự hoặc song song) kèm bảng đáp án."""
+import os
+import re
+import time
+import random
+import logging
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from .template import ExamTemplate
+from .compression import compression_policy
+from .answer_key import AnswerStore, write_answer_keys
+from .incremental import BundleUpdate, bundle_manifest, source_fingerprint, version_layout, write_manifest
+from .metrics import JobMetrics, StageTimer, peak_rss_mb, template_counts
+from .roster import version_filename
+
+logger = logging.getLogger(__name__)
+
+def bundle_base_name(filename):
+    """Tên gốc an toàn cho các file trong gói, lấy từ tên file .docx tải lên"""
+    return re.sub(r'[^\w\s-]', '', filename.replace(".docx", "")).strip() or "De"
+
+def bundle_filename(base_name, num_versions, start_code):
+    if num_versions == 1: return f"{base_name}_Mix_{start_code}.zip"
+    return f"{base_name}_Mix_From_{start_code}.zip"
+
+def version_rng(seed, code):
+    """Nguồn ngẫu nhiên riêng của 1 mã đề: chỉ phụ thuộc (seed, mã đề), không phụ thuộc tiến trình chạy"""
+    return random.Random(f"{seed}:{code}")
+
+def version_plan(template, seed, code):
+    """Hoán vị (mảng số nguyên) của mã đề code trong lượt trộn có seed"""
+    return template.plan_version(version_rng(seed, code))
+
+def batch_plans(template, seed, codes, constraints):
+    """Hoán vị {mã đề: array} của cả loạt codes, sinh cùng lúc theo ràng buộc (tronde.sampler, cần NumPy).
+    Khác version_plan: hoán vị của 1 mã đề phụ thuộc cả loạt mã đề."""
+    from .sampler import sample_plans
+    plans, report = sample_plans(template, seed, codes, constraints)
+    logger.info("Batch sampler: %s", report)
+    return plans
+
+def plan_source(template, seed, codes, constraints=None):
+    """Hàm mã đề -> hoán vị: rút độc lập từng mã (constraints None) hoặc tra trong batch_plans"""
+    if constraints is None: return lambda code: version_plan(template, seed, code)
+    return batch_plans(template, seed, codes, constraints).__getitem__
+
+def regenerate_version(file_bytes, shuffle_mode, seed, code, constraints=None, codes=None, manifest=None,
+                       compression=None):
+    """Tạo lại riêng 1 mã đề của lượt trộn (seed) - trùng khớp với file trong gói, không cần tạo các mã khác.
+    Với constraints, codes phải là cả loạt mã đề của gói gốc. manifest: bản kê của gói (tronde.incremental) -
+    dùng hoán vị đã lưu nếu gói có mã đề này và đề không thêm/bớt câu. Trả về (bytes .docx, đáp án)."""
+    if constraints is not None and codes is not None and code not in codes:
+        raise ValueError(f"Mã đề {code} không thuộc loạt mã đề của gói gốc")
+    template = ExamTemplate(file_bytes, shuffle_mode, compression=compression)
+    if manifest is not None and str(code) in manifest["versions"]:
+        update = BundleUpdate(template, manifest)
+        if update.compatible: return template.build_version(update.plan(code), code=code)
+    return template.build_version(plan_source(template, seed, codes or [code], constraints)(code), code=code)
+
+_WORKER_TEMPLATE = None
+_WORKER_TIMER = None
+_WORKER_SOURCE = None
+
+def _init_worker(file_bytes, shuffle_mode, compression=None):
+    """Chạy 1 lần trong mỗi tiến trình con: parse đề gốc một lần cho mọi mã đề của tiến trình đó"""
+    global _WORKER_TEMPLATE, _WORKER_TIMER, _WORKER_SOURCE
+    _WORKER_TIMER = StageTimer()
+    _WORKER_TEMPLATE = ExamTemplate(file_bytes, shuffle_mode, timer=_WORKER_TIMER, compression=compression)
+    _WORKER_SOURCE = source_fingerprint(_WORKER_TEMPLATE)
+
+def _build_version_in_worker(seed, code, plan=None):
+    if plan is None:
+        with _WORKER_TIMER.stage("shuffle"): plan = version_plan(_WORKER_TEMPLATE, seed, code)
+    chunks = []
+    docx_bytes, answers = _WORKER_TEMPLATE.build_version(plan, code=code, chunks=chunks)
+    # Số liệu cộng dồn của tiến trình con này (người nhận giữ bản mới nhất theo pid)
+    stats = (os.getpid(), dict(_WORKER_TIMER.stages), peak_rss_mb(), template_counts(_WORKER_TEMPLATE))
+    return code, docx_bytes, answers, version_layout(plan, chunks), _WORKER_SOURCE, stats
+
+def iter_versions_parallel(file_bytes, shuffle_mode, codes, seed, workers, plans=None, compression=None):
+    """Sinh các mã đề trên ProcessPoolExecutor; trả về (mã đề, bytes .docx, đáp án, bố cục, vân tay đề gốc,
+    số liệu tiến trình con) theo thứ tự xong. Số việc đang chạy được giới hạn để bộ nhớ không tăng theo số đề.
+    plans: hoán vị đã sinh sẵn {mã đề: array} (gửi kèm từng việc); không có thì tiến trình con tự rút."""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(file_bytes, shuffle_mode, compression)) as pool:
+        pending = set(); codes = iter(codes)
+        for code in itertools.islice(codes, 2 * workers):
+            pending.add(pool.submit(_build_version_in_worker, seed, code, plans and plans[code]))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                for code in itertools.islice(codes, 1):
+                    pending.add(pool.submit(_build_version_in_worker, seed, code, plans and plans[code]))
+
+def _output_size(output):
+    if isinstance(output, (str, os.PathLike)): return os.path.getsize(output)
+    return output.tell() if hasattr(output, "tell") else 0
+
+def create_zip_multiple(file_bytes, base_name, num_versions, shuffle_mode, start_code, output=None,
+                        seed=None, workers=1, progress=None, metrics=None, constraints=None, compression=None,
+                        roster=None):
+    """Ghi gói .zip (các mã đề + bảng đáp án) thẳng ra output (đường dẫn hoặc file-like).
+
+    Mỗi mã đề được ghi trực tiếp vào member của gói ngay khi tạo xong, nên bộ nhớ không tăng
+    theo số đề. Bảng đáp án có 3 dạng: Bang_Dap_An.doc (Word), .xlsx và .csv (cho máy chấm/OMR). Không truyền output: ghi ra file tạm trên đĩa, người gọi tự xóa. Trả về output.
+    Đề của mỗi mã chỉ phụ thuộc (seed, mã đề); workers > 1 chia các mã đề cho nhiều tiến trình.
+    Gói có kèm bản kê hoán vị (tronde.incremental) để trộn lại file đã sửa mà giữ nguyên thứ tự các mã đề.
+    progress(số đề xong, tổng số đề, mã đề) được gọi sau mỗi đề.
+    metrics: JobMetrics nhận số liệu của lần chạy (kích thước, số khối/câu/run, thời gian từng bước,
+    bộ nhớ đỉnh); số liệu luôn được ghi ra log "tronde.metrics" dạng JSON.
+    constraints: SamplerConstraints - sinh hoán vị cả loạt cùng lúc (khác nhau tối đa, đáp án chia đều A-D).
+    compression: CompressionPolicy hoặc tên mức nén ("fast", "balanced", "small"): file .docx được ghi STORED
+    vào gói (đã là zip), XML trong .docx và bảng đáp án được deflate theo mức đã chọn.
+    roster: tronde.roster.Roster - mỗi học sinh 1 mã đề (num_versions, start_code lấy theo danh sách), file .docx
+    mang tên học sinh, gói có thêm bảng đáp án theo học sinh.
+    """
+    if roster is not None: num_versions = len(roster); start_code = roster.start_code
+    if seed is None: seed = random.randrange(1 << 32)
+    if metrics is None: metrics = JobMetrics()
+    started = time.perf_counter(); timer = StageTimer(); worker_stats = {}
+    metrics.job = "create_zip_multiple"; metrics.bytes_in = len(file_bytes); metrics.versions = num_versions
+    metrics.workers = min(workers, num_versions) if workers > 1 and num_versions > 1 else 1
+    temp_output = output is None
+    if temp_output:
+        fd, output = tempfile.mkstemp(prefix="tronde_", suffix=".zip"); os.close(fd)
+    answer_store = AnswerStore(); versions = {}; source = None; policy = compression_policy(compression)
+    codes = range(start_code, start_code + num_versions)
+    try:
+        with policy.open_bundle(output) as zout:
+            batch = None
+            if constraints is not None and metrics.workers > 1:
+                template = ExamTemplate(file_bytes, shuffle_mode, timer=timer)
+                with timer.stage("shuffle"): batch = batch_plans(template, seed, codes, constraints)
+                del template
+            if metrics.workers > 1:
+                results = iter_versions_parallel(file_bytes, shuffle_mode, codes, seed, metrics.workers, batch, policy)
+                for current_code, docx_bytes, exam_answers, versions[current_code], source, stats in results:
+                    answer_store.add(current_code, exam_answers)
+                    worker_stats[stats[0]] = stats
+                    with timer.stage("rezip"):
+                        policy.write_bundle_member(zout, version_filename(base_name, current_code, roster), docx_bytes)
+                    if progress: progress(len(answer_store), num_versions, current_code)
+            else:
+                template = ExamTemplate(file_bytes, shuffle_mode, timer=timer, compression=policy)
+                metrics.set_counts(template_counts(template))
+                with timer.stage("shuffle"): plan_of = plan_source(template, seed, codes, constraints)
+                source = source_fingerprint(template)
+                for current_code in codes:
+                    filename = version_filename(base_name, current_code, roster)
+                    with timer.stage("shuffle"): plan = plan_of(current_code)
+                    chunks = []
+                    with policy.open_member(zout, filename) as member:
+                        answer_store.add(current_code, template.write_version(member, plan, code=current_code, chunks=chunks))
+                    versions[current_code] = version_layout(plan, chunks)
+                    if progress: progress(len(answer_store), num_versions, current_code)
+            try:
+                with timer.stage("answer_key"):
+                    write_answer_keys(answer_store, zout, policy=policy)
+                    if roster is not None: roster.write_answer_keys(answer_store, zout, policy=policy)
+            except Exception as e:
+                logger.exception("Error creating answer key")
+                metrics.error = f"Bảng đáp án: {e}"
+            write_manifest(zout, bundle_manifest(base_name, shuffle_mode, seed, codes, constraints, source, versions,
+                                                 roster=roster, compression=policy))
+        metrics.bytes_out = _output_size(output)
+    except BaseException as e:
+        if temp_output: os.remove(output)
+        metrics.error = str(e) or type(e).__name__
+        raise
+    finally:
+        for _, stages, peak, counts in worker_stats.values():
+            metrics.add_stages(stages); metrics.add_peak(peak); metrics.set_counts(counts)
+        metrics.add_stages(timer.stages); metrics.add_peak(peak_rss_mb())
+        metrics.seconds = time.perf_counter() - started
+        metrics.log()
+    return output
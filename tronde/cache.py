@@ -0,0 +1,131 @@
+"""Cache gói .zip trên đĩa, định danh theo nội dung file tải lên + tham số trộn.
+
+Dùng chung cho mọi phiên Streamlit và mọi tiến trình (chỉ dựa vào hệ thống file), còn nguyên
+sau khi khởi động lại. Dung lượng bị giới hạn: file ít dùng nhất (mtime cũ nhất) bị xóa trước.
+File tạm .part bỏ lại bởi job bị hủy / tiến trình chết được xóa khi quá PART_GRACE_SECONDS không ghi thêm.
+Mỗi cấu hình trộn (lineage_key: mọi tham số trừ nội dung file) trỏ tới gói mới nhất của nó
+(<khóa>.latest) - tải lên bản sửa của đề thì trộn lại từ gói đó (tronde.incremental).
+"""
+import hashlib
+import json
+import os
+import time
+import tempfile
+
+CACHE_FORMAT = 3        # tăng khi định dạng gói thay đổi để bỏ các bản cache cũ
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+PART_GRACE_SECONDS = 15 * 60    # .part còn được ghi trong khoảng này coi như của job đang chạy
+
+def default_cache_dir():
+    return os.environ.get("TRONDE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "tronde_cache")
+
+def bundle_key(file_bytes, **params):
+    """SHA-256 của nội dung file + tham số (mode, mã đề bắt đầu, số đề, seed, tên gốc...)"""
+    digest = hashlib.sha256(file_bytes)
+    digest.update(json.dumps({"format": CACHE_FORMAT, **params}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def lineage_key(**params):
+    """Khóa của 1 cấu hình trộn không tính nội dung file: các bản sửa của cùng 1 đề có chung khóa"""
+    return "lineage-" + bundle_key(b"", **params)
+
+class BundleCache:
+    """Kho gói .zip: mỗi khóa là 1 file <khóa>.zip trong thư mục cache"""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.evict()        # dọn phần bỏ dở của lần chạy trước (tiến trình chết giữa chừng)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.zip")
+
+    def get(self, key):
+        """Đường dẫn gói nếu đã có (đánh dấu vừa dùng), ngược lại None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def latest(self, lineage):
+        """Đường dẫn gói mới nhất của cấu hình lineage (None nếu chưa có hoặc đã bị dọn)"""
+        try:
+            with open(os.path.join(self.directory, f"{lineage}.latest"), encoding="ascii") as f: key = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return self.get(key) if key else None
+
+    def remember(self, lineage, key):
+        """Ghi key là gói mới nhất của cấu hình lineage"""
+        fd, temp_path = tempfile.mkstemp(prefix=f".{lineage[:24]}_", suffix=".part", dir=self.directory)
+        with os.fdopen(fd, "w", encoding="ascii") as f: f.write(key)
+        os.replace(temp_path, os.path.join(self.directory, f"{lineage}.latest"))
+
+    def get_or_create(self, key, build):
+        """Trả về (đường dẫn, có sẵn hay không). Khi chưa có: build(đường_dẫn_tạm) ghi gói ra file,
+        file được đưa vào cache bằng os.replace (nguyên tử) rồi dọn bớt nếu vượt dung lượng."""
+        path = self.get(key)
+        if path: return path, True
+        temp_path = self.reserve(key)
+        try:
+            build(temp_path)
+        except BaseException:
+            self.discard(temp_path)
+            raise
+        return self.commit(key, temp_path), False
+
+    def reserve(self, key):
+        """File tạm trong thư mục cache để ghi gói của key (đưa vào cache bằng commit, bỏ bằng discard)"""
+        fd, temp_path = tempfile.mkstemp(prefix=f".{key[:16]}_", suffix=".part", dir=self.directory)
+        os.close(fd)
+        return temp_path
+
+    def commit(self, key, temp_path):
+        try:
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            self.discard(temp_path)
+            raise
+        self.evict(keep=key)
+        return self.path(key)
+
+    def discard(self, temp_path):
+        if os.path.exists(temp_path): os.remove(temp_path)
+
+    def evict(self, keep=None):
+        """Dọn thư mục cache: xóa .part bỏ dở (quá PART_GRACE_SECONDS), con trỏ .latest tới gói không còn,
+        rồi các gói dùng lâu nhất cho tới khi tổng dung lượng (tính cả .part đang ghi) <= max_bytes"""
+        entries = []; parts = 0; latest = []; now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(".zip"): entries.append((stat.st_mtime, stat.st_size, entry.path))
+                elif entry.name.endswith(".latest"): latest.append(entry.path)
+                elif entry.name.endswith(".part"):
+                    if now - stat.st_mtime > PART_GRACE_SECONDS: self._remove(entry.path)
+                    else: parts += stat.st_size
+        total = parts + sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            if keep and path == self.path(keep): continue
+            self._remove(path)
+            total -= size
+        for path in latest:
+            try:
+                with open(path, encoding="ascii") as f: key = f.read().strip()
+            except FileNotFoundError:
+                continue
+            if not key or not os.path.exists(self.path(key)): self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,121 @@
+"""Dòng lệnh: python -m tronde DE.docx|THU_MUC [-n 4] [--start 101] [--mode auto] [--seed 1] [--balanced]
+    [--compression fast|balanced|small] -o OUT
+Trộn lại đề đã sửa, giữ nguyên thứ tự của gói cũ: python -m tronde DE.docx --previous Goi_Cu.zip -o OUT
+Mỗi học sinh 1 đề theo danh sách lớp: python -m tronde DE.docx --roster danh_sach.xlsx [--start 1001] -j 4 -o OUT"""
+import argparse
+import os
+import sys
+import time
+
+from .bundle import bundle_base_name, bundle_filename, create_zip_multiple, plan_source
+from .compression import DEFAULT_PRESET, PRESETS
+from .incremental import BundleUpdate, manifest_codes, read_manifest, update_zip
+from .metrics import configure_json_logging
+from .roster import Roster, version_filename
+from .template import ExamTemplate
+
+MODES = ("auto", "mcq", "tf")
+
+def find_inputs(path):
+    """1 file .docx, hoặc mọi file .docx trong thư mục (bỏ file khóa ~$ của Word)"""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if name.lower().endswith(".docx") and not name.startswith("~$"))
+    return [path]
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m tronde", description="Trộn đề Word và tạo bảng đáp án.")
+    parser.add_argument("input", help="file .docx hoặc thư mục chứa các file .docx")
+    parser.add_argument("-n", "--versions", type=int, default=4, help="số mã đề (mặc định 4)")
+    parser.add_argument("--start", type=int, default=101, help="mã đề bắt đầu (mặc định 101)")
+    parser.add_argument("--mode", choices=MODES, default="auto", help="kiểu trộn (mặc định auto)")
+    parser.add_argument("--seed", type=int, default=None, help="seed để trộn lặp lại được")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="số tiến trình song song")
+    parser.add_argument("-o", "--output", default=".", help="thư mục ghi các gói .zip")
+    parser.add_argument("--only", type=int, action="append", metavar="MA_DE",
+                        help="chỉ tạo lại mã đề này của lượt trộn --seed (lặp lại được), ghi file .docx")
+    parser.add_argument("--metrics", action="store_true", help="ghi số liệu từng lần trộn (JSON) ra stderr")
+    parser.add_argument("--balanced", action="store_true",
+                        help="sinh cả loạt mã đề cùng lúc: thứ tự câu khác nhau tối đa, đáp án chia đều A-D (cần NumPy)")
+    parser.add_argument("--min-distance", type=int, default=None,
+                        help="với --balanced: số vị trí câu tối thiểu khác nhau giữa 2 mã đề (mặc định nửa số câu)")
+    parser.add_argument("--max-run", type=int, default=3,
+                        help="với --balanced: số câu liền nhau tối đa cùng chữ cái đáp án (0: không giới hạn)")
+    parser.add_argument("--compression", choices=sorted(PRESETS), default=DEFAULT_PRESET,
+                        help="mức nén: fast (nhanh), balanced (mặc định), small (gói nhỏ nhất)")
+    parser.add_argument("--roster", metavar="DS.xlsx",
+                        help="danh sách học sinh (CSV/XLSX, cột sbd/ma_hs, ho_ten, lop): mỗi học sinh 1 mã đề từ --start, "
+                             "file đề mang tên học sinh (bỏ qua -n)")
+    parser.add_argument("--previous", metavar="GOI.zip",
+                        help="gói đã trộn từ bản trước của đề: dùng lại tham số và hoán vị của gói (bỏ qua -n, --start, "
+                             "--mode, --seed, --balanced), chỉ ghi lại phần bị sửa")
+    return parser
+
+def sampler_constraints(args):
+    if not args.balanced: return None
+    from .sampler import SamplerConstraints
+    return SamplerConstraints(min_distance=args.min_distance, max_run=args.max_run)
+
+def regenerate(path, base_name, args, roster=None):
+    """Tạo lại riêng các mã đề --only, trùng khớp với file cùng mã trong gói đã tạo bằng cùng --seed"""
+    if args.previous:
+        manifest = read_manifest(args.previous)
+        with open(path, "rb") as f:
+            update = BundleUpdate(ExamTemplate(f.read(), manifest["shuffle_mode"], compression=args.compression), manifest)
+        if not update.compatible: raise ValueError("Đề đã thêm/bớt câu hoặc phương án - không giữ được thứ tự của gói cũ")
+        template = update.template; plan_of = update.plan; roster = update.roster
+    else:
+        with open(path, "rb") as f: template = ExamTemplate(f.read(), args.mode, compression=args.compression)
+        codes = roster.codes if roster else range(args.start, args.start + args.versions)   # --balanced: cả loạt của gói gốc
+        plan_of = plan_source(template, args.seed, codes, sampler_constraints(args))
+    for code in args.only:
+        output = os.path.join(args.output, version_filename(base_name, code, roster))
+        template.write_version(output, plan_of(code), code=code)
+        print(output)
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.only and args.seed is None and not args.previous: parser.error("--only cần --seed (hoặc --previous) của lượt trộn gốc")
+    if args.roster and args.previous: parser.error("--roster không dùng cùng --previous (gói cũ đã có danh sách học sinh)")
+    roster = None
+    if args.roster:
+        try:
+            roster = Roster.from_table(args.roster, start_code=args.start)
+        except (OSError, ValueError) as e:
+            parser.error(f"--roster: {e}")
+        args.versions = len(roster)
+    if args.only and (args.balanced or roster) and not all(args.start <= c < args.start + args.versions for c in args.only):
+        parser.error("--only với --balanced / --roster: mã đề phải nằm trong loạt mã đề của gói gốc")
+    if args.metrics: configure_json_logging()
+    inputs = find_inputs(args.input)
+    if not inputs:
+        print(f"Không tìm thấy file .docx trong {args.input}", file=sys.stderr)
+        return 1
+    if args.previous and len(inputs) > 1: parser.error("--previous chỉ dùng với 1 file đề")
+    os.makedirs(args.output, exist_ok=True)
+    status = 0
+    for path in inputs:
+        started = time.perf_counter()
+        base_name = bundle_base_name(os.path.basename(path))
+        output = os.path.join(args.output, bundle_filename(base_name, args.versions, args.start))
+        try:
+            if args.only:
+                regenerate(path, base_name, args, roster); continue
+            with open(path, "rb") as f: file_bytes = f.read()
+            if args.previous:
+                codes = manifest_codes(read_manifest(args.previous))
+                output = os.path.join(args.output, bundle_filename(base_name, len(codes), codes.start))
+                if os.path.abspath(output) == os.path.abspath(args.previous): parser.error("-o trùng thư mục gói cũ: chọn thư mục khác")
+                summary = update_zip(file_bytes, args.previous, output, base_name, compression=args.compression)
+                print(f"{output} ({time.perf_counter() - started:.2f}s, sửa {len(summary['changed_questions'])} câu)")
+                continue
+            create_zip_multiple(file_bytes, base_name, args.versions, args.mode, args.start, output=output,
+                                seed=args.seed, workers=args.workers, constraints=sampler_constraints(args),
+                                compression=args.compression, roster=roster)
+        except Exception as e:
+            print(f"Lỗi {path}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        print(f"{output} ({time.perf_counter() - started:.2f}s)")
+    return status
@@ -0,0 +1,77 @@
+"""Chính sách nén từng member khi ghi file .docx và gói .zip.
+
+Dữ liệu đã nén sẵn (.docx, .xlsx, ảnh PNG/JPEG, media) được ghi STORED: nén lại tốn CPU mà gần như không nhỏ đi.
+XML / văn bản được DEFLATE với mức nén cấu hình được. Các mức có sẵn (PRESETS):
+- "fast": ưu tiên tốc độ (deflate mức 1);
+- "balanced": mặc định của zlib (mức 6);
+- "small": ưu tiên dung lượng (mức 9).
+"""
+import os
+import time
+import zlib
+import zipfile
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Đuôi file đã nén sẵn (zip, ảnh nén, media, gzip của Office)
+PRECOMPRESSED = frozenset((".docx", ".xlsx", ".pptx", ".zip", ".png", ".jpg", ".jpeg", ".jpe", ".jfif", ".gif",
+                           ".webp", ".wdp", ".emz", ".wmz", ".gz", ".mp3", ".mp4", ".m4a", ".wma", ".wmv"))
+# Mức nén trên ZipInfo chỉ công khai từ Python 3.13 (compress_level); bản cũ hơn chỉ đặt được qua writestr(compresslevel=)
+ZIPINFO_LEVEL = hasattr(zipfile.ZipInfo, "compress_level")
+SPOOL_BYTES = 8 * 1024 ** 2
+
+@dataclass(frozen=True)
+class CompressionPolicy:
+    xml_level: int = zlib.Z_DEFAULT_COMPRESSION     # XML/văn bản trong .docx: document.xml, đầu trang, chân trang...
+    bundle_level: int = zlib.Z_DEFAULT_COMPRESSION  # bảng đáp án, bản kê trong gói .zip
+    store_precompressed: bool = True                # .docx, ảnh, media: STORED, không nén lại
+
+    def compress_type(self, name):
+        """ZIP_STORED hoặc ZIP_DEFLATED cho member name"""
+        if self.store_precompressed and os.path.splitext(name)[1].lower() in PRECOMPRESSED: return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def open_bundle(self, output, mode="w"):
+        """Gói .zip ghi ra output: member ghi bằng tên (bảng đáp án, bản kê) được deflate mức bundle_level"""
+        return zipfile.ZipFile(output, mode, zipfile.ZIP_DEFLATED, compresslevel=self.bundle_level)
+
+    def member_info(self, name, level=None):
+        """ZipInfo của member name theo chính sách (level mặc định: bundle_level; chỉ gắn vào ZipInfo khi
+        Python hỗ trợ - còn lại truyền level cho writestr, xem write_bundle_member / open_member)"""
+        zinfo = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        zinfo.external_attr = 0o600 << 16
+        zinfo.compress_type = self.compress_type(name)
+        if ZIPINFO_LEVEL: zinfo.compress_level = self.bundle_level if level is None else level
+        return zinfo
+
+    def write_bundle_member(self, zout, name, data):
+        """Ghi 1 file (vd .docx đã tạo) vào gói theo chính sách"""
+        zout.writestr(self.member_info(name), data, compresslevel=self.bundle_level)
+
+    @contextmanager
+    def open_member(self, zout, name):
+        """Luồng ghi member name vào gói theo chính sách. Member deflate mà ZipInfo không nhận mức nén
+        (Python < 3.13) được ghi tạm rồi writestr(compresslevel=) để giữ đúng mức nén."""
+        zinfo = self.member_info(name)
+        if zinfo.compress_type == zipfile.ZIP_STORED or ZIPINFO_LEVEL:
+            with zout.open(zinfo, 'w') as member: yield member
+            return
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+            yield spool
+            spool.seek(0)
+            zout.writestr(zinfo, spool.read(), compresslevel=self.bundle_level)
+
+PRESETS = {
+    "fast": CompressionPolicy(xml_level=1, bundle_level=1),
+    "balanced": CompressionPolicy(),
+    "small": CompressionPolicy(xml_level=9, bundle_level=9),
+}
+DEFAULT_PRESET = "balanced"
+
+def compression_policy(policy=None):
+    """CompressionPolicy từ tên mức có sẵn (PRESETS) hoặc chính policy; None: mức mặc định"""
+    if policy is None: policy = DEFAULT_PRESET
+    if isinstance(policy, CompressionPolicy): return policy
+    if policy not in PRESETS: raise ValueError(f"Mức nén không hợp lệ: {policy} (chọn {', '.join(PRESETS)})")
+    return PRESETS[policy]
@@ -0,0 +1,166 @@
+"""Chấm điểm hàng loạt bài làm (file quét phiếu CSV/XLSX) theo bảng đáp án của từng mã đề.
+
+Mọi phép so sánh chạy trên cả cột/mảng (pandas/NumPy), không có vòng lặp theo từng học sinh.
+
+File bảng đáp án: Bang_Dap_An.csv / .xlsx (sheet "Tổng hợp") trong gói tải về - cột ma_de, P1_1.., P2_n.., P3_n..
+File bài làm: 1 dòng/học sinh - cột mã học sinh (sbd / ma_hs / student_id), cột mã đề (ma_de) và các cột
+trả lời cùng tên với bảng đáp án. Phần II ghi "Đ-S-Đ-S", "DSDS"...; Phần III ghi số ("1,5" hoặc "1.5").
+
+    python -m tronde.grading Bang_Dap_An.csv bai_lam.xlsx -o ket_qua.xlsx
+"""
+import argparse
+import io
+import os
+import re
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Thang điểm in trong bảng đáp án (answer_key.PARTS)
+P1_POINTS = 0.25
+P2_POINTS = np.array([0.0, 0.1, 0.25, 0.5, 1.0])    # theo số ý đúng 0..4
+P3_POINTS = 0.5
+TF_ITEMS = 4
+
+ID_COLUMNS = ("sbd", "ma_hs", "student_id", "id")
+CODE_COLUMNS = ("ma_de", "exam_code", "code")
+RE_ANSWER_COLUMN = re.compile(r'^(P[123])_(\d+)$')
+
+@dataclass
+class GradingResult:
+    """students: 1 dòng/học sinh (điểm từng phần, tổng); items: tỉ lệ đúng từng câu theo mã đề;
+    unknown_codes: các mã đề có trong bài làm nhưng không có trong bảng đáp án (điểm = 0)"""
+    students: pd.DataFrame
+    items: pd.DataFrame
+    unknown_codes: list
+
+def read_table(source, name=None, sheet_name=0):
+    """Đọc CSV hoặc XLSX (đường dẫn hoặc file-like có .name) thành DataFrame toàn chuỗi"""
+    name = (name or getattr(source, "name", None) or str(source)).lower()
+    if name.endswith((".xlsx", ".xlsm", ".xls")): return pd.read_excel(source, sheet_name=sheet_name, dtype=str)
+    return pd.read_csv(source, dtype=str, encoding="utf-8-sig")
+
+def _normalize_columns(frame):
+    frame = frame.copy()
+    frame.columns = [str(c).strip().lower() if not RE_ANSWER_COLUMN.match(str(c).strip().upper())
+                     else str(c).strip().upper() for c in frame.columns]
+    return frame
+
+def _find_column(frame, candidates, what):
+    for name in candidates:
+        if name in frame.columns: return name
+    raise ValueError(f"Không tìm thấy cột {what} (một trong: {', '.join(candidates)})")
+
+def load_answer_key(source, name=None):
+    """Bảng đáp án (CSV, hoặc XLSX sheet "Tổng hợp") -> DataFrame chỉ mục ma_de, cột P1_1..P3_n"""
+    lowered = (name or getattr(source, "name", None) or str(source)).lower()
+    frame = read_table(source, name, sheet_name="Tổng hợp" if lowered.endswith((".xlsx", ".xlsm")) else 0)
+    return answer_key_frame(frame)
+
+def answer_key_frame(frame):
+    frame = _normalize_columns(frame)
+    code_col = _find_column(frame, CODE_COLUMNS, "mã đề")
+    frame[code_col] = frame[code_col].str.strip()
+    return frame.set_index(code_col)[[c for c in frame.columns if RE_ANSWER_COLUMN.match(c)]]
+
+def store_key_frame(store):
+    """Bảng đáp án từ AnswerStore (không cần ghi ra file)"""
+    rows = list(store.iter_flat_rows())
+    frame = pd.DataFrame([row for _, row in rows], columns=store.columns(), dtype=str)
+    frame.index = pd.Index([str(code) for code, _ in rows], name="ma_de")
+    return frame
+
+def _cells(frame):
+    """Mọi ô của các cột thành 1 Series chuỗi (1 lần gọi .str cho cả bảng thay vì từng cột)"""
+    return pd.Series(frame.to_numpy(dtype=object).ravel(), dtype=object).fillna("").astype(str)
+
+def _choice(frame):
+    return _cells(frame).str.strip().str.upper().to_numpy(dtype=str).reshape(frame.shape)
+
+def _tf(frame):
+    cells = _cells(frame).str.upper().str.replace("D", "Đ", regex=False)
+    cells = cells.str.replace(r"[^ĐS]", "", regex=True).str.slice(0, TF_ITEMS)
+    return cells.to_numpy(dtype=f"U{TF_ITEMS}").reshape(frame.shape)
+
+def _short(frame):
+    cells = _cells(frame).str.replace(r"\s+", "", regex=True).str.replace(".", ",", regex=False).str.upper()
+    return cells.to_numpy(dtype=str).reshape(frame.shape)
+
+def _tf_items(array):
+    """(học sinh, câu) -> (học sinh, câu, ý): mỗi chuỗi U4 xem như 4 ký tự U1 (thiếu ý -> '')"""
+    return np.ascontiguousarray(array).view("U1").reshape(array.shape + (TF_ITEMS,))
+
+def _key_rows(normalized, rows):
+    """Đáp án đã chuẩn hóa (mỗi mã đề 1 dòng) trải ra theo học sinh; mã đề lạ (-1) -> dòng rỗng"""
+    padded = np.concatenate([normalized, np.full((1, normalized.shape[1]), "", dtype=normalized.dtype)])
+    return padded[rows]
+
+def grade(responses, key):
+    """Chấm mọi bài làm cùng lúc; responses: DataFrame bài làm, key: DataFrame của load_answer_key"""
+    responses = _normalize_columns(responses)
+    id_col = _find_column(responses, ID_COLUMNS, "mã học sinh")
+    code_col = _find_column(responses, CODE_COLUMNS, "mã đề")
+    codes = responses[code_col].fillna("").astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    rows = key.index.get_indexer(codes.to_numpy())   # dòng đáp án của từng học sinh (-1: mã đề lạ)
+    known = rows >= 0
+    for col in key.columns:
+        if col not in responses.columns: responses[col] = ""
+
+    students = pd.DataFrame({"ma_hs": responses[id_col].to_numpy(), "ma_de": codes.to_numpy()})
+    correct = {}    # cột câu hỏi -> mảng mức đúng 0..1 của mọi học sinh
+    total = np.zeros(len(responses))
+    for part in ("P1", "P2", "P3"):
+        cols = [c for c in key.columns if c.startswith(part + "_")]
+        if not cols: continue
+        if part == "P1":
+            k = _key_rows(_choice(key[cols]), rows); hit = (_choice(responses[cols]) == k) & (k != "")
+            score = hit.sum(axis=1) * P1_POINTS; level = hit.astype(float)
+        elif part == "P2":
+            k = _tf_items(_key_rows(_tf(key[cols]), rows)); r = _tf_items(_tf(responses[cols]))
+            items = ((r == k) & (k != "")).sum(axis=2)
+            score = P2_POINTS[items].sum(axis=1)
+            level = items / np.maximum((k != "").sum(axis=2), 1)
+        else:
+            k = _key_rows(_short(key[cols]), rows); hit = (_short(responses[cols]) == k) & (k != "")
+            score = hit.sum(axis=1) * P3_POINTS; level = hit.astype(float)
+        score = np.where(known, score, 0.0)
+        students[part] = score; total += score
+        correct.update(zip(cols, level.T))
+    students["tong"] = np.round(total, 2)
+
+    levels = pd.DataFrame(correct).assign(ma_de=codes.to_numpy())[known]
+    items = (levels.melt(id_vars="ma_de", var_name="cau", value_name="dung")
+             .groupby(["ma_de", "cau"], sort=False)["dung"].agg(ti_le_dung="mean", so_bai="count")
+             .reset_index().sort_values("ma_de", kind="stable", ignore_index=True))
+    return GradingResult(students, items, sorted(set(codes[~known])))
+
+def write_grading_xlsx(result, output):
+    """Excel kết quả: sheet "Điểm" (từng học sinh) và "Thống kê câu" (tỉ lệ đúng theo mã đề + câu)"""
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        result.students.to_excel(writer, sheet_name="Điểm", index=False)
+        result.items.to_excel(writer, sheet_name="Thống kê câu", index=False)
+
+def grading_xlsx_bytes(result):
+    buffer = io.BytesIO(); write_grading_xlsx(result, buffer)
+    return buffer.getvalue()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tronde.grading", description="Chấm điểm bài làm theo bảng đáp án.")
+    parser.add_argument("key", help="bảng đáp án: Bang_Dap_An.csv hoặc .xlsx")
+    parser.add_argument("responses", help="bài làm: .csv hoặc .xlsx (sbd/ma_hs, ma_de, P1_1...)")
+    parser.add_argument("-o", "--output", default="Ket_Qua_Cham.xlsx", help="file Excel kết quả")
+    args = parser.parse_args(argv)
+    try:
+        result = grade(read_table(args.responses), load_answer_key(args.key))
+    except (OSError, ValueError) as e:
+        print(f"Lỗi: {e}", file=sys.stderr)
+        return 1
+    write_grading_xlsx(result, args.output)
+    if result.unknown_codes: print(f"Mã đề không có trong bảng đáp án: {', '.join(result.unknown_codes)}", file=sys.stderr)
+    print(f"{os.path.abspath(args.output)} ({len(result.students)} bài, điểm TB {result.students['tong'].mean():.2f})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
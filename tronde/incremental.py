@@ -0,0 +1,257 @@
+"""Trộn lại sau khi sửa đề gốc: giữ nguyên thứ tự câu / phương án của gói trước, chỉ ghi lại phần bị ảnh hưởng.
+
+Mỗi gói .zip có kèm bản kê MANIFEST_NAME (JSON): tham số trộn, bố cục từng mã đề (hoán vị + bảng các đoạn nén
+độc lập của document.xml, xem ExamTemplate.write_version) và dấu vân tay của
+đề gốc - CRC từng member, và với mỗi câu: loại câu, số phương án, SHA-1 nội dung (XML của câu đã bỏ nhãn
+"Câu n." / "A." và các thuộc tính w:rsid* Word tự đổi khi lưu). Với file đã sửa, cùng số câu và số phương án:
+- câu mới được ghép với câu cũ cùng nội dung (câu chỉ đổi chỗ trong đề gốc vẫn khớp), câu còn lại theo thứ tự;
+- hoán vị cũ được đổi sang chỉ số câu mới -> mọi mã đề giữ nguyên thứ tự in, đáp án chỉ đổi ở câu bị sửa đáp án;
+- document.xml của mã đề chỉ được ghép lại khi có câu / khối bị sửa, và chỉ các đoạn chứa phần bị sửa được nén lại;
+  header/footer đã điền mã đề chỉ ghi lại khi bị sửa - còn lại chép nguyên dạng đã nén từ file cùng mã trong gói trước.
+
+    python -m tronde DE_DA_SUA.docx --previous Goi_Cu.zip -o OUT
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import zipfile
+from array import array
+from dataclasses import asdict
+
+from .answer_key import AnswerStore, write_answer_keys
+from .compression import compression_policy
+from .metrics import JobMetrics, StageTimer, peak_rss_mb, template_counts
+from .roster import Roster, version_filename
+from .template import DOCUMENT_PART, ExamTemplate, option_count
+from .ziputil import iter_raw_members
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "tronde_manifest.json"
+MANIFEST_FORMAT = 1
+RE_RSID = re.compile(rb'\sw:rsid\w*="[^"]*"')
+
+# ==================== DẤU VÂN TAY ĐỀ GỐC ====================
+
+def _fragment_bytes(fragment):
+    """Bytes của 1 khối trong DocumentSplicer, bỏ nhãn (đổi theo mã đề) và chỗ điền mã đề"""
+    if type(fragment) is bytes: return fragment
+    if type(fragment) is tuple: return fragment[0] + b"\0" + fragment[1]
+    return b"\0".join(piece for piece in fragment if type(piece) is bytes)
+
+def _digest(template, blocks):
+    digest = hashlib.sha1()
+    for block in blocks: digest.update(RE_RSID.sub(b"", _fragment_bytes(template.splicer.fragments[id(block)])))
+    return digest.hexdigest()
+
+def source_fingerprint(template):
+    """{"members": {tên: [CRC, cỡ]}, "frame": SHA-1 phần không thuộc câu nào,
+    "parts": [{"type": loại phần, "questions": [[loại câu, số phương án, SHA-1 nội dung], ...]}, ...]}"""
+    splicer = template.splicer
+    frame = hashlib.sha1(RE_RSID.sub(b"", splicer.prefix) + b"\0" + RE_RSID.sub(b"", splicer.trailer))
+    parts = []
+    for kind, piece in template.pieces:
+        if kind == "blocks":
+            frame.update(_digest(template, piece).encode("ascii")); continue
+        frame.update(_digest(template, piece["intro"]).encode("ascii"))
+        parts.append({"type": piece["type"], "questions": [[slot["kind"], option_count(slot), _digest(template, slot["blocks"])]
+                                                           for slot in piece["questions"]]})
+    members = {item.filename: [item.CRC, item.file_size] for item, _ in template.members}
+    return {"members": members, "frame": frame.hexdigest(), "parts": parts}
+
+# ==================== BẢN KÊ TRONG GÓI ====================
+
+def version_layout(plan, chunks):
+    """Bố cục 1 mã đề trong bản kê: hoán vị và bảng đoạn nén của document.xml"""
+    return {"plan": list(plan), "chunks": chunks}
+
+def bundle_manifest(base_name, shuffle_mode, seed, codes, constraints, source, versions, update=None, roster=None,
+                    compression=None):
+    """Bản kê của 1 gói: versions {mã đề: version_layout}, source: source_fingerprint của đề gốc,
+    update: tóm tắt lần trộn lại (BundleUpdate.summary) nếu gói được tạo từ gói trước,
+    roster: tronde.roster.Roster nếu gói là mỗi học sinh 1 đề (tên file, bảng đáp án theo học sinh),
+    compression: chính sách nén các file .docx trong gói (bytes nén chỉ dùng lại được khi cùng chính sách)"""
+    manifest = {"format": MANIFEST_FORMAT, "base_name": base_name, "shuffle_mode": shuffle_mode, "seed": seed,
+                "codes": [codes.start, codes.stop],
+                "constraints": asdict(constraints) if constraints is not None else None,
+                "compression": asdict(compression_policy(compression)),
+                "source": source, "versions": {str(code): layout for code, layout in sorted(versions.items())}}
+    if update is not None: manifest["update"] = update
+    if roster is not None: manifest["roster"] = roster.rows()
+    return manifest
+
+def write_manifest(zout, manifest):
+    zout.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, separators=(",", ":")))
+
+def read_manifest(bundle):
+    """Bản kê của gói .zip (đường dẫn hoặc file-like); ValueError nếu gói không có (tạo bằng bản cũ)"""
+    with zipfile.ZipFile(bundle) as zin:
+        if MANIFEST_NAME not in zin.NameToInfo: raise ValueError("Gói không có bản kê hoán vị (tạo bằng phiên bản cũ)")
+        manifest = json.loads(zin.read(MANIFEST_NAME))
+    if manifest.get("format") != MANIFEST_FORMAT: raise ValueError("Bản kê hoán vị không đúng định dạng")
+    return manifest
+
+def manifest_codes(manifest):
+    return range(*manifest["codes"])
+
+def manifest_roster(manifest):
+    if not manifest.get("roster"): return None
+    return Roster.from_rows(manifest["roster"], manifest["codes"][0])
+
+def manifest_constraints(manifest):
+    if manifest["constraints"] is None: return None
+    from .sampler import SamplerConstraints
+    return SamplerConstraints(**manifest["constraints"])
+
+# ==================== GHÉP CÂU MỚI VỚI CÂU CŨ ====================
+
+def _match_questions(old, new):
+    """Chỉ số câu cũ của từng câu mới và danh sách câu mới bị sửa; (None, None) nếu không ghép được
+    (số câu khác, hoặc câu ghép được có loại / số phương án khác)"""
+    if len(old) != len(new): return None, None
+    same_content = {}
+    for i, (_, _, content) in enumerate(old): same_content.setdefault(content, []).append(i)
+    mapping = [None] * len(new)
+    for j, (_, _, content) in enumerate(new):
+        if same_content.get(content): mapping[j] = same_content[content].pop(0)
+    used = set(mapping); rest = iter(i for i in range(len(old)) if i not in used)
+    changed = [j for j in range(len(new)) if mapping[j] is None]
+    for j in changed: mapping[j] = next(rest)
+    if any(old[i][:2] != new[j][:2] for j, i in enumerate(mapping)): return None, None
+    return mapping, changed
+
+def translate_plan(plan, old_parts, mappings):
+    """Hoán vị của gói trước (theo chỉ số câu cũ) -> hoán vị cùng thứ tự in theo chỉ số câu của đề mới"""
+    out = array('H'); cursor = 0
+    for part, mapping in zip(old_parts, mappings):
+        options = []
+        for _, n, _ in part["questions"]:
+            options.append(plan[cursor:cursor + n]); cursor += n
+        order = plan[cursor:cursor + len(options)]; cursor += len(options)
+        new_index = [0] * len(mapping)
+        for j, i in enumerate(mapping): new_index[i] = j; out.extend(options[i])
+        out.extend(new_index[i] for i in order)
+    return out
+
+class BundleUpdate:
+    """So sánh đề đã sửa (ExamTemplate) với bản kê của gói trước.
+
+    compatible: hoán vị cũ dùng được (cùng kiểu trộn, cùng số câu và số phương án mỗi câu); khi không,
+    người gọi phải trộn lại từ đầu. changed: (loại phần, số thứ tự câu trong đề gốc) các câu bị sửa.
+    recompress: gói trước nén theo chính sách khác template.compression (hoặc không ghi chính sách) - giữ hoán vị
+    nhưng không dùng lại bytes đã nén nào của gói trước.
+    """
+
+    def __init__(self, template, manifest):
+        self.template = template; self.manifest = manifest; self.roster = manifest_roster(manifest)
+        self.source = source_fingerprint(template)
+        old = manifest["source"]; old_parts = old["parts"]; new_parts = self.source["parts"]
+        self.mappings = None; self.changed = []
+        if (manifest["shuffle_mode"] == template.shuffle_mode
+                and [p["type"] for p in old_parts] == [p["type"] for p in new_parts]):
+            matched = [_match_questions(o["questions"], n["questions"]) for o, n in zip(old_parts, new_parts)]
+            if all(mapping is not None for mapping, _ in matched):
+                self.mappings = [mapping for mapping, _ in matched]
+                self.changed = [(part["type"], j + 1) for part, (_, changed) in zip(new_parts, matched) for j in changed]
+        self.compatible = self.mappings is not None
+        self.body_changed = bool(self.changed) or old["frame"] != self.source["frame"]
+        self.changed_members = sorted(name for name, info in self.source["members"].items()
+                                      if name != DOCUMENT_PART and old["members"].get(name) != info)
+        self.stamped = [item.filename for item, data in template.members if type(data) is list]
+        self.recompress = manifest.get("compression") != asdict(template.compression)
+        self._plans = {}
+
+    def plan(self, code):
+        """Hoán vị của mã đề code theo đề mới, chỉ dùng khi compatible (KeyError nếu code không có trong gói trước)"""
+        plan = self._plans.get(code)
+        if plan is None:
+            plan = translate_plan(self.manifest["versions"][str(code)]["plan"], self.manifest["source"]["parts"],
+                                  self.mappings)
+            self._plans[code] = plan
+        return plan
+
+    def version_name(self, base_name, code):
+        """Tên file .docx của mã đề code trong gói (gói theo danh sách học sinh: tên học sinh)"""
+        return version_filename(base_name, code, self.roster)
+
+    def previous_name(self, code):
+        return self.version_name(self.manifest["base_name"], code)
+
+    def build_version(self, code, previous_docx=None):
+        """(bytes .docx, đáp án, version_layout) của mã đề code; previous_docx: file cùng mã trong gói trước
+        (None hoặc khác chính sách nén: ghép và nén lại toàn bộ)"""
+        template = self.template; plan = self.plan(code); chunks = []
+        old_chunks = self.manifest["versions"][str(code)]["chunks"]
+        if previous_docx is None or self.recompress:
+            docx_bytes, answers = template.build_version(plan, code=code, chunks=chunks)
+            return docx_bytes, answers, version_layout(plan, chunks)
+        if not self.body_changed and not self.changed_members:
+            with template.timer.stage("shuffle"): _, _, answers = template.arrange_version(plan)
+            return previous_docx, answers, version_layout(plan, old_chunks)
+        members = {info.filename: (info, raw) for info, raw in iter_raw_members(previous_docx)}
+        kept = {name: members[name] for name in self.stamped if name in members and name not in self.changed_members}
+        document = members.get(DOCUMENT_PART); previous = None
+        if document is not None and not self.body_changed:
+            kept[DOCUMENT_PART] = document; chunks = old_chunks
+        elif (document is not None and document[0].compress_type == zipfile.ZIP_DEFLATED
+              and sum(entry[3] for entry in old_chunks) == len(document[1])):
+            previous = (old_chunks, document[1])
+        docx_bytes, answers = template.build_version(plan, code=code, kept=kept, chunks=chunks, previous=previous)
+        return docx_bytes, answers, version_layout(plan, chunks)
+
+    def summary(self):
+        return {"reused": self.compatible, "changed_questions": [list(q) for q in self.changed],
+                "body_changed": self.body_changed, "changed_members": self.changed_members, "recompressed": self.recompress}
+
+def read_previous_docx(bundle_zip, name):
+    """Bytes file .docx trong gói trước đang mở; None nếu không có"""
+    try:
+        return bundle_zip.read(name)
+    except KeyError:
+        return None
+
+# ==================== TẠO GÓI MỚI TỪ GÓI TRƯỚC ====================
+
+def update_zip(file_bytes, previous, output, base_name=None, progress=None, metrics=None, compression=None):
+    """Ghi gói mới cho file đề đã sửa (file_bytes) với tham số trộn và hoán vị của gói previous
+    (đường dẫn hoặc file-like .zip có bản kê), nén theo compression (tronde.compression). Trả về BundleUpdate.summary();
+    ValueError nếu đề đã thêm/bớt câu hoặc phương án (không giữ được thứ tự cũ)."""
+    if metrics is None: metrics = JobMetrics()
+    started = time.perf_counter(); timer = StageTimer()
+    manifest = read_manifest(previous)
+    base_name = base_name or manifest["base_name"]; codes = manifest_codes(manifest)
+    metrics.job = "update_zip"; metrics.bytes_in = len(file_bytes); metrics.versions = len(codes)
+    answer_store = AnswerStore(); policy = compression_policy(compression)
+    try:
+        template = ExamTemplate(file_bytes, manifest["shuffle_mode"], timer=timer, compression=policy)
+        metrics.set_counts(template_counts(template))
+        update = BundleUpdate(template, manifest)
+        if not update.compatible:
+            raise ValueError("Đề đã thêm/bớt câu hoặc phương án - không giữ được thứ tự cũ, hãy trộn lại từ đầu")
+        versions = {}
+        with zipfile.ZipFile(previous) as zin, policy.open_bundle(output) as zout:
+            for code in codes:
+                with timer.stage("unzip"): previous_docx = read_previous_docx(zin, update.previous_name(code))
+                docx_bytes, answers, versions[code] = update.build_version(code, previous_docx)
+                answer_store.add(code, answers)
+                with timer.stage("rezip"): policy.write_bundle_member(zout, update.version_name(base_name, code), docx_bytes)
+                if progress: progress(len(answer_store), len(codes), code)
+            with timer.stage("answer_key"):
+                write_answer_keys(answer_store, zout, policy=policy)
+                if update.roster: update.roster.write_answer_keys(answer_store, zout, policy=policy)
+                write_manifest(zout, bundle_manifest(base_name, manifest["shuffle_mode"], manifest["seed"], codes,
+                                                     manifest_constraints(manifest), update.source, versions,
+                                                     update.summary(), update.roster, policy))
+        metrics.bytes_out = os.path.getsize(output) if isinstance(output, (str, os.PathLike)) else output.tell()
+        logger.info("Bundle update: %s", update.summary())
+        return update.summary()
+    except BaseException as e:
+        metrics.error = str(e) or type(e).__name__
+        raise
+    finally:
+        metrics.add_stages(timer.stages); metrics.add_peak(peak_rss_mb())
+        metrics.seconds = time.perf_counter() - started
+        metrics.log()
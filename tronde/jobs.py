@@ -0,0 +1,361 @@
+"""Hàng đợi trộn đề dùng chung cho mọi phiên (Streamlit): 1 pool tiến trình giới hạn, chia việc công bằng.
+
+Mỗi lần bấm trộn là 1 Job: queued -> running -> done / error / cancelled. Job được chia thành từng mã đề;
+1 luồng điều phối giữ tối đa in_flight mã đề đang chạy trên pool và lấy mã đề tiếp theo xoay vòng giữa
+các phiên, rồi giữa các job của cùng phiên - job 1 mã đề không phải chờ job 50 mã đề chạy xong.
+
+Tiến trình con giữ đề gốc đã parse của vài job gần nhất (đọc từ file tạm của job ở lần đầu gặp).
+Mã đề xong được ghi ngay vào gói .zip tạm của job trong BundleCache; xong cả job thì gói được đưa vào cache.
+Đề của mỗi mã vẫn chỉ phụ thuộc (seed, mã đề) - trùng với create_zip_multiple cùng tham số.
+Job có lineage (cache.lineage_key) mà cache đã có gói trước của cùng cấu hình: đề được trộn lại theo
+hoán vị của gói đó (tronde.incremental) - thứ tự các mã đề giữ nguyên, chỉ phần bị sửa được ghi lại.
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import zipfile
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .answer_key import AnswerStore, write_answer_keys
+from .bundle import bundle_filename, plan_source
+from .compression import compression_policy
+from .incremental import (BundleUpdate, bundle_manifest, read_manifest, read_previous_docx, source_fingerprint,
+                          version_layout, write_manifest)
+from .metrics import JobMetrics, StageTimer, peak_rss_mb, template_counts
+from .roster import version_filename
+from .template import ExamTemplate
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, ERROR, CANCELLED = "queued", "running", "done", "error", "cancelled"
+FINISHED = (DONE, ERROR, CANCELLED)
+KEEP_FINISHED = 200     # số job đã xong giữ lại để các phiên còn tra được kết quả
+
+# ==================== TIẾN TRÌNH CON ====================
+
+# id job -> (ExamTemplate, hàm mã đề -> hoán vị, BundleUpdate, vân tay). Không dùng đường dẫn file tạm làm khóa:
+# hệ điều hành có thể cấp lại cùng đường dẫn cho file tải lên của job sau.
+_TEMPLATES = OrderedDict()
+TEMPLATES_KEPT = 4
+
+def _job_template(job_id, source, shuffle_mode, seed, codes, constraints, previous, compression, timer):
+    entry = _TEMPLATES.pop(job_id, None)
+    if entry is None:
+        with open(source, "rb") as f: template = ExamTemplate(f.read(), shuffle_mode, timer=timer, compression=compression)
+        update = None
+        if previous is not None:
+            with open(previous[0], encoding="utf-8") as f: update = BundleUpdate(template, json.load(f))
+        info = (update.source, update.summary()) if update else (source_fingerprint(template), None)
+        if update is not None and not update.compatible: update = None     # thêm/bớt câu: trộn lại từ đầu
+        with timer.stage("shuffle"):
+            entry = (template, update.plan if update else plan_source(template, seed, codes, constraints), update, info)
+        while len(_TEMPLATES) >= TEMPLATES_KEPT: _TEMPLATES.popitem(last=False)
+    _TEMPLATES[job_id] = entry
+    return entry
+
+def _previous_docx(bundle, name):
+    """File .docx cùng mã trong gói trước; None nếu gói đã bị dọn khỏi cache (ghép lại toàn bộ)"""
+    try:
+        with zipfile.ZipFile(bundle) as zin: return read_previous_docx(zin, name)
+    except FileNotFoundError:
+        return None
+
+def _build_job_version(job_id, source, shuffle_mode, seed, codes, constraints, code, previous=None, compression=None):
+    """1 mã đề của 1 job; số liệu trả về chỉ của riêng việc này (parse nếu đề chưa có trong tiến trình).
+    previous: (bản kê JSON, gói .zip) của gói trước cùng cấu hình; compression: CompressionPolicy của job."""
+    timer = StageTimer()
+    template, plan_of, update, info = _job_template(job_id, source, shuffle_mode, seed, codes, constraints, previous,
+                                                    compression, timer)
+    template.timer = timer
+    with timer.stage("shuffle"): plan = plan_of(code)
+    if update is None:
+        chunks = []
+        docx_bytes, answers = template.build_version(plan, code=code, chunks=chunks)
+        layout = version_layout(plan, chunks)
+    else:
+        with timer.stage("unzip"): previous_docx = _previous_docx(previous[1], update.previous_name(code))
+        docx_bytes, answers, layout = update.build_version(code, previous_docx)
+    return code, docx_bytes, answers, layout, info, (os.getpid(), timer.stages, peak_rss_mb(), template_counts(template))
+
+# ==================== JOB ====================
+
+class Job:
+    """1 gói cần tạo. Các thuộc tính công khai chỉ được luồng điều phối ghi; phiên Streamlit chỉ đọc."""
+
+    def __init__(self, session, key, source, base_name, num_versions, shuffle_mode, start_code, seed, constraints,
+                 lineage=None, compression=None, roster=None):
+        self.id = uuid.uuid4().hex; self.key = key; self.sessions = {session}; self.lineage = lineage
+        self.compression = compression_policy(compression); self.roster = roster
+        if roster is not None: num_versions = len(roster); start_code = roster.start_code
+        self.base_name = base_name; self.shuffle_mode = shuffle_mode; self.seed = seed
+        self.codes = range(start_code, start_code + num_versions); self.constraints = constraints
+        self.state = QUEUED; self.done = 0; self.current_code = None
+        self.path = None; self.cached = False; self.error = None
+        self.update = None      # BundleUpdate.summary() khi job được trộn lại từ gói trước
+        self.submitted = time.time(); self.started = None; self.finished_at = None
+        self.metrics = JobMetrics(job="job_queue", bytes_in=os.path.getsize(source) if source else 0,
+                                  versions=num_versions)
+        self._source = source; self._next = 0; self._in_flight = 0
+        self._zip = None; self._temp = None; self._store = AnswerStore(); self._timer = StageTimer()
+        self._previous = None; self._versions = {}; self._info = None
+        self._finished = threading.Event()
+
+    @property
+    def filename(self):
+        return bundle_filename(self.base_name, self.total, self.codes.start)
+
+    @property
+    def total(self):
+        return len(self.codes)
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    @property
+    def finished(self):
+        return self.state in FINISHED
+
+    def wait(self, timeout=None):
+        """Chờ job kết thúc; trả về True nếu đã kết thúc"""
+        return self._finished.wait(timeout)
+
+    def _has_work(self):
+        return self.state in (QUEUED, RUNNING) and self._next < self.total
+
+# ==================== HÀNG ĐỢI ====================
+
+class JobQueue:
+    """Hàng đợi dùng chung: submit() trả về Job ngay, người gọi hỏi lại trạng thái (poll) theo job.id.
+
+    workers: số tiến trình con của pool (mặc định số CPU); in_flight: số mã đề gửi vào pool cùng lúc
+    (mặc định 2 x workers) - càng nhỏ thì job mới được chen vào càng sớm.
+    """
+
+    def __init__(self, cache, workers=None, in_flight=None):
+        self.cache = cache
+        self.workers = workers or os.cpu_count() or 1
+        self.in_flight = in_flight or 2 * self.workers
+        self._lock = threading.Lock()
+        self._jobs = {}                 # id -> Job
+        self._sessions = OrderedDict()  # phiên -> deque các job còn mã đề chưa gửi (xoay vòng)
+        self._futures = {}              # future -> job
+        self._events = queue.Queue()    # future đã xong, hoặc None để đánh thức luồng điều phối
+        self._pool = None; self._thread = None; self._closed = False
+
+    def submit(self, session, key, file_bytes, base_name, num_versions, shuffle_mode, start_code,
+               seed, constraints=None, lineage=None, compression=None, roster=None):
+        """Đưa 1 gói vào hàng đợi. Gói đã có trong cache: job xong ngay (cached); cùng key đang chạy: dùng chung job.
+        lineage: khóa cấu hình (lineage_key) - có gói trước cùng cấu hình thì giữ nguyên hoán vị của gói đó.
+        compression: mức nén của gói (tronde.compression) - cần nằm trong key vì gói khác nhau theo mức nén.
+        roster: tronde.roster.Roster - mỗi học sinh 1 mã đề (num_versions, start_code lấy theo danh sách)."""
+        with self._lock:
+            if self._closed: raise RuntimeError("Hàng đợi đã đóng")
+            for job in self._jobs.values():
+                if job.key == key and not job.finished:
+                    job.sessions.add(session); return job
+            path = self.cache.get(key)
+            if path:
+                job = Job(session, key, None, base_name, num_versions, shuffle_mode, start_code, seed, constraints,
+                          lineage, compression, roster)
+                job.state = DONE; job.path = path; job.cached = True; job.done = job.total
+                job.metrics.bytes_in = len(file_bytes); job.finished_at = time.time(); job._finished.set()
+                if lineage: self.cache.remember(lineage, key)
+                self._jobs[job.id] = job
+                return job
+            fd, source = tempfile.mkstemp(prefix="tronde_src_", suffix=".docx")
+            with os.fdopen(fd, "wb") as f: f.write(file_bytes)
+            job = Job(session, key, source, base_name, num_versions, shuffle_mode, start_code, seed, constraints,
+                      lineage, compression, roster)
+            previous = self.cache.latest(lineage) if lineage else None
+            if previous:
+                try:
+                    manifest = read_manifest(previous)
+                except (OSError, ValueError, zipfile.BadZipFile) as e:
+                    logger.warning("Previous bundle %s unusable: %s", previous, e)
+                else:
+                    with open(source + ".json", "w", encoding="utf-8") as f: json.dump(manifest, f)
+                    job._previous = (source + ".json", previous)
+            self._jobs[job.id] = job
+            self._sessions.setdefault(session, deque()).append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tronde-jobs", daemon=True)
+                self._thread.start()
+        self._events.put(None)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Số job đang chờ được gửi trước job này (0: đang/sắp được chạy)"""
+        with self._lock:
+            return sum(1 for other in self._jobs.values()
+                       if other.state == QUEUED and other.submitted < job.submitted)
+
+    def cancel(self, job_id, session):
+        """Phiên session thôi cần job; job chỉ thật sự bị hủy khi không còn phiên nào cần"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished: return
+            job.sessions.discard(session)
+            if job.sessions: return
+            job.state = CANCELLED; job.error = "Đã hủy"
+            self._drop(job)
+            for future, owner in self._futures.items():
+                if owner is job: future.cancel()
+        self._events.put(None)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._closed = True
+            for job in self._jobs.values():
+                if not job.finished: job.state = CANCELLED; job.error = "Đã hủy"; self._drop(job)
+        self._events.put(None)
+        if self._thread and wait: self._thread.join()
+        if self._pool: self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    # ---------- luồng điều phối ----------
+
+    def _run(self):
+        """Luồng điều phối không được chết: lỗi của 1 job chỉ làm job đó lỗi (_collect, _fill),
+        lỗi còn lại được ghi log rồi chạy tiếp - nếu không mọi job đang chờ sẽ chờ mãi."""
+        while True:
+            future = self._events.get()
+            with self._lock:
+                try:
+                    if future is not None: self._collect(future)
+                    while True:     # gom mọi kết quả đã về trước khi gửi việc mới
+                        try:
+                            future = self._events.get_nowait()
+                        except queue.Empty:
+                            break
+                        if future is not None: self._collect(future)
+                    if self._closed and not self._futures: return
+                    if not self._closed: self._fill()
+                except Exception:
+                    logger.exception("Job dispatcher error")
+
+    def _next_job(self):
+        """Job kế tiếp theo vòng: phiên đầu hàng -> job đầu hàng của phiên đó; cả 2 xoay về cuối"""
+        while self._sessions:
+            session, jobs = next(iter(self._sessions.items()))
+            self._sessions.move_to_end(session)
+            while jobs and not jobs[0]._has_work(): jobs.popleft()
+            if not jobs:
+                del self._sessions[session]; continue
+            job = jobs[0]; jobs.rotate(-1)
+            return job
+        return None
+
+    def _fill(self):
+        while len(self._futures) < self.in_flight:
+            job = self._next_job()
+            if job is None: return
+            try:
+                if job.state == QUEUED: self._start(job)
+                if job.state != RUNNING: continue
+                code = job.codes[job._next]; job._next += 1; job._in_flight += 1
+                try:
+                    future = self._executor().submit(_build_job_version, job.id, job._source, job.shuffle_mode, job.seed,
+                                                     job.codes, job.constraints, code, job._previous, job.compression)
+                except RuntimeError:    # pool hỏng (BrokenProcessPool) hoặc đã đóng: lần sau tạo pool mới
+                    self._pool = None; job._in_flight -= 1; raise
+            except Exception as e:
+                self._fail(job, e); continue
+            self._futures[future] = job
+            future.add_done_callback(self._events.put)
+
+    def _executor(self):
+        if self._pool is None: self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _start(self, job):
+        try:
+            job._temp = self.cache.reserve(job.key)
+            job._zip = job.compression.open_bundle(job._temp)
+        except Exception as e:
+            self._fail(job, e); return
+        job.state = RUNNING; job.started = time.time()
+        job.metrics.workers = min(self.workers, job.total)
+
+    def _collect(self, future):
+        job = self._futures.pop(future, None)
+        if job is None: return
+        job._in_flight -= 1
+        if job.finished: return
+        try:
+            self._add_version(job, future)
+        except BrokenProcessPool as e:
+            self._pool = None; self._fail(job, e)
+        except Exception as e:      # lỗi ghi gói, bảng đáp án, bản kê...: chỉ job này lỗi
+            self._fail(job, e)
+
+    def _add_version(self, job, future):
+        code, docx_bytes, answers, layout, info, stats = future.result()
+        pid, stages, peak, counts = stats
+        job.metrics.add_stages(stages); job.metrics.add_peak(peak); job.metrics.set_counts(counts)
+        job._store.add(code, answers); job._versions[code] = layout; job._info = info
+        with job._timer.stage("rezip"):
+            job.compression.write_bundle_member(job._zip, version_filename(job.base_name, code, job.roster), docx_bytes)
+        job.done += 1; job.current_code = code
+        if job.done == job.total: self._finish(job)
+
+    def _finish(self, job):
+        try:
+            with job._timer.stage("answer_key"):
+                write_answer_keys(job._store, job._zip, policy=job.compression)
+                if job.roster is not None: job.roster.write_answer_keys(job._store, job._zip, policy=job.compression)
+        except Exception as e:
+            logger.exception("Error creating answer key")
+            job.metrics.error = f"Bảng đáp án: {e}"
+        source, job.update = job._info
+        write_manifest(job._zip, bundle_manifest(job.base_name, job.shuffle_mode, job.seed, job.codes,
+                                                 job.constraints, source, job._versions, job.update, job.roster,
+                                                 job.compression))
+        job._zip.close(); job._zip = None
+        job.path = self.cache.commit(job.key, job._temp); job._temp = None
+        if job.lineage: self.cache.remember(job.lineage, job.key)
+        job.metrics.bytes_out = os.path.getsize(job.path)
+        job.state = DONE
+        self._close(job)
+
+    def _fail(self, job, error):
+        logger.error("Job %s failed: %s", job.id, error)
+        job.state = ERROR; job.error = str(error) or type(error).__name__
+        job.metrics.error = job.error
+        self._drop(job)
+
+    def _drop(self, job):
+        """Bỏ gói đang ghi dở của job đã lỗi / bị hủy"""
+        if job._zip is not None:
+            try:
+                job._zip.close()
+            except (OSError, ValueError):
+                pass
+            job._zip = None
+        if job._temp is not None: self.cache.discard(job._temp); job._temp = None
+        self._close(job)
+
+    def _close(self, job):
+        for path in (job._source, job._previous and job._previous[0]):
+            if not path: continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        job._source = None; job._previous = None
+        job.finished_at = time.time()
+        job.metrics.add_stages(job._timer.stages); job.metrics.add_peak(peak_rss_mb())
+        job.metrics.seconds = job.finished_at - job.submitted
+        job.metrics.log()
+        job._finished.set()
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        for old in finished[:max(0, len(finished) - KEEP_FINISHED)]: del self._jobs[old.id]
@@ -0,0 +1,113 @@
+"""Đo thời gian theo từng bước xử lý (giải nén, parse, phân đoạn, trộn, đổi nhãn, ghép XML, nén, đáp án)
+và bản ghi số liệu của mỗi lần trộn (JobMetrics), ghi ra log dạng JSON qua logger "tronde.metrics".
+"""
+import contextlib
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LOGGER = logging.getLogger("tronde.metrics")
+STAGES = ("unzip", "parse", "segment", "shuffle", "relabel", "serialize", "rezip", "answer_key")
+
+class StageTimer:
+    """Cộng dồn thời gian (giây) theo tên bước. Bước lồng nhau chỉ tính phần thời gian riêng của nó,
+    nên tổng các bước bằng tổng thời gian đo."""
+
+    def __init__(self):
+        self.stages = {}
+        self._stack = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter(); self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started; nested = self._stack.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+            if self._stack: self._stack[-1] += elapsed
+
+    def total(self):
+        return sum(self.stages.values())
+
+class _NullTimer:
+    """Không đo gì - mặc định khi người gọi không cần số liệu"""
+    _context = contextlib.nullcontext()
+    stages = {}
+
+    def stage(self, name):
+        return self._context
+
+    def total(self):
+        return 0.0
+
+NULL_TIMER = _NullTimer()
+
+def peak_rss_mb():
+    """Bộ nhớ đỉnh (MB) của tiến trình hiện tại; None nếu hệ điều hành không hỗ trợ"""
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)   # macOS: byte, Linux: KB
+
+def template_counts(template):
+    """Số khối, câu hỏi, run (có chữ hoặc định dạng) và ảnh/media nhúng của đề gốc đã parse"""
+    media = [item.file_size for item, _ in template.members if item.filename.startswith("word/media/")]
+    return {"blocks": len(template.index), "runs": template.index.run_count,
+            "questions": sum(len(part.questions) for part in template.outline.parts),
+            "media": len(media), "media_bytes": sum(media)}
+
+@dataclass
+class JobMetrics:
+    """Số liệu của 1 lần trộn (shuffle_docx: 1 đề, create_zip_multiple: cả gói).
+
+    stages: giây theo từng bước; khi chạy song song là tổng thời gian của mọi tiến trình con.
+    seconds: thời gian thực của cả lần chạy. peak_rss_mb: bộ nhớ đỉnh lớn nhất trong các tiến trình.
+    """
+    job: str = ""
+    bytes_in: int = 0
+    bytes_out: int = 0
+    versions: int = 0
+    workers: int = 1
+    blocks: int = 0
+    questions: int = 0
+    runs: int = 0
+    media: int = 0
+    media_bytes: int = 0
+    stages: dict = field(default_factory=dict)
+    seconds: float = 0.0
+    peak_rss_mb: float = None
+    error: str = None
+
+    def set_counts(self, counts):
+        for name, value in counts.items(): setattr(self, name, value)
+
+    def add_stages(self, stages):
+        for name, seconds in stages.items(): self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_peak(self, peak):
+        if peak is not None: self.peak_rss_mb = max(self.peak_rss_mb or 0.0, peak)
+
+    def as_dict(self):
+        record = asdict(self)
+        record["stages"] = {name: round(record["stages"][name], 4) for name in STAGES if name in record["stages"]}
+        record["seconds"] = round(self.seconds, 4)
+        return record
+
+    def log(self):
+        LOGGER.info(json.dumps(self.as_dict(), ensure_ascii=False))
+
+def configure_json_logging(stream=None):
+    """Ghi log "tronde.*" ra stream (mặc định stderr), mỗi dòng 1 bản ghi JSON. Gọi nhiều lần không thêm handler."""
+    logger = logging.getLogger("tronde")
+    if any(getattr(h, "_tronde_json", False) for h in logger.handlers): return logger
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s")); handler._tronde_json = True
+    logger.addHandler(handler); logger.setLevel(logging.INFO)
+    return logger
@@ -0,0 +1,101 @@
+"""Xem trước 1 mã đề dạng HTML gọn, dựng từ chỉ mục khối của ExamTemplate và hoán vị của mã đề.
+
+Không ghép XML, không tạo .docx / .zip: chỉ ExamTemplate.arrange_version (thứ tự khối + nhãn mới + đáp án)
+và text của từng khối đã có sẵn trong BlockIndex. arrange_version không sửa DOM nên 1 template đã parse
+dùng chung được cho mọi lần xem trước (đổi mã đề, seed) - mỗi lần chỉ tốn vài ms.
+"""
+from html import escape
+
+from .answer_key import PARTS
+from .segment import BLOCK_PART, PART_MCQ, PART_SHORT, PART_TF
+from .word import LABEL_RULES, _local_name, get_text, iter_paragraphs
+
+PREVIEW_CSS = """
+<style>
+.tronde-preview { font-family: 'Times New Roman', serif; font-size: 15px; line-height: 1.45; max-height: 640px;
+                  overflow-y: auto; padding: 12px 16px; border: 1px solid #dfe3ea; border-radius: 8px; background: #fff; }
+.tronde-preview p { margin: 2px 0; }
+.tronde-preview .part { font-weight: bold; color: #1a237e; margin-top: 10px; }
+.tronde-preview .label { font-weight: bold; color: #0d47a1; }
+.tronde-preview .option { padding-left: 18px; }
+.tronde-preview .correct { background: #fff59d; border-radius: 4px; }
+.tronde-preview .badge { font-size: 12px; font-weight: bold; padding: 0 6px; margin-left: 6px; border-radius: 8px;
+                         background: #c8e6c9; color: #1b5e20; }
+.tronde-preview .badge.false { background: #ffcdd2; color: #b71c1c; }
+.tronde-preview .table { padding: 4px 8px; margin: 4px 0; border-left: 3px solid #b0bec5; color: #455a64; }
+.tronde-key { border-collapse: collapse; font-size: 13px; margin-top: 8px; }
+.tronde-key th, .tronde-key td { border: 1px solid #cfd8dc; padding: 2px 6px; text-align: center; white-space: nowrap; }
+.tronde-key th { background: #e3f2fd; }
+</style>
+"""
+
+def _label_kind(label):
+    if label.startswith("Câu"): return "question"
+    return "tf" if label.endswith(")") else "mcq"
+
+def _block_text(template, block):
+    """Text hiển thị của khối: bảng thì nối text các ô, đoạn thì lấy từ chỉ mục"""
+    if _local_name(block) == "tbl": return " | ".join(filter(None, (get_text(p) for p in iter_paragraphs(block))))
+    return template.index.texts[template.index.position(block)]
+
+def _question_parts(template):
+    """{id(khối): (loại phần, khóa đáp án)} của mọi khối thuộc câu hỏi được trộn"""
+    parts = {}
+    for kind, piece in template.pieces:
+        if kind != "part": continue
+        for slot in piece["questions"]:
+            for block in slot["blocks"]: parts[id(block)] = (piece["type"], piece["key"])
+    return parts
+
+def _answer_key_row(answers):
+    """Bảng đáp án 1 mã đề: mỗi phần 1 dòng, mỗi câu 1 ô"""
+    rows = []
+    for key, (title, prefix, _, _) in PARTS.items():
+        part = answers.get(key)
+        if not part: continue
+        cells = "".join(f"<td><b>{n}</b> {escape(str(part[n]))}</td>" for n in sorted(part))
+        rows.append(f"<tr><th>{escape(title.split(':')[0])}</th>{cells}</tr>")
+    return f'<table class="tronde-key">{"".join(rows)}</table>' if rows else ""
+
+def preview_html(template, plan, code=None):
+    """HTML xem trước mã đề code trộn theo plan: thứ tự câu, nhãn mới, đáp án đúng được tô và dòng đáp án.
+    Trả về (html, đáp án)."""
+    new_blocks, labels, answers = template.arrange_version(plan)
+    parts = _question_parts(template); placeholder = template.placeholder
+    out = [PREVIEW_CSS, '<div class="tronde-preview">']; number = None
+    for block in new_blocks:
+        text = _block_text(template, block)
+        if placeholder and code is not None: text = text.replace(placeholder, str(code))
+        part_type, key = parts.get(id(block), (None, None))
+        label = labels.get(id(block)); classes = []; badge = ""
+        if label is not None:
+            # Số câu lấy từ nhãn mới của mọi khối đầu câu (kể cả khối không tìm được chỗ nhãn trong XML)
+            kind = _label_kind(label)
+            m = LABEL_RULES[kind][0].match(text)
+            body = escape(text[m.end():] if m else text)
+            text_html = f'<span class="label">{escape(label)}</span>{body}'
+            part_answers = answers.get(key) or {}
+            if kind == "question":
+                number = int(label[4:-1])
+                if part_type == PART_SHORT and number in part_answers:
+                    badge = f'<span class="badge">Đáp án: {escape(str(part_answers[number]))}</span>'
+            elif kind == "mcq":
+                classes.append("option")
+                if part_type == PART_MCQ and part_answers.get(number) == label[0]: classes.append("correct")
+            else:
+                classes.append("option")
+                statuses = part_answers.get(number, "").split("-") if part_type == PART_TF else []
+                slot = ord(label[0]) - ord("a")
+                status = statuses[slot] if slot < len(statuses) else ""
+                if status == "Đ": classes.append("correct")
+                if status: badge = f'<span class="badge{"" if status == "Đ" else " false"}">{escape(status)}</span>'
+        elif not text:
+            continue
+        else:
+            text_html = escape(text)
+            if template.index.kinds[template.index.position(block)] & BLOCK_PART: classes.append("part")
+            elif _local_name(block) == "tbl": classes.append("table")
+        out.append(f'<p class="{" ".join(classes)}">{text_html}{badge}</p>')
+    out.append("</div>")
+    out.append(_answer_key_row(answers))
+    return "".join(out), answers
@@ -0,0 +1,125 @@
+"""Mỗi học sinh 1 đề riêng theo danh sách lớp: hàng trăm đến hàng nghìn mã đề trong 1 gói.
+
+Danh sách đọc từ CSV/XLSX (pandas, như tronde.grading): cột mã học sinh (sbd / ma_hs / student_id...),
+cột họ tên và lớp nếu có. Học sinh ở dòng thứ i nhận mã đề start_code + i; file .docx trong gói mang tên
+<tên gốc>_<mã đề>_<mã HS>_<họ tên>.docx. Gói có thêm bảng đáp án theo học sinh Dap_An_Hoc_Sinh.xlsx / .csv:
+1 dòng/học sinh (ma_hs, ho_ten, lop, ma_de, P1_1...) - đọc được thẳng bằng tronde.grading.load_answer_key.
+
+Sinh đề dùng chung đường ống của create_zip_multiple (roster=...): đề gốc parse 1 lần mỗi tiến trình, mỗi mã đề
+ghi ngay vào gói rồi bỏ - bộ nhớ không tăng theo số học sinh, ngoài bảng đáp án dạng cột (AnswerStore).
+
+    python -m tronde DE.docx --roster danh_sach.xlsx --start 1001 -j 4 -o OUT
+"""
+import io
+import re
+import csv
+import hashlib
+from collections import Counter
+
+from .answer_key import write_xlsx_member, xlsxwriter
+
+ID_COLUMNS = ("sbd", "ma_hs", "student_id", "id", "số báo danh", "mã học sinh", "mã hs")
+NAME_COLUMNS = ("ho_ten", "họ và tên", "họ tên", "ho va ten", "ho ten", "name", "tên")
+CLASS_COLUMNS = ("lop", "lớp", "class")
+ROSTER_KEY_BASE = "Dap_An_Hoc_Sinh"
+MAX_NAME_CHARS = 40
+
+def version_filename(base_name, code, roster=None):
+    """Tên file .docx của mã đề code trong gói: <tên gốc>_<mã đề>.docx, hoặc tên học sinh theo roster"""
+    return roster.filename(base_name, code) if roster is not None else f"{base_name}_{code}.docx"
+
+def _safe(text):
+    """Phần tên file an toàn: giữ chữ (kể cả tiếng Việt), số và '-', còn lại thành '_'"""
+    return re.sub(r'[^\w-]+', '_', text).strip('_')[:MAX_NAME_CHARS]
+
+class Roster:
+    """Danh sách học sinh theo thứ tự dòng; học sinh thứ i nhận mã đề start_code + i"""
+
+    def __init__(self, ids, names=None, classes=None, start_code=101):
+        ids = [str(i).strip() for i in ids]
+        if not ids: raise ValueError("Danh sách học sinh trống")
+        if not all(ids): raise ValueError(f"Thiếu mã học sinh ở dòng {ids.index('') + 2}")
+        duplicates = sorted(i for i, n in Counter(ids).items() if n > 1)
+        if duplicates: raise ValueError(f"Mã học sinh bị trùng: {', '.join(duplicates[:5])}")
+        self.ids = ids; self.start_code = start_code
+        self.names = [str(n).strip() for n in names] if names is not None else [""] * len(ids)
+        self.classes = [str(c).strip() for c in classes] if classes is not None else [""] * len(ids)
+        self._files = [_safe(f"{i}_{n}") or str(k) for k, (i, n) in enumerate(zip(self.ids, self.names))]
+
+    @classmethod
+    def from_table(cls, source, name=None, start_code=101):
+        """Đọc danh sách từ CSV/XLSX (đường dẫn hoặc file-like có .name); bỏ các dòng trống"""
+        from .grading import _find_column, read_table
+        frame = read_table(source, name)
+        frame.columns = [str(c).strip().lower() for c in frame.columns]
+        id_col = _find_column(frame, ID_COLUMNS, "mã học sinh")
+        frame = frame.fillna("")
+        frame = frame[frame.astype(str).apply(lambda col: col.str.strip()).ne("").any(axis=1)]
+        def column(candidates):
+            found = next((c for c in candidates if c in frame.columns), None)
+            return frame[found].tolist() if found else None
+        return cls(frame[id_col].tolist(), column(NAME_COLUMNS), column(CLASS_COLUMNS), start_code)
+
+    @classmethod
+    def from_rows(cls, rows, start_code=101):
+        """Từ list [mã HS, họ tên, lớp] (dạng rows(), lưu trong bản kê của gói)"""
+        return cls([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], start_code)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def codes(self):
+        return range(self.start_code, self.start_code + len(self.ids))
+
+    def rows(self):
+        return [[i, n, c] for i, n, c in zip(self.ids, self.names, self.classes)]
+
+    def fingerprint(self):
+        """SHA-1 của danh sách (thứ tự, mã HS, họ tên, lớp) - cho khóa cache của gói"""
+        digest = hashlib.sha1()
+        for row in self.rows(): digest.update("\x1f".join(row).encode("utf-8") + b"\x1e")
+        return digest.hexdigest()
+
+    def filename(self, base_name, code):
+        """Tên file .docx của học sinh nhận mã đề code"""
+        if code not in self.codes: raise ValueError(f"Mã đề {code} không thuộc danh sách học sinh ({self.codes.start}-{self.codes.stop - 1})")
+        return f"{base_name}_{code}_{self._files[code - self.start_code]}.docx"
+
+    def _iter_rows(self, store):
+        """(mã HS, họ tên, lớp, mã đề, đáp án mọi phần) theo thứ tự danh sách"""
+        position = {code: i for i, code in enumerate(store.codes)}
+        for k, code in enumerate(self.codes):
+            i = position.get(code)
+            cells = [cell for key in store.questions for cell in store.row(key, i)] if i is not None else []
+            yield self.ids[k], self.names[k], self.classes[k], code, cells
+
+    def write_answer_key_csv(self, store, output):
+        """CSV 1 dòng/học sinh: ma_hs, ho_ten, lop, ma_de, P1_1...; output là luồng văn bản"""
+        writer = csv.writer(output)
+        writer.writerow(["ma_hs", "ho_ten", "lop", "ma_de"] + store.columns())
+        for student, name, class_name, code, cells in self._iter_rows(store):
+            writer.writerow([student, name, class_name, code] + cells)
+
+    def write_answer_key_xlsx(self, store, output):
+        """Excel 1 dòng/học sinh, sheet "Tổng hợp" (cùng tên sheet bảng đáp án mà tronde.grading đọc),
+        ghi từng dòng (constant_memory)"""
+        if xlsxwriter is None: raise RuntimeError("Cần cài xlsxwriter để xuất file .xlsx")
+        workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+        header = workbook.add_format({"bold": True, "bg_color": "#D9E2F3", "border": 1, "align": "center"})
+        try:
+            sheet = workbook.add_worksheet("Tổng hợp")
+            sheet.write_row(0, 0, ["ma_hs", "ho_ten", "lop", "ma_de"] + store.columns(), header)
+            sheet.freeze_panes(1, 4)
+            for r, (student, name, class_name, code, cells) in enumerate(self._iter_rows(store), start=1):
+                sheet.write_string(r, 0, student); sheet.write_string(r, 1, name); sheet.write_string(r, 2, class_name)
+                sheet.write_number(r, 3, code); sheet.write_row(r, 4, cells)
+        finally:
+            workbook.close()
+
+    def write_answer_keys(self, store, zout, base=ROSTER_KEY_BASE, policy=None):
+        """Ghi bảng đáp án theo học sinh (.csv, .xlsx) vào gói .zip đang mở (policy: CompressionPolicy của gói)"""
+        with zout.open(f"{base}.csv", 'w') as member:
+            with io.TextIOWrapper(member, encoding="utf-8-sig", newline="") as text: self.write_answer_key_csv(store, text)
+        if xlsxwriter is not None:
+            write_xlsx_member(zout, f"{base}.xlsx", lambda output: self.write_answer_key_xlsx(store, output), policy)
@@ -0,0 +1,128 @@
+"""Sinh hoán vị cho cả loạt mã đề cùng lúc (mảng NumPy) với các ràng buộc giữa các mã đề.
+
+Khác với version_plan (mỗi mã đề rút ngẫu nhiên độc lập), sample_plans nhìn cả loạt:
+- thứ tự câu của 2 mã đề bất kỳ khác nhau ở ít nhất min_distance vị trí (khoảng cách Hamming,
+  tính trên thứ tự câu nối tiếp của mọi phần được trộn);
+- trong mỗi mã đề, đáp án đúng PHẦN 1 chia đều cho A-D (chênh lệch tối đa 1 câu);
+- không quá max_run câu liền nhau có cùng chữ cái đáp án;
+- ý d) của PHẦN 2 giữ nguyên chỗ như trộn thường (chỉ a-c được hoán vị).
+
+Kết quả có cùng định dạng với ExamTemplate.plan_version (array 'H'), dùng thẳng cho write_version.
+Loạt hoán vị chỉ phụ thuộc (đề, seed, danh sách mã đề, ràng buộc) - tạo lại 1 mã đề cần cùng loạt mã.
+"""
+from array import array
+from dataclasses import dataclass
+
+import numpy as np
+
+from .template import option_count
+
+LETTERS = 4     # A-D
+
+@dataclass
+class SamplerConstraints:
+    min_distance: int = None    # None: nửa tổng số câu được trộn
+    balance_letters: bool = True
+    max_run: int = 3            # 0: không giới hạn
+    max_rounds: int = 64        # số vòng rút lại tối đa cho mỗi ràng buộc
+
+def _random_orders(rng, rows, n):
+    """rows hoán vị ngẫu nhiên đều của range(n), mỗi dòng 1 hoán vị"""
+    return np.argsort(rng.random((rows, n)), axis=1).astype(np.int64)
+
+def _conflicts(orders, min_distance, block=256):
+    """Mặt nạ các dòng i có dòng j < i với khoảng cách Hamming < min_distance (tính theo khối dòng)"""
+    bad = np.zeros(len(orders), dtype=bool)
+    for start in range(0, len(orders), block):
+        chunk = orders[start:start + block]
+        distance = (chunk[:, None, :] != orders[None, :, :]).sum(axis=2)
+        rows = np.arange(start, start + len(chunk))
+        earlier = np.arange(len(orders))[None, :] < rows[:, None]
+        bad[rows] = ((distance < min_distance) & earlier).any(axis=1)
+    return bad
+
+def _balanced_letters(rng, rows, n, max_run, max_rounds):
+    """(rows, n) chữ cái 0-3: mỗi dòng có số lần mỗi chữ chênh nhau tối đa 1, không có chuỗi > max_run"""
+    # Số câu không chia hết cho 4: chữ cái được thêm 1 câu khác nhau giữa các mã đề (lệch ngẫu nhiên)
+    base = (np.arange(n)[None, :] + rng.integers(0, LETTERS, (rows, 1))) % LETTERS
+    letters = np.take_along_axis(base, _random_orders(rng, rows, n), axis=1)
+    if not max_run or n <= max_run: return letters
+    for _ in range(max_rounds):
+        same = np.ones((rows, n - max_run), dtype=bool)
+        for k in range(1, max_run + 1): same &= letters[:, k:n - max_run + k] == letters[:, :n - max_run]
+        v, i = np.nonzero(same)
+        if not len(v): break
+        # Đổi chữ cuối của chuỗi quá dài với 1 vị trí ngẫu nhiên cùng dòng: số lần mỗi chữ không đổi
+        v, first = np.unique(v, return_index=True); i = i[first] + max_run
+        j = rng.integers(0, n, len(v))
+        letters[v, i], letters[v, j] = letters[v, j], letters[v, i].copy()
+    return letters
+
+def sample_plans(template, seed, codes, constraints=None):
+    """Hoán vị của mọi mã đề trong codes: trả về ({mã đề: array('H')}, báo cáo ràng buộc đạt được)"""
+    constraints = constraints or SamplerConstraints()
+    rng = np.random.default_rng(seed if seed is None else [seed, 0x7D0E])
+    codes = list(codes); rows = len(codes)
+    parts = [piece for kind, piece in template.pieces if kind == "part"]
+    total = sum(len(part["questions"]) for part in parts)
+
+    # 1. Thứ tự câu của mọi phần, rút lại các mã đề quá giống 1 mã đề trước đó
+    orders = [_random_orders(rng, rows, len(part["questions"])) for part in parts]
+    min_distance = constraints.min_distance if constraints.min_distance is not None else total // 2
+    bad = np.zeros(rows, dtype=bool)
+    if rows > 1 and total and min_distance > 0:
+        for _ in range(constraints.max_rounds):
+            bad = _conflicts(np.concatenate(orders, axis=1), min_distance)
+            if not bad.any(): break
+            for order, part in zip(orders, parts): order[bad] = _random_orders(rng, int(bad.sum()), len(part["questions"]))
+
+    # 2. Thứ tự phương án của từng câu; câu trắc nghiệm có đáp án được đặt vào chữ cái đã phân bổ
+    segments = []; letter_counts = np.zeros(LETTERS, dtype=np.int64); longest_run = 0
+    for order, part in zip(orders, parts):
+        slots = part["questions"]
+        targets = np.full((rows, len(slots)), -1)
+        balanced = np.array([slot["kind"] == "mcq" and slot["marked"] != -1 and option_count(slot) >= LETTERS
+                             for slot in slots], dtype=bool)
+        if constraints.balance_letters and balanced.any():
+            # Chữ cái theo vị trí câu trong đề đã trộn -> trả về câu gốc đứng ở vị trí đó
+            in_order = balanced[order]
+            n_balanced = int(balanced.sum())
+            letters = _balanced_letters(rng, rows, n_balanced, constraints.max_run, constraints.max_rounds)
+            positions = np.nonzero(in_order)       # in_order có đúng n_balanced ô True mỗi dòng
+            question = order[positions].reshape(rows, n_balanced)
+            np.put_along_axis(targets, question, letters, axis=1)
+            letter_counts += np.bincount(letters.ravel(), minlength=LETTERS)
+            if n_balanced:
+                changes = np.diff(letters, axis=1) != 0
+                runs = [np.diff(np.flatnonzero(np.concatenate(([True], row, [True])))).max() for row in changes]
+                longest_run = max(longest_run, int(max(runs)))
+        for q, slot in enumerate(slots):
+            n = option_count(slot)
+            if not n: continue
+            perms = _random_orders(rng, rows, n)
+            if slot["kind"] == "mcq" and slot["marked"] != -1:
+                target = targets[:, q]; fix = target >= 0
+                current = np.argmax(perms == slot["marked"], axis=1)
+                r = np.nonzero(fix)[0]
+                perms[r, current[r]], perms[r, target[r]] = perms[r, target[r]], perms[r, current[r]].copy()
+            segments.append(perms)
+        segments.append(order)
+    matrix = np.concatenate(segments, axis=1).astype(np.uint16) if segments else np.zeros((rows, 0), np.uint16)
+
+    plans = {}
+    for code, row in zip(codes, matrix):
+        plan = array('H'); plan.frombytes(row.tobytes()); plans[code] = plan
+    distance = _min_distance(np.concatenate(orders, axis=1)) if rows > 1 and total else None
+    report = {"min_distance": distance, "min_distance_target": min_distance, "unresolved": int(bad.sum()),
+              "letter_counts": dict(zip("ABCD", letter_counts.tolist())), "longest_run": longest_run}
+    return plans, report
+
+def _min_distance(orders, block=256):
+    best = orders.shape[1]
+    for start in range(0, len(orders), block):
+        chunk = orders[start:start + block]
+        distance = (chunk[:, None, :] != orders[None, :, :]).sum(axis=2)
+        rows = np.arange(start, start + len(chunk))
+        distance[np.arange(len(chunk)), rows] = orders.shape[1]
+        best = min(best, int(distance.min()))
+    return best
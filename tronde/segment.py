@@ -0,0 +1,277 @@
+"""Chỉ mục khối và phân đoạn đề: PHẦN -> phần dẫn -> câu hỏi -> phương án."""
+import re
+from dataclasses import dataclass, field
+
+from .word import W_NS, MARK_ATTRS, _is_minidom, _local_name, _node_value, clean_answer_text
+from .styles import StyleMarks, mark_bit, resolve_marks, w_attr
+
+BLOCK_OTHER = 0
+BLOCK_PART = 1          # Bắt đầu bằng "PHẦN n"
+BLOCK_QUESTION = 2      # Bắt đầu bằng "Câu n"
+BLOCK_MCQ_OPTION = 4    # A. B. C. D.
+BLOCK_TF_OPTION = 8     # a) b) c) d)
+
+RE_PART_MENTION = re.compile(r'PHẦN\s*(\d+)\b', re.IGNORECASE)
+RE_PART_START = re.compile(r'^PHẦN\s*(\d+)\b', re.IGNORECASE)
+MENTION_PART_NUMBERS = range(1, 5)     # tiêu đề kiểu cũ chỉ nhắc "PHẦN n" giữa dòng: chỉ nhận PHẦN 1-4
+RE_QUESTION_START = re.compile(r'^Câu\s*\d+\b')
+RE_MCQ_OPTION = re.compile(r'^\s*[A-D][\.\)]', re.IGNORECASE)
+RE_TF_OPTION = re.compile(r'^\s*([a-d])\)', re.IGNORECASE)
+
+_NO_PARTS = ()
+_W_PREFIX_LEN = len(W_NS) + 2
+_SCAN_NAMES = ("t", "rStyle", "pStyle", *MARK_ATTRS)
+_SCAN_TAGS = [f"{{{W_NS}}}{name}" for name in _SCAN_NAMES]
+_NO_STYLES = StyleMarks()
+
+def _iter_minidom_elements(node):
+    for child in node.childNodes:
+        if child.nodeType == child.ELEMENT_NODE:
+            yield child
+            yield from _iter_minidom_elements(child)
+
+def _iter_scan_elements(block):
+    """(phần tử, tên, phần tử cha) của các thẻ w:t / kiểu / đánh dấu trong khối, theo thứ tự tài liệu"""
+    if _is_minidom(block):
+        for el in _iter_minidom_elements(block):
+            if el.namespaceURI == W_NS and el.localName in _SCAN_NAMES: yield el, el.localName, el.parentNode
+    else:
+        for el in block.iter(*_SCAN_TAGS):
+            if el is not block: yield el, el.tag[_W_PREFIX_LEN:], el.getparent()
+
+def _parent(node):
+    return node.parentNode if _is_minidom(node) else node.getparent()
+
+_W_TAGS = {name: f"{{{W_NS}}}{name}" for name in ("p", "pPr", "r", "rPr")}
+
+def _is_w(node, name):
+    if node is None: return False
+    if _is_minidom(node): return node.nodeType == node.ELEMENT_NODE and node.localName == name
+    return node.tag == _W_TAGS[name]
+
+def _paragraph_of(run):
+    node = _parent(run)
+    while node is not None and not _is_w(node, "p"): node = _parent(node)
+    return node
+
+def scan_block(block, styles=_NO_STYLES):
+    """Duyệt cây con của khối đúng 1 lần: trả về (text như get_text, cờ đánh dấu đúng, text các run được đánh dấu,
+    số run có chữ hoặc định dạng).
+
+    Mỗi run có mặt nạ đánh dấu (gạch chân, màu, highlight, nền) gộp từ định dạng trực tiếp,
+    kiểu ký tự (w:rStyle) và kiểu đoạn (w:pStyle) trong styles.
+    """
+    texts = []; marked = False
+    runs = {}           # id(run) -> [run, known, on, rStyle, texts]
+    para_styles = {}    # id(đoạn) -> (đoạn, pStyle)
+    def run_state(run):
+        state = runs.get(id(run))
+        if state is None: state = runs[id(run)] = [run, 0, 0, None, []]
+        return state
+    for el, name, parent in _iter_scan_elements(block):
+        if name == "t":
+            value = _node_value(el)
+            if not value: continue
+            texts.append(value)
+            if _is_w(parent, "r"): run_state(parent)[4].append(value)
+            continue
+        if name == "pStyle":
+            if _is_w(parent, "pPr"):
+                para = _parent(parent); para_styles[id(para)] = (para, w_attr(el, "val"))
+            continue
+        run = _parent(parent) if _is_w(parent, "rPr") else None
+        if not _is_w(run, "r"): run = None
+        if name == "rStyle":
+            if run is not None: run_state(run)[3] = w_attr(el, "val")
+            continue
+        bit, on = mark_bit(el, name)
+        if on: marked = True
+        if run is not None:
+            state = run_state(run); state[1] |= bit; state[2] |= on
+    answer = []
+    for run, known, on, char_style, run_texts in runs.values():
+        if styles:
+            para = _paragraph_of(run)
+            para_style = para_styles.get(id(para), (None, None))[1]
+            on = resolve_marks((known, on), styles.get(char_style), styles.get(para_style))
+        if not on: continue
+        marked = True; answer.extend(run_texts)
+    return "".join(texts).strip(), marked, "".join(answer), len(runs)
+
+class BlockIndex:
+    """Chỉ mục các khối cấp cao (w:p / w:tbl) của body, mỗi khối được duyệt đúng 1 lần.
+
+    Mỗi khối lưu: text, loại (cờ BLOCK_*), cờ đánh dấu đúng, text các run được đánh dấu (đáp án P3),
+    các số PHẦN có thể mở phần mới và chữ cái ý Đ/S. Đánh dấu tính cả kiểu kế thừa từ styles (StyleMarks). Các bước phân đoạn, trộn, relabel chỉ đọc chỉ mục, không duyệt lại DOM.
+    Có thể nạp dần từng khối bằng add() khi đọc lười.
+    """
+
+    def __init__(self, blocks=(), styles=_NO_STYLES):
+        self.styles = styles; self.run_count = 0
+        self.blocks = []
+        self.texts = []; self.kinds = []; self.marked = []; self.answers = []; self.part_numbers = []; self.tf_letters = []
+        self._positions = {}
+        for block in blocks: self.add(block)
+
+    def add(self, block):
+        """Quét 1 khối, trả về vị trí của nó trong chỉ mục"""
+        text, marked, answer, runs = scan_block(block, self.styles)
+        self.run_count += runs
+        kind = BLOCK_OTHER
+        start = RE_PART_START.match(text)
+        if start: kind |= BLOCK_PART
+        if RE_QUESTION_START.match(text): kind |= BLOCK_QUESTION
+        if RE_MCQ_OPTION.match(text): kind |= BLOCK_MCQ_OPTION
+        m = RE_TF_OPTION.match(text)
+        if m: kind |= BLOCK_TF_OPTION
+        if start: numbers = (int(start.group(1)),)
+        elif kind: numbers = _NO_PARTS            # câu hỏi / phương án nhắc "phần n" không phải tiêu đề
+        else: numbers = tuple(n for n in map(int, RE_PART_MENTION.findall(text)) if n in MENTION_PART_NUMBERS)
+        pos = len(self.blocks)
+        self.blocks.append(block)
+        self.texts.append(text)
+        self.kinds.append(kind)
+        self.marked.append(marked)
+        self.answers.append(answer)
+        self.part_numbers.append(numbers or _NO_PARTS)
+        self.tf_letters.append(m.group(1).lower() if m else None)
+        self._positions[id(block)] = pos
+        return pos
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def position(self, block):
+        return self._positions[id(block)]
+
+    def text(self, block):
+        return self.texts[self.position(block)]
+
+    def is_kind(self, block, kind):
+        return bool(self.kinds[self.position(block)] & kind)
+
+    def is_marked(self, block):
+        return self.marked[self.position(block)]
+
+    def tf_letter(self, block):
+        return self.tf_letters[self.position(block)]
+
+# ==================== PHÂN ĐOẠN ĐỀ (1 LẦN ĐỌC, MÁY TRẠNG THÁI) ====================
+
+PART_MCQ = "PHAN1"; PART_TF = "PHAN2"; PART_SHORT = "PHAN3"; PART_ESSAY = "PHAN4"
+PART_TYPES_BY_NUMBER = {1: PART_MCQ, 2: PART_TF, 3: PART_SHORT, 4: PART_ESSAY}
+ANSWER_KEYS = {PART_MCQ: "P1", PART_TF: "P2", PART_SHORT: "P3"}
+RE_ESSAY = re.compile(r'TỰ\s*LUẬN', re.IGNORECASE)
+
+@dataclass
+class QuestionSpan:
+    """Một câu hỏi: vị trí các khối (khối đầu là "Câu n") và vị trí tương đối của các phương án"""
+    blocks: list = field(default_factory=list)
+    mcq_options: list = field(default_factory=list)    # các khối A-D
+    tf_options: dict = field(default_factory=dict)     # chữ cái a-d -> khối (trùng chữ: lấy khối sau)
+
+@dataclass
+class PartSpan:
+    """Một phần của đề. number=None là đoạn trước tiêu đề PHẦN đầu tiên (hoặc cả đề nếu không có PHẦN)"""
+    number: int = None
+    header: int = None                                  # vị trí khối tiêu đề "PHẦN n"
+    type: str = None                                    # PART_*; None = giữ nguyên
+    blocks: list = field(default_factory=list)          # mọi khối sau tiêu đề, theo thứ tự gốc
+    intro: list = field(default_factory=list)           # khối không thuộc câu hỏi nào
+    questions: list = field(default_factory=list)
+
+@dataclass
+class Outline:
+    parts: list = field(default_factory=list)
+
+def _infer_part_type(part, index):
+    """Loại phần cho PHẦN ngoài 1-4: theo tiêu đề "Tự luận" hoặc theo dạng phương án của đa số câu"""
+    if part.header is not None and RE_ESSAY.search(index.texts[part.header]): return PART_ESSAY
+    if not part.questions: return PART_ESSAY
+    tf_count = mcq_count = 0
+    for q in part.questions:
+        tf_heads = [index.texts[q.blocks[o]][:1] for o in q.tf_options.values()]
+        if len(tf_heads) >= 2 and all(c.islower() for c in tf_heads): tf_count += 1
+        elif len(q.mcq_options) >= 2: mcq_count += 1
+    if 2 * tf_count > len(part.questions): return PART_TF
+    if 2 * mcq_count > len(part.questions): return PART_MCQ
+    return PART_SHORT
+
+def segment_blocks(blocks, index, shuffle_mode="auto"):
+    """Đọc các khối đúng 1 lần (chấp nhận iterator lười), nạp vào index và dựng Outline.
+
+    Tiêu đề phần: khối đầu tiên bắt đầu bằng "PHẦN n" với n chưa gặp, hoặc (đề kiểu cũ) khối không phải câu hỏi/
+    phương án có nhắc "PHẦN 1-4" chưa gặp. Câu hỏi: từ khối "Câu n"
+    tới trước câu/tiêu đề kế tiếp; khối "PHẦN.." lẻ hoặc khối trước câu đầu tiên là phần dẫn.
+    Chế độ mcq/tf: bỏ qua tiêu đề, cả đề là 1 phần trắc nghiệm.
+    """
+    auto = shuffle_mode == "auto"
+    part = PartSpan(); parts = [part]; question = None; seen = set()
+    for block in blocks:
+        pos = index.add(block); kind = index.kinds[pos]
+        new_numbers = [n for n in index.part_numbers[pos] if n not in seen] if auto else None
+        if new_numbers:
+            seen.update(new_numbers)
+            part = PartSpan(number=new_numbers[0], header=pos); parts.append(part); question = None
+            continue
+        part.blocks.append(pos)
+        if kind & BLOCK_QUESTION:
+            question = QuestionSpan(blocks=[pos]); part.questions.append(question)
+        elif question is not None and not kind & BLOCK_PART:
+            question.blocks.append(pos)
+        else:
+            question = None; part.intro.append(pos); continue
+        offset = len(question.blocks) - 1
+        if kind & BLOCK_MCQ_OPTION: question.mcq_options.append(offset)
+        if kind & BLOCK_TF_OPTION: question.tf_options[index.tf_letters[pos]] = offset
+
+    head = parts[0]
+    for part in parts[1:]:
+        part.type = PART_TYPES_BY_NUMBER.get(part.number) or _infer_part_type(part, index)
+    if len(parts) == 1: head.type = PART_MCQ          # không có PHẦN nào: trộn cả đề như trắc nghiệm
+    elif not head.blocks: parts.pop(0)
+    return Outline(parts=parts)
+
+def iter_body_blocks(body, other_nodes):
+    """Duyệt lười các khối w:p / w:tbl của body; phần tử khác (w:sectPr...) được gom vào other_nodes"""
+    children = body.childNodes if _is_minidom(body) else body.iterchildren()
+    for child in children:
+        if _is_minidom(child):
+            if child.nodeType != child.ELEMENT_NODE: continue
+        elif not isinstance(child.tag, str): continue
+        if _local_name(child) in ("p", "tbl"): yield child
+        else: other_nodes.append(child)
+
+def analyze_mcq_question(question, index):
+    """Vị trí các phương án A-D và phương án được đánh dấu đúng (tính 1 lần)"""
+    question_blocks = [index.blocks[pos] for pos in question.blocks]
+    indices = question.mcq_options
+    marked_index = -1
+    if len(indices) >= 2:
+        for k, idx in enumerate(indices):
+            if index.marked[question.blocks[idx]]:
+                marked_index = k; break
+    return {"kind": "mcq", "blocks": question_blocks, "options": indices, "marked": marked_index}
+
+def analyze_tf_question(question, index):
+    """Vị trí các ý a) b) c) d) và trạng thái Đ/S của từng ý (tính 1 lần)"""
+    question_blocks = [index.blocks[pos] for pos in question.blocks]
+    option_indices = question.tf_options
+    abc_keys = [k for k in ['a', 'b', 'c'] if k in option_indices]
+    slot = {"kind": "tf", "blocks": question_blocks, "options": [], "statuses": [], "d": None, "targets": []}
+    if len(abc_keys) < 2: return slot
+    status = lambda idx: 'Đ' if index.marked[question.blocks[idx]] else 'S'
+    slot["options"] = [option_indices[k] for k in abc_keys]
+    slot["statuses"] = [status(idx) for idx in slot["options"]]
+    if 'd' in option_indices: slot["d"] = (option_indices['d'], status(option_indices['d']))
+    slot["targets"] = sorted(option_indices.values())
+    return slot
+
+def analyze_question(question, part_type, index):
+    if part_type == PART_MCQ: return analyze_mcq_question(question, index)
+    if part_type == PART_TF: return analyze_tf_question(question, index)
+    question_blocks = [index.blocks[pos] for pos in question.blocks]
+    if part_type == PART_SHORT:
+        answer = clean_answer_text("".join(index.answers[pos] for pos in question.blocks))
+        return {"kind": "short", "blocks": question_blocks, "answer": answer}
+    return {"kind": "other", "blocks": question_blocks}
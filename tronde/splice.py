@@ -0,0 +1,100 @@
+"""Ghép word/document.xml ở mức byte.
+
+Mỗi khối cấp cao được serialize đúng 1 lần trong ngữ cảnh cả tài liệu (không lặp khai báo namespace).
+Khối có nhãn ("Câu n.", "A.", "a)") được cắt làm 2 đoạn quanh nhãn; mỗi mã đề chỉ còn nối
+phần đầu + các đoạn theo thứ tự mới (chèn nhãn mới) + phần đuôi (w:sectPr, thẻ đóng).
+Khối có chỗ điền mã đề (placeholder, vd "{{MA_DE}}") được cắt thêm tại mỗi chỗ đó.
+assemble_chunks trả về document.xml theo từng đoạn ~CHUNK_BYTES để nén độc lập (xem ziputil.deflate_chunks).
+"""
+import uuid
+from xml.sax.saxutils import escape
+
+from .word import apply_label, create_comment, replace_children, serialize_document
+
+_TOKEN = uuid.uuid4().hex
+SPLIT_MARK = f"tronde-split-{_TOKEN}"
+LABEL_MARK = f"\ue000{_TOKEN}\ue001"      # ký tự vùng riêng: không thể có sẵn trong đề
+CHUNK_BYTES = 64 * 1024     # cỡ đoạn document.xml được nén độc lập (nhỏ hơn: nén lại ít hơn khi sửa, file lớn hơn)
+
+class DocumentSplicer:
+    """Các đoạn byte của document.xml: prefix, 1 đoạn cho mỗi khối, trailer (khối khác + thẻ đóng)"""
+
+    def __init__(self, root, body, blocks, other_nodes, anchors, placeholder=None, style_labels=True):
+        """anchors: bảng nhãn {id(khối): LabelAnchor}; nhãn gốc được giữ nếu mã đề không đổi nhãn khối đó.
+        placeholder: chuỗi được thay bằng mã đề (assemble(..., stamp)); các lần xuất hiện đã nằm gọn trong 1 w:t.
+        style_labels: tô xanh đậm run chứa nhãn (False: giữ nguyên định dạng gốc, vd khi lưu câu vào ngân hàng)."""
+        for anchor in anchors.values(): apply_label(anchor, LABEL_MARK, style_labels)
+        split_mark = SPLIT_MARK.encode("utf-8"); label_mark = LABEL_MARK.encode("utf-8")
+        children = list(blocks) + list(other_nodes)
+        marked = []
+        for child in children: marked += [create_comment(root, SPLIT_MARK), child]
+        marked.append(create_comment(root, SPLIT_MARK))
+        replace_children(body, marked)
+        data = serialize_document(root)
+        replace_children(body, children)
+        comment = b"<!--" + split_mark + b"-->"
+        pieces = data.split(comment)
+        if len(pieces) != len(children) + 2: raise ValueError("Không tách được document.xml thành các khối")
+        self.prefix = pieces[0]
+        self.fragments = {}
+        stamp_mark = escape(placeholder).encode("utf-8") if placeholder else None
+        for block, fragment in zip(blocks, pieces[1:]):
+            anchor = anchors.get(id(block))
+            if stamp_mark and stamp_mark in fragment:
+                # Danh sách mảnh: bytes, None = chỗ mã đề, (nhãn gốc,) = chỗ nhãn
+                parts = fragment.split(label_mark) if anchor is not None else [fragment]
+                items = []
+                for i, part in enumerate(parts):
+                    if i: items.append((anchor.label.encode("utf-8"),))
+                    for j, piece in enumerate(part.split(stamp_mark)):
+                        if j: items.append(None)
+                        items.append(piece)
+                self.fragments[id(block)] = items
+            elif anchor is not None:
+                head, tail = fragment.split(label_mark)
+                self.fragments[id(block)] = (head, tail, anchor.label.encode("utf-8"))
+            else:
+                self.fragments[id(block)] = fragment
+        self.trailer = b"".join(pieces[len(blocks) + 1:])
+
+    def _extend(self, out, block, labels, stamp):
+        fragment = self.fragments[id(block)]
+        kind = type(fragment)
+        if kind is bytes:
+            out.append(fragment)
+        elif kind is tuple:
+            label = labels.get(id(block))
+            out += [fragment[0], label.encode("utf-8") if label else fragment[2], fragment[1]]
+        else:
+            for piece in fragment:
+                if piece is None: out.append(stamp)
+                elif type(piece) is tuple:
+                    label = labels.get(id(block))
+                    out.append(label.encode("utf-8") if label else piece[0])
+                else: out.append(piece)
+
+    def assemble(self, blocks, labels, stamp=b""):
+        """document.xml cho 1 mã đề: các khối theo thứ tự mới, labels = {id(khối): nhãn mới},
+        stamp = bytes (đã escape XML) điền vào chỗ placeholder"""
+        out = [self.prefix]
+        for block in blocks: self._extend(out, block, labels, stamp)
+        out.append(self.trailer)
+        return b"".join(out)
+
+    def assemble_chunks(self, blocks, labels, stamp=b"", counts=None, chunk_bytes=CHUNK_BYTES):
+        """Như assemble nhưng cắt thành các đoạn ở ranh giới khối: trả về (các đoạn bytes, số khối mỗi đoạn).
+        counts: số khối mỗi đoạn (cắt giống lần trước); không có thì cắt khi đoạn đạt chunk_bytes."""
+        chunks = []; block_counts = []; out = [self.prefix]; size = len(self.prefix); start = 0
+        targets = iter(counts or ())
+        target = next(targets, None)
+        for i, block in enumerate(blocks):
+            mark = len(out)
+            self._extend(out, block, labels, stamp)
+            if counts is None: size += sum(len(piece) for piece in out[mark:])
+            if (i + 1 - start == target) if counts is not None else size >= chunk_bytes:
+                chunks.append(b"".join(out)); block_counts.append(i + 1 - start)
+                out = []; size = 0; start = i + 1; target = next(targets, None)
+        out.append(self.trailer)
+        if len(out) > 1 or not chunks: chunks.append(b"".join(out)); block_counts.append(len(blocks) - start)
+        else: chunks[-1] += self.trailer
+        return chunks, block_counts
@@ -0,0 +1,69 @@
+"""Định dạng đánh dấu đáp án kế thừa từ word/styles.xml (w:rStyle, w:pStyle, w:basedOn).
+
+Mỗi thuộc tính đánh dấu là 1 bit; mỗi kiểu lưu 2 mặt nạ: known (thuộc tính được khai báo trong
+chuỗi basedOn) và on (thuộc tính đang đánh dấu). Định dạng trực tiếp của run ghi đè kiểu ký tự,
+kiểu ký tự ghi đè kiểu đoạn.
+"""
+from xml.dom import minidom
+
+from .word import W_NS, MARK_ATTRS, DEFAULT_BACKEND, _is_minidom, _local_name, element_children, etree
+
+MARK_UNDERLINE = 1
+MARK_COLOR = 2
+MARK_HIGHLIGHT = 4
+MARK_SHADING = 8
+MARK_BITS = {"u": MARK_UNDERLINE, "color": MARK_COLOR, "highlight": MARK_HIGHLIGHT, "shd": MARK_SHADING}
+
+def w_attr(el, name):
+    if _is_minidom(el): return el.getAttributeNS(W_NS, name)
+    return el.get(f"{{{W_NS}}}{name}") or ""
+
+def mark_bit(el, name):
+    """(bit của thuộc tính, bit nếu giá trị là đánh dấu) cho 1 thẻ u/color/highlight/shd"""
+    attr, unmarked = MARK_ATTRS[name]
+    val = w_attr(el, attr)
+    return MARK_BITS[name], (MARK_BITS[name] if val and val not in unmarked else 0)
+
+def resolve_marks(direct, char_style=(0, 0), para_style=(0, 0)):
+    """Mặt nạ đánh dấu cuối cùng của 1 run từ các cặp (known, on): trực tiếp > kiểu ký tự > kiểu đoạn"""
+    known, on = direct
+    on |= char_style[1] & ~known; known |= char_style[0]
+    on |= para_style[1] & ~known
+    return on
+
+class StyleMarks:
+    """Bảng styleId -> (known, on) đã gộp chuỗi basedOn; rỗng nếu đề không có word/styles.xml"""
+
+    def __init__(self, styles_xml=None, backend=DEFAULT_BACKEND):
+        self._own = {}; self._based_on = {}; self._resolved = {}
+        if not styles_xml: return
+        if backend == "lxml": root = etree.fromstring(styles_xml, etree.XMLParser(huge_tree=True))
+        else: root = minidom.parseString(styles_xml).documentElement
+        for style in element_children(root):
+            if _local_name(style) != "style": continue
+            style_id = w_attr(style, "styleId")
+            known = on = 0
+            for child in element_children(style):
+                name = _local_name(child)
+                if name == "basedOn": self._based_on[style_id] = w_attr(child, "val")
+                elif name == "rPr":
+                    for prop in element_children(child):
+                        prop_name = _local_name(prop)
+                        if prop_name not in MARK_BITS: continue
+                        bit, marked = mark_bit(prop, prop_name)
+                        known |= bit; on |= marked
+            self._own[style_id] = (known, on)
+
+    def __bool__(self):
+        return any(on for _, on in self._own.values())
+
+    def get(self, style_id):
+        """(known, on) của kiểu, đã kế thừa basedOn; (0, 0) nếu không có kiểu"""
+        if not style_id: return (0, 0)
+        if style_id in self._resolved: return self._resolved[style_id]
+        self._resolved[style_id] = (0, 0)   # chặn vòng lặp basedOn
+        known, on = self._own.get(style_id, (0, 0))
+        parent_known, parent_on = self.get(self._based_on.get(style_id))
+        result = (known | parent_known, on | (parent_on & ~known))
+        self._resolved[style_id] = result
+        return result
@@ -0,0 +1,172 @@
+"""Sinh đề .docx giả lập có cấu trúc PHẦN 1-4 để đo hiệu năng và kiểm tra kết quả không đổi.
+
+Đề sinh ra giống đề thật: nhãn "Câu n." / "A." bị tách run, đáp án đánh dấu bằng gạch chân, màu đỏ
+hoặc kiểu ký tự trong styles.xml, có bảng, công thức OMML và ảnh PNG (nhúng qua quan hệ rId).
+Cùng tham số + cùng seed -> cùng file.
+"""
+import io
+import random
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from .word import W_NS
+
+M_NS = "http://schemas.openxmlformats.org/officeDocument/2006/math"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+WP_NS = "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+PIC_NS = "http://schemas.openxmlformats.org/drawingml/2006/picture"
+REL_IMAGE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+REL_STYLES = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+
+ANSWER_STYLE = "DapAn"      # kiểu ký tự màu đỏ dùng để đánh dấu một số đáp án
+
+WORDS = ("hàm số", "đồ thị", "giá trị", "phương trình", "tập nghiệm", "khoảng", "đạo hàm", "tích phân",
+         "xác suất", "vectơ", "mặt phẳng", "đường thẳng", "cấp số", "logarit", "thể tích", "diện tích")
+
+def png_bytes(size, rng):
+    """Ảnh PNG hợp lệ (điểm ảnh ngẫu nhiên, gần như không nén được) dung lượng xấp xỉ size byte"""
+    side = max(1, int((size / 3) ** 0.5))
+    raw = b"".join(b"\x00" + rng.randbytes(side * 3) for _ in range(side))
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    header = struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
+
+class _Builder:
+    def __init__(self, rng, fragment):
+        self.rng = rng; self.fragment = fragment
+        self.body = []; self.images = []
+
+    def run(self, text, marked=None):
+        """1 run; marked: None, "u" (gạch chân), "red" (màu đỏ) hoặc "style" (kiểu ký tự DapAn)"""
+        props = {"u": '<w:u w:val="single"/>', "red": '<w:color w:val="FF0000"/>',
+                 "style": f'<w:rStyle w:val="{ANSWER_STYLE}"/>'}.get(marked, "")
+        rsid = f' w:rsidR="00{self.rng.randrange(1 << 24):06X}"' if self.fragment > 1 else ""
+        return (f'<w:r{rsid}><w:rPr><w:rFonts w:ascii="Times New Roman" w:hAnsi="Times New Roman"/>{props}'
+                f'<w:sz w:val="24"/></w:rPr><w:t xml:space="preserve">{escape(text)}</w:t></w:r>')
+
+    def runs(self, text, marked=None):
+        """Chia text thành nhiều run (mô phỏng đề bị Word cắt vụn run khi soạn sửa nhiều lần)"""
+        if self.fragment <= 1 or len(text) < 2: return self.run(text, marked)
+        cuts = sorted(self.rng.sample(range(1, len(text)), min(self.fragment, len(text)) - 1))
+        return "".join(self.run(text[a:b], marked) for a, b in zip([0] + cuts, cuts + [len(text)]))
+
+    def paragraph(self, *parts):
+        self.body.append('<w:p><w:pPr><w:jc w:val="both"/></w:pPr>' + "".join(parts) + '</w:p>')
+
+    def sentence(self, n_words=8):
+        return " ".join(self.rng.choice(WORDS) for _ in range(n_words))
+
+    def equation(self):
+        a, b = self.rng.randrange(2, 9), self.rng.randrange(1, 9)
+        return (f'<m:oMath><m:sSup><m:e><m:r><m:t>x</m:t></m:r></m:e><m:sup><m:r><m:t>{a}</m:t></m:r></m:sup></m:sSup>'
+                f'<m:r><m:t>+{b}x</m:t></m:r></m:oMath>')
+
+    def image(self, size):
+        rel_id = f"rIdImg{len(self.images) + 1}"
+        name = f"image{len(self.images) + 1}.png"
+        self.images.append((rel_id, name, png_bytes(size, self.rng)))
+        n = len(self.images); emu = 1800000
+        return (f'<w:r><w:drawing><wp:inline><wp:extent cx="{emu}" cy="{emu}"/><wp:docPr id="{n}" name="Picture {n}"/>'
+                f'<a:graphic><a:graphicData uri="{PIC_NS}"><pic:pic><pic:nvPicPr><pic:cNvPr id="{n}" name="{name}"/>'
+                f'<pic:cNvPicPr/></pic:nvPicPr><pic:blipFill><a:blip r:embed="{rel_id}"/></pic:blipFill>'
+                f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{emu}" cy="{emu}"/></a:xfrm></pic:spPr>'
+                f'</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r>')
+
+    def table(self, rows=3, cols=3):
+        cells = lambda r: "".join(f'<w:tc><w:tcPr><w:tcW w:w="2000" w:type="dxa"/></w:tcPr><w:p>{self.run(str(r * cols + c))}</w:p></w:tc>'
+                                  for c in range(cols))
+        self.body.append('<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/></w:tblPr>'
+                         + "".join(f"<w:tr>{cells(r)}</w:tr>" for r in range(rows)) + '</w:tbl>')
+
+    def question_head(self, number, extra=""):
+        # 1/3 số câu có nhãn bị tách run: "Câu " + "12" + "."
+        if self.rng.random() < 1 / 3: label = self.run("Câu ") + self.run(str(number)) + self.run(".")
+        else: label = self.run(f"Câu {number}.")
+        self.paragraph(label, self.runs(" " + self.sentence()), extra)
+
+    def mark(self):
+        return self.rng.choice(("u", "red", "style"))
+
+def build_exam(mcq=12, tf=4, short=6, essay=1, fragment=1, tables=1, equations=4, images=(), seed=0):
+    """Bytes của 1 đề .docx giả lập.
+
+    mcq/tf/short/essay: số câu PHẦN 1-4; fragment: số run mỗi đoạn văn bản bị chia ra;
+    tables: số bảng chèn vào các câu PHẦN 1; equations: số câu có công thức OMML;
+    images: dung lượng (byte) từng ảnh PNG, chèn lần lượt vào các câu.
+    """
+    rng = random.Random(seed); b = _Builder(rng, fragment)
+    total = mcq + tf + short + essay
+    with_equation = set(rng.sample(range(total), min(equations, total)))
+    with_image = dict(zip(rng.sample(range(total), min(len(images), total)), images))
+    with_table = set(rng.sample(range(mcq), min(tables, mcq)))
+    serial = iter(range(total))
+    def extras():
+        k = next(serial)
+        return (b.equation() if k in with_equation else "") + (b.image(with_image[k]) if k in with_image else "")
+
+    b.paragraph(b.run("SỞ GD&ĐT - ĐỀ KIỂM TRA HỌC KỲ (ĐỀ GIẢ LẬP)"))
+    b.paragraph(b.run("PHẦN 1. Câu trắc nghiệm nhiều phương án lựa chọn"))
+    b.paragraph(b.run(f"Thí sinh trả lời từ câu 1 đến câu {mcq}. Mỗi câu hỏi thí sinh chỉ chọn một phương án."))
+    for q in range(1, mcq + 1):
+        b.question_head(q, extras())
+        if q - 1 in with_table: b.table()
+        correct = rng.randrange(4)
+        for k, letter in enumerate("ABCD"):
+            marked = b.mark() if k == correct else None
+            if rng.random() < 0.25: label = b.run(letter) + b.run(".")
+            else: label = b.run(f"{letter}.")
+            b.paragraph(label, b.runs(" " + b.sentence(4), marked))
+    b.paragraph(b.run("PHẦN 2. Câu trắc nghiệm đúng sai"))
+    for q in range(1, tf + 1):
+        b.question_head(q, extras())
+        for letter in "abcd":
+            marked = b.mark() if rng.random() < 0.5 else None
+            b.paragraph(b.run(f"{letter})"), b.runs(" " + b.sentence(6), marked))
+    b.paragraph(b.run("PHẦN 3. Câu trắc nghiệm trả lời ngắn"))
+    for q in range(1, short + 1):
+        b.question_head(q, extras())
+        b.paragraph(b.run("Đáp số: "), b.run(f"{rng.randrange(1, 100)},{rng.randrange(10)}", b.mark()))
+    b.paragraph(b.run("PHẦN 4. Tự luận"))
+    for q in range(1, essay + 1):
+        b.question_head(q, extras())
+        b.paragraph(b.runs(b.sentence(20)))
+    b.table(rows=2, cols=4)
+
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<w:document xmlns:w="{W_NS}" xmlns:m="{M_NS}" xmlns:r="{R_NS}" xmlns:wp="{WP_NS}" '
+                f'xmlns:a="{A_NS}" xmlns:pic="{PIC_NS}"><w:body>' + "".join(b.body)
+                + '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/><w:pgMar w:top="850" w:right="850" w:bottom="850" '
+                  'w:left="1134" w:header="567" w:footer="567" w:gutter="0"/></w:sectPr></w:body></w:document>')
+    styles = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:styles xmlns:w="{W_NS}">'
+              '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>'
+              f'<w:style w:type="character" w:styleId="{ANSWER_STYLE}"><w:name w:val="Dap An"/>'
+              '<w:rPr><w:color w:val="FF0000"/></w:rPr></w:style></w:styles>')
+    content_types = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                     '<Default Extension="xml" ContentType="application/xml"/><Default Extension="png" ContentType="image/png"/>'
+                     '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                     '<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+                     '</Types>')
+    package_rels = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+                    'Target="word/document.xml"/></Relationships>')
+    document_rels = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                     f'<Relationship Id="rIdStyles" Type="{REL_STYLES}" Target="styles.xml"/>'
+                     + "".join(f'<Relationship Id="{rel_id}" Type="{REL_IMAGE}" Target="media/{name}"/>'
+                               for rel_id, name, _ in b.images) + '</Relationships>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", content_types)
+        z.writestr("_rels/.rels", package_rels)
+        z.writestr("word/document.xml", document)
+        z.writestr("word/styles.xml", styles)
+        z.writestr("word/_rels/document.xml.rels", document_rels)
+        for _, name, data in b.images: z.writestr(f"word/media/{name}", data)
+    return buffer.getvalue()
@@ -0,0 +1,302 @@
+"""Đề gốc parse 1 lần (ExamTemplate) và các bước trộn / đổi nhãn cho từng mã đề."""
+import io
+import re
+import time
+import random
+import zipfile
+from array import array
+from xml.sax.saxutils import escape
+
+from .word import (DEFAULT_BACKEND, parse_document, parse_part, serialize_document, find_label_anchor,
+                   iter_paragraphs, merge_split_text)
+from .segment import (BlockIndex, BLOCK_MCQ_OPTION, BLOCK_TF_OPTION, PART_MCQ, PART_TF, ANSWER_KEYS,
+                      segment_blocks, iter_body_blocks, analyze_question)
+from .metrics import NULL_TIMER, JobMetrics, StageTimer, peak_rss_mb, template_counts
+from .splice import DocumentSplicer
+from .styles import StyleMarks
+from .compression import compression_policy
+from .ziputil import deflate_chunks, deflated_info, iter_raw_members, recompress_member, write_raw_member
+
+def shuffle_array(arr, rng):
+    out = arr.copy()
+    for i in range(len(out) - 1, 0, -1):
+        j = rng.randint(0, i)
+        out[i], out[j] = out[j], out[i]
+    return out
+
+def option_count(slot):
+    """Số phương án được hoán vị của câu (0: giữ nguyên thứ tự)"""
+    if slot["kind"] in ("mcq", "tf") and len(slot["options"]) >= 2: return len(slot["options"])
+    return 0
+
+def apply_mcq_order(slot, order):
+    question_blocks = slot["blocks"]; indices = slot["options"]
+    if not order: return question_blocks, None
+    correct_char = None
+    if slot["marked"] != -1:
+        new_pos = order.index(slot["marked"])
+        letters = ["A", "B", "C", "D"]
+        if new_pos < len(letters): correct_char = letters[new_pos]
+    shuffled_options = [question_blocks[indices[k]] for k in order]
+    min_idx = min(indices); max_idx = max(indices)
+    return question_blocks[:min_idx] + shuffled_options + question_blocks[max_idx + 1:], correct_char
+
+def apply_tf_order(slot, order):
+    question_blocks = slot["blocks"]; indices = slot["options"]
+    if not order: return question_blocks, ""
+    final_ordered_items = [(question_blocks[indices[k]], slot["statuses"][k]) for k in order]
+    if slot["d"]: final_ordered_items.append((question_blocks[slot["d"][0]], slot["d"][1]))
+    ans_str = "-".join(status for _, status in final_ordered_items)
+    new_blocks = question_blocks.copy()
+    for i, target_idx in enumerate(slot["targets"]):
+        if i < len(final_ordered_items):
+            new_blocks[target_idx] = final_ordered_items[i][0]
+    return new_blocks, ans_str
+
+def apply_option_order(slot, order):
+    """Xếp lại phương án của 1 câu theo order; trả về (các khối, đáp án của câu)"""
+    if slot["kind"] == "mcq": return apply_mcq_order(slot, order)
+    if slot["kind"] == "tf": return apply_tf_order(slot, order)
+    if slot["kind"] == "short": return slot["blocks"], slot["answer"]
+    return slot["blocks"], None
+
+def relabel_mcq_options(question_blocks, index, labels):
+    letters = ["A", "B", "C", "D"]
+    option_blocks = [block for block in question_blocks if index.is_kind(block, BLOCK_MCQ_OPTION)]
+    for idx, block in enumerate(option_blocks):
+        letter = letters[idx] if idx < len(letters) else letters[-1]
+        labels[id(block)] = f"{letter}."
+
+def relabel_tf_options(question_blocks, index, labels):
+    letters = ["a", "b", "c", "d"]
+    option_blocks = [block for block in question_blocks if index.is_kind(block, BLOCK_TF_OPTION)]
+    for idx, block in enumerate(option_blocks):
+        letter = letters[idx] if idx < len(letters) else letters[-1]
+        labels[id(block)] = f"{letter})"
+
+def relabel_questions(questions, labels, start_index=1):
+    for i, q_blocks in enumerate(questions):
+        if not q_blocks: continue
+        labels[id(q_blocks[0])] = f"Câu {start_index + i}."
+
+# ==================== TEMPLATE: PARSE 1 LẦN, TRỘN N MÃ ĐỀ ====================
+
+CODE_PLACEHOLDER = "{{MA_DE}}"      # chỗ điền mã đề trong đầu trang, chân trang, thân đề
+RE_STAMPED_PART = re.compile(r'^word/(header|footer)\d*\.xml$')
+RE_TAG = re.compile(rb'<[^>]*>')
+DOCUMENT_PART = "word/document.xml"
+
+def split_stamped_part(part_xml, placeholder, backend=DEFAULT_BACKEND):
+    """Các mảnh byte của 1 part XML cắt tại placeholder (mã đề = nối các mảnh); None nếu part không có.
+    Chỉ parse DOM khi placeholder có thể bị Word tách ra nhiều run."""
+    mark = escape(placeholder).encode("utf-8")
+    in_text = RE_TAG.sub(b"", part_xml).count(mark)
+    if not in_text: return None
+    if part_xml.count(mark) != in_text:
+        root = parse_part(part_xml, backend)
+        if not sum(merge_split_text(p, placeholder) for p in iter_paragraphs(root)): return None
+        part_xml = serialize_document(root)
+    return part_xml.split(mark)
+
+class ExamTemplate:
+    """Đề gốc được giải nén, parse và phân đoạn (phần, phần dẫn, câu hỏi, phương án) đúng 1 lần.
+    Mỗi mã đề sau đó chỉ tốn chi phí hoán vị + ghép byte (DocumentSplicer) + ghi file.
+
+    Vị trí nhãn câu/phương án được ghi vào bảng self.anchors 1 lần (sau khi trạng thái đúng/sai đã được đọc);
+    mỗi mã đề chỉ ghi chuỗi nhãn mới cho từng khối, DocumentSplicer chèn vào đúng chỗ.
+    """
+
+    def __init__(self, file_bytes, shuffle_mode="auto", backend=DEFAULT_BACKEND, timer=NULL_TIMER,
+                 placeholder=CODE_PLACEHOLDER, compression=None, style_labels=True):
+        """timer: StageTimer nhận thời gian từng bước (unzip, parse, segment, serialize, shuffle, relabel, rezip).
+        placeholder: chuỗi được thay bằng mã đề trong header*/footer*.xml và thân đề (None: không điền).
+        compression: CompressionPolicy hoặc tên mức nén ("fast", "balanced", "small") của các file .docx ghi ra.
+        style_labels: nhãn câu/phương án được tô xanh đậm (False: giữ định dạng gốc - màu xanh cũng được tính
+        là đánh dấu đáp án nếu file ghi ra được đọc lại làm đề gốc)."""
+        self.shuffle_mode = shuffle_mode; self.timer = timer; self.placeholder = placeholder
+        self.compression = policy = compression_policy(compression)
+        with timer.stage("unzip"):
+            stamped = {}
+            with zipfile.ZipFile(io.BytesIO(file_bytes), 'r') as zin:
+                doc_xml = zin.read(DOCUMENT_PART)
+                styles_xml = zin.read("word/styles.xml") if "word/styles.xml" in zin.NameToInfo else None
+                if placeholder:
+                    for name in zin.NameToInfo:
+                        if RE_STAMPED_PART.match(name):
+                            pieces = split_stamped_part(zin.read(name), placeholder, backend)
+                            if pieces: stamped[name] = pieces
+            # Member không đổi: giữ nguyên luồng đã nén (memoryview, không sao chép) - chỉ đổi kiểu nén 1 lần
+            # khi khác chính sách (vd ảnh đã deflate -> STORED); header/footer có placeholder: danh sách mảnh byte
+            self.members = []
+            for item, raw in iter_raw_members(file_bytes):
+                if item.filename == DOCUMENT_PART: self.members.append((item, None)); continue
+                if item.filename in stamped: self.members.append((item, stamped[item.filename])); continue
+                self.members.append(recompress_member(item, raw, policy.compress_type(item.filename), policy.xml_level))
+            self.document_info = next(item for item, data in self.members if data is None)
+        with timer.stage("parse"):
+            self.root, self.body = parse_document(doc_xml, backend)
+            styles = StyleMarks(styles_xml, backend)
+        with timer.stage("segment"):
+            self.other_nodes = []
+            self.index = BlockIndex(styles=styles)
+            self.outline = segment_blocks(iter_body_blocks(self.body, self.other_nodes), self.index, shuffle_mode)
+            self.pieces = self._pieces()
+            if placeholder:
+                for block, text in zip(self.index.blocks, self.index.texts):
+                    if placeholder in text:
+                        for paragraph in iter_paragraphs(block): merge_split_text(paragraph, placeholder)
+        with timer.stage("relabel"):
+            self.anchors = self._label_anchors()
+        with timer.stage("serialize"):
+            self.splicer = DocumentSplicer(self.root, self.body, self.index.blocks, self.other_nodes, self.anchors,
+                                           placeholder, style_labels)
+
+    def _label_anchors(self):
+        """Bảng nhãn {id(khối): LabelAnchor} của mọi khối sẽ được đánh số lại, tìm trong 1 lượt"""
+        anchors = {}
+        def add(block, kind):
+            anchor = find_label_anchor(block, kind)
+            if anchor is not None: anchors[id(block)] = anchor
+        for kind, piece in self.pieces:
+            if kind != "part": continue
+            for slot in piece["questions"]:
+                if slot["blocks"]: add(slot["blocks"][0], "question")
+                for block in slot["blocks"]:
+                    if piece["type"] == PART_MCQ and self.index.is_kind(block, BLOCK_MCQ_OPTION): add(block, "mcq")
+                    elif piece["type"] == PART_TF and self.index.is_kind(block, BLOCK_TF_OPTION): add(block, "tf")
+        return anchors
+
+    def _pieces(self):
+        """Chia đề thành các khối giữ nguyên ("blocks") và các phần cần trộn ("part")"""
+        blocks = self.index.blocks; pieces = []
+        for part in self.outline.parts:
+            if part.header is not None: pieces.append(("blocks", [blocks[part.header]]))
+            if part.type not in ANSWER_KEYS:
+                pieces.append(("blocks", [blocks[pos] for pos in part.blocks])); continue
+            answer_key = None if self.shuffle_mode == "tf" else ANSWER_KEYS[part.type]
+            pieces.append(("part", {"type": part.type, "key": answer_key,
+                                    "intro": [blocks[pos] for pos in part.intro],
+                                    "questions": [analyze_question(q, part.type, self.index) for q in part.questions]}))
+        return pieces
+
+    def plan_version(self, rng):
+        """Hoán vị của 1 mã đề dưới dạng mảng số nguyên gọn (array 'H'). Với mỗi phần cần trộn, lần lượt:
+        thứ tự phương án của từng câu có >= 2 phương án, rồi thứ tự các câu."""
+        plan = array('H')
+        for kind, piece in self.pieces:
+            if kind != "part": continue
+            for slot in piece["questions"]:
+                n = option_count(slot)
+                if n: plan.extend(shuffle_array(list(range(n)), rng))
+            plan.extend(shuffle_array(list(range(len(piece["questions"]))), rng))
+        return plan
+
+    def _apply_part(self, part, plan, cursor, start_number, labels):
+        questions_data = []
+        for slot in part["questions"]:
+            n = option_count(slot)
+            questions_data.append(apply_option_order(slot, list(plan[cursor:cursor + n]))); cursor += n
+        question_order = plan[cursor:cursor + len(questions_data)]; cursor += len(questions_data)
+        shuffled_data = [questions_data[k] for k in question_order]
+        final_questions_blocks = [x[0] for x in shuffled_data]
+        final_answers_list = [x[1] for x in shuffled_data]
+        with self.timer.stage("relabel"):
+            relabel_questions(final_questions_blocks, labels, start_number)
+            if part["type"] == PART_MCQ:
+                for q in final_questions_blocks: relabel_mcq_options(q, self.index, labels)
+            elif part["type"] == PART_TF:
+                for q in final_questions_blocks: relabel_tf_options(q, self.index, labels)
+        result = part["intro"].copy()
+        for q in final_questions_blocks: result.extend(q)
+        part_answers = {}
+        for i, ans in enumerate(final_answers_list):
+            if ans: part_answers[start_number + i] = ans
+        return result, start_number + len(final_questions_blocks), part_answers, cursor
+
+    def _stamp(self, code):
+        """Bytes điền vào placeholder: mã đề, hoặc giữ nguyên placeholder khi không có mã đề"""
+        if not self.placeholder: return b""
+        return escape(str(code) if code is not None else self.placeholder).encode("utf-8")
+
+    def arrange_version(self, plan):
+        """Các khối theo thứ tự mới, nhãn mới {id(khối): nhãn} và đáp án của 1 mã đề (chưa ghép XML)"""
+        new_blocks = []; labels = {}; all_answers = {}; curr_num = 1; cursor = 0
+        for kind, piece in self.pieces:
+            if kind == "blocks":
+                new_blocks.extend(piece); continue
+            part_blocks, next_num, part_answers, cursor = self._apply_part(piece, plan, cursor, curr_num, labels)
+            new_blocks.extend(part_blocks)
+            key = piece["key"]
+            if key in ("P2", "P3") and key not in all_answers:
+                all_answers[f"{key}_Start"] = (curr_num - len(part_answers)) if part_answers else curr_num
+            if key: all_answers.setdefault(key, {}).update(part_answers)
+            if key in ("P2", "P3"): all_answers[f"{key}_Count"] = len(all_answers[key])
+            curr_num = next_num
+        return new_blocks, labels, all_answers
+
+    def write_version(self, output, plan=None, rng=None, code=None, kept=None, chunks=None, previous=None):
+        """Trộn 1 mã đề theo plan (mặc định: plan_version(rng), rng mặc định là 1 generator mới),
+        ghi thẳng file .docx vào output (đường dẫn hoặc file-like); trả về đáp án.
+        code: mã đề điền vào placeholder ở đầu trang, chân trang và thân đề.
+        kept: {tên member: (ZipInfo, dữ liệu đã nén)} chép nguyên thay cho member của đề (vd từ gói trước).
+        chunks: list nhận bảng [số khối, CRC, cỡ, cỡ nén] các đoạn của document.xml - khi có, document.xml được nén
+        theo từng đoạn độc lập; previous: (bảng đoạn, dữ liệu nén) document.xml cùng mã đề của lần trước -
+        cắt đoạn như lần trước, đoạn không đổi dùng lại bytes đã nén."""
+        timer = self.timer
+        with timer.stage("shuffle"):
+            if plan is None: plan = self.plan_version(rng or random.Random())
+            new_blocks, labels, all_answers = self.arrange_version(plan)
+        stamp = self._stamp(code); document_xml = None
+        reuse_document = kept is not None and DOCUMENT_PART in kept
+        if chunks is None and not reuse_document:
+            with timer.stage("serialize"): document_xml = self.splicer.assemble(new_blocks, labels, stamp)
+        elif not reuse_document:
+            with timer.stage("serialize"):
+                pieces, counts = self.splicer.assemble_chunks(new_blocks, labels, stamp,
+                                                              previous and [entry[0] for entry in previous[0]])
+            with timer.stage("rezip"):
+                old = []; offset = 0
+                for _, crc, size, packed in (previous[0] if previous else ()):
+                    old.append((crc, size, previous[1][offset:offset + packed])); offset += packed
+                data, table, crc = deflate_chunks(pieces, self.compression.xml_level, previous=old)
+            kept = dict(kept or {})
+            kept[DOCUMENT_PART] = (deflated_info(self.document_info, data, table, crc), b"".join(data))
+            chunks[:] = [[n, c, size, len(d)] for n, (c, size), d in zip(counts, table, data)]
+        with timer.stage("rezip"): self._write_docx(document_xml, output, stamp, kept)
+        return all_answers
+
+    def build_version(self, plan=None, rng=None, code=None, kept=None, chunks=None, previous=None):
+        """Trộn 1 mã đề: trả về (bytes file .docx, đáp án)"""
+        output_buffer = io.BytesIO()
+        answers = self.write_version(output_buffer, plan, rng, code, kept, chunks, previous)
+        return output_buffer.getvalue(), answers
+
+    def _write_docx(self, document_xml, output, stamp=b"", kept=None):
+        policy = self.compression
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zout:
+            for item, data in self.members:
+                if kept and item.filename in kept: write_raw_member(zout, *kept[item.filename], policy.xml_level)
+                elif data is None: zout.writestr(item, document_xml, policy.compress_type(item.filename), policy.xml_level)
+                elif type(data) is list:
+                    zout.writestr(item, stamp.join(data), policy.compress_type(item.filename), policy.xml_level)
+                else: write_raw_member(zout, item, data, policy.xml_level)
+
+def shuffle_docx(file_bytes, shuffle_mode="auto", backend=DEFAULT_BACKEND, seed=None, metrics=None, compression=None):
+    """Trộn 1 đề: trả về (bytes .docx, đáp án). metrics: JobMetrics nhận số liệu; luôn ghi log JSON.
+    compression: mức nén của file .docx (tronde.compression)."""
+    if metrics is None: metrics = JobMetrics()
+    started = time.perf_counter(); timer = StageTimer()
+    metrics.job = "shuffle_docx"; metrics.bytes_in = len(file_bytes); metrics.versions = 1
+    try:
+        template = ExamTemplate(file_bytes, shuffle_mode, backend, timer=timer, compression=compression)
+        metrics.set_counts(template_counts(template))
+        docx_bytes, answers = template.build_version(rng=random.Random(seed))
+        metrics.bytes_out = len(docx_bytes)
+        return docx_bytes, answers
+    except Exception as e:
+        metrics.error = str(e) or type(e).__name__
+        raise
+    finally:
+        metrics.add_stages(timer.stages); metrics.add_peak(peak_rss_mb())
+        metrics.seconds = time.perf_counter() - started
+        metrics.log()
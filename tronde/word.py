@@ -0,0 +1,286 @@
+"""Lõi xử lý XML của Word: đọc text, nhận diện đáp án được đánh dấu, đổi nhãn câu/phương án.
+
+Dùng lxml (XPath biên dịch sẵn) nếu có, nếu không thì dùng xml.dom.minidom.
+"""
+import re
+from dataclasses import dataclass, field
+from xml.dom import minidom
+try:
+    from lxml import etree
+except ImportError:  # Không có lxml -> dùng minidom
+    etree = None
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+NSMAP = {"w": W_NS}
+
+# --- BACKEND XML: lxml (nhanh, XPath biên dịch sẵn) hoặc minidom (dự phòng) ---
+if etree is not None:
+    DEFAULT_BACKEND = "lxml"
+    _XP_T = etree.XPath(".//w:t", namespaces=NSMAP)
+    _XP_R = etree.XPath(".//w:r", namespaces=NSMAP)
+    _XP_RPR = etree.XPath(".//w:rPr", namespaces=NSMAP)
+    _XP_COLOR = etree.XPath(".//w:color", namespaces=NSMAP)
+    _XP_B = etree.XPath(".//w:b", namespaces=NSMAP)
+    _XP_BODY = etree.XPath("//w:body", namespaces=NSMAP)
+    _XP_MARKED = etree.XPath(
+        "boolean(.//w:u[@w:val != '' and @w:val != 'none']"
+        " | .//w:color[@w:val != '' and @w:val != 'auto' and @w:val != '000000']"
+        " | .//w:highlight[@w:val != '' and @w:val != 'none']"
+        " | .//w:shd[@w:fill != '' and @w:fill != 'auto' and @w:fill != 'FFFFFF' and @w:fill != '000000'])",
+        namespaces=NSMAP)
+else:
+    DEFAULT_BACKEND = "minidom"
+
+def _is_minidom(node):
+    return isinstance(node, minidom.Node)
+
+def _local_name(node):
+    if _is_minidom(node): return node.localName
+    return etree.QName(node).localname
+
+def _text_nodes(node):
+    if _is_minidom(node): return node.getElementsByTagNameNS(W_NS, "t")
+    return _XP_T(node)
+
+def _node_value(t):
+    if _is_minidom(t): return t.firstChild.nodeValue if t.firstChild else None
+    return t.text
+
+def _set_node_value(t, value):
+    if _is_minidom(t): t.firstChild.nodeValue = value
+    else: t.text = value
+
+def _parent_run(t):
+    run = t.parentNode if _is_minidom(t) else t.getparent()
+    if run is not None and _local_name(run) == "r": return run
+    return None
+
+def parse_document(doc_xml, backend=DEFAULT_BACKEND):
+    """Trả về (root, body) của word/document.xml theo backend đã chọn"""
+    if backend == "lxml":
+        root = etree.fromstring(doc_xml, etree.XMLParser(huge_tree=True))
+        return root, _XP_BODY(root)[0]
+    dom = minidom.parseString(doc_xml.decode('utf-8'))
+    return dom, dom.getElementsByTagNameNS(W_NS, "body")[0]
+
+def parse_part(part_xml, backend=DEFAULT_BACKEND):
+    """Gốc của 1 part XML bất kỳ (header, footer...) theo backend; serialize lại bằng serialize_document"""
+    if backend == "lxml": return etree.fromstring(part_xml, etree.XMLParser(huge_tree=True))
+    return minidom.parseString(part_xml.decode('utf-8'))
+
+def iter_paragraphs(node):
+    """Các đoạn w:p trong node (kể cả chính node nếu là w:p), theo thứ tự tài liệu"""
+    if _is_minidom(node):
+        if node.nodeType == node.ELEMENT_NODE and node.namespaceURI == W_NS and node.localName == "p": yield node
+        yield from node.getElementsByTagNameNS(W_NS, "p")
+    else:
+        yield from node.iter(f"{{{W_NS}}}p")
+
+def merge_split_text(paragraph, text):
+    """Word hay tách 1 chuỗi (vd "{{MA_DE}}") ra nhiều run; dồn mỗi lần xuất hiện về nút w:t chứa ký tự đầu.
+    Trả về số lần xuất hiện trong đoạn."""
+    t_nodes = [t for t in _text_nodes(paragraph) if _node_value(t)]
+    found = 0; start = 0
+    while True:
+        values = [_node_value(t) for t in t_nodes]
+        joined = "".join(values)
+        start = joined.find(text, start)
+        if start == -1: return found
+        found += 1; end = start + len(text); offset = 0
+        for t, value in zip(t_nodes, values):
+            node_start, offset = offset, offset + len(value)
+            if offset <= start or node_start >= end: continue
+            if node_start <= start:
+                if offset >= end: break                 # nằm gọn trong 1 nút
+                _set_node_value(t, value[:start - node_start] + text)
+            else:
+                _set_node_value(t, value[max(0, end - node_start):])
+        start = end
+
+def element_children(node):
+    if _is_minidom(node): return [c for c in node.childNodes if c.nodeType == c.ELEMENT_NODE]
+    return [c for c in node if isinstance(c.tag, str)]
+
+def replace_children(parent, children):
+    """Xóa toàn bộ con (kể cả khoảng trắng) rồi gắn lại theo thứ tự mới"""
+    if _is_minidom(parent):
+        while parent.firstChild: parent.removeChild(parent.firstChild)
+        for child in children: parent.appendChild(child)
+        return
+    for child in list(parent): parent.remove(child)
+    parent.text = None
+    for child in children:
+        child.tail = None
+        parent.append(child)
+
+def create_comment(root, text):
+    if _is_minidom(root): return root.createComment(text)
+    return etree.Comment(text)
+
+def serialize_document(root):
+    if _is_minidom(root): return root.toxml().encode('utf-8')
+    tree = root.getroottree()
+    return etree.tostring(tree, xml_declaration=True, encoding="UTF-8", standalone=tree.docinfo.standalone)
+
+def get_text(block):
+    texts = []
+    for t in _text_nodes(block):
+        value = _node_value(t)
+        if value: texts.append(value)
+    return "".join(texts).strip()
+
+# Thẻ định dạng đánh dấu đáp án đúng: tên thẻ -> (thuộc tính, các giá trị KHÔNG tính là đánh dấu)
+MARK_ATTRS = {
+    "u": ("val", ("none",)),
+    "color": ("val", ("auto", "000000")),
+    "highlight": ("val", ("none",)),
+    "shd": ("fill", ("auto", "FFFFFF", "000000")),
+}
+
+def is_marked_correct(node):
+    """Kiểm tra gạch chân, màu đỏ, highlight"""
+    if not _is_minidom(node): return _XP_MARKED(node)
+    for tag, (attr, unmarked) in MARK_ATTRS.items():
+        for el in node.getElementsByTagNameNS(W_NS, tag):
+            val = el.getAttributeNS(W_NS, attr)
+            if val and val not in unmarked: return True
+    return False
+
+# --- HÀM LỌC ĐÁP ÁN P3: CẮT BỎ CÁC TỪ THỪA ---
+def clean_answer_text(raw_text):
+    """Làm sạch text đáp án đã ghép từ các run được đánh dấu"""
+    full_text = raw_text.strip()
+    
+    # Lọc bỏ "Câu 1.", "Câu 1:", "ĐS:", "Đáp số:", "KQ:"...
+    full_text = re.sub(r'^(Câu\s*\d+[\.\:]\s*)?', '', full_text, flags=re.IGNORECASE)
+    full_text = re.sub(r'^(ĐS|Đáp số|Đáp án|KQ|Kết quả)[\.\:]?\s*', '', full_text, flags=re.IGNORECASE)
+    
+    return full_text.strip()
+
+def extract_highlighted_text(blocks):
+    """Lấy text đáp án và làm sạch (chỉ định dạng trực tiếp; khi trộn đề dùng BlockIndex.answers)"""
+    extracted_text = []
+    for block in blocks:
+        runs = block.getElementsByTagNameNS(W_NS, "r") if _is_minidom(block) else _XP_R(block)
+        for run in runs:
+            if is_marked_correct(run): 
+                for t in _text_nodes(run):
+                    value = _node_value(t)
+                    if value: extracted_text.append(value)
+    return clean_answer_text("".join(extracted_text))
+
+def _style_run_blue_bold_lxml(run):
+    rPr_list = _XP_RPR(run)
+    if rPr_list: rPr = rPr_list[0]
+    else:
+        rPr = run.makeelement(f"{{{W_NS}}}rPr")
+        run.insert(0, rPr)
+    color_list = _XP_COLOR(rPr)
+    if color_list: color_el = color_list[0]
+    else:
+        color_el = etree.SubElement(rPr, f"{{{W_NS}}}color")
+    color_el.set(f"{{{W_NS}}}val", "0000FF")
+    if not _XP_B(rPr): etree.SubElement(rPr, f"{{{W_NS}}}b")
+
+def style_run_blue_bold(run):
+    if not _is_minidom(run): return _style_run_blue_bold_lxml(run)
+    doc = run.ownerDocument
+    rPr_list = run.getElementsByTagNameNS(W_NS, "rPr")
+    if rPr_list: rPr = rPr_list[0]
+    else:
+        rPr = doc.createElementNS(W_NS, "w:rPr")
+        run.insertBefore(rPr, run.firstChild)
+    
+    color_list = rPr.getElementsByTagNameNS(W_NS, "color")
+    if color_list: color_el = color_list[0]
+    else:
+        color_el = doc.createElementNS(W_NS, "w:color")
+        rPr.appendChild(color_el)
+    color_el.setAttributeNS(W_NS, "w:val", "0000FF")
+    
+    b_list = rPr.getElementsByTagNameNS(W_NS, "b")
+    if not b_list:
+        b_el = doc.createElementNS(W_NS, "w:b")
+        rPr.appendChild(b_el)
+
+# --- BẢNG NHÃN: vị trí nhãn câu/phương án được tìm 1 lần, mỗi lần đổi nhãn chỉ ghi giá trị ---
+# Loại nhãn -> (mẫu nhãn ở đầu đoạn, mẫu mảnh dấu/số bị tách sang run sau, luôn dọn mảnh tách?)
+LABEL_RULES = {
+    "mcq": (re.compile(r'^(\s*)([A-D])(\s*[\.\)])?', re.IGNORECASE), re.compile(r'^[\.\)]'), False),
+    "tf": (re.compile(r'^(\s*)([a-d])(\s*[\.\)])?', re.IGNORECASE), re.compile(r'^\)'), False),
+    "question": (re.compile(r'^(\s*)(Câu\s*)(\d+)?(\.)?', re.IGNORECASE), re.compile(r'^[\s0-9\.]*$'), True),
+}
+RE_BLANK = re.compile(r'^\s*$')
+RE_SPLIT_NUMBER = re.compile(r'^\s*(\d+)(\s*\.)?')     # số câu (và dấu chấm) nằm ở các run sau "Câu "
+
+@dataclass
+class LabelAnchor:
+    """Nhãn của 1 đoạn: nút w:t chứa nhãn (lead + nhãn + rest), các mảnh cần sửa và run cần tô xanh đậm"""
+    t: object
+    lead: str
+    rest: str
+    label: str                                   # nhãn gốc đã chuẩn hóa ("Câu 3.", "B.", "c)")
+    fixups: list = field(default_factory=list)   # (nút w:t, giá trị mới)
+    run: object = None
+
+def find_label_anchor(paragraph, kind):
+    """Tìm nhãn loại kind ("question", "mcq", "tf") trong đoạn; None nếu không có"""
+    label_re, fragment_re, always_fix = LABEL_RULES[kind]
+    t_nodes = _text_nodes(paragraph)
+    for i, t in enumerate(t_nodes):
+        txt = _node_value(t)
+        if not txt: continue
+        m = label_re.match(txt)
+        if not m: continue
+        if kind == "question" and not m.group(3):
+            if txt[m.end():].strip(): continue
+            return _split_question_anchor(t, m, [t2 for t2 in t_nodes[i + 1:] if _node_value(t2)])
+        if kind == "question": label = f"Câu {m.group(3)}."
+        elif kind == "mcq": label = m.group(2).upper() + "."
+        else: label = m.group(2).lower() + ")"
+        anchor = LabelAnchor(t, m.group(1) or "", txt[m.end():], label, run=_parent_run(t))
+        if always_fix or not m.group(3):
+            for t2 in t_nodes[i + 1:]:
+                txt2 = _node_value(t2)
+                if not txt2: continue
+                if kind == "question":
+                    if fragment_re.match(txt2) and txt2.strip(): anchor.fixups.append((t2, "")); continue
+                elif fragment_re.match(txt2): anchor.fixups.append((t2, txt2[1:])); break
+                if RE_BLANK.match(txt2): continue
+                break
+        return anchor
+    return None
+
+def _split_question_anchor(t, m, t_nodes):
+    """Nhãn câu bị tách run ("Câu " + "12" + "."): số và dấu chấm ở các nút sau được cắt khỏi nút đó"""
+    rest = "".join(_node_value(t2) for t2 in t_nodes)
+    m2 = RE_SPLIT_NUMBER.match(rest)
+    if not m2: return None
+    anchor = LabelAnchor(t, m.group(1) or "", "", f"Câu {m2.group(1)}.", run=_parent_run(t))
+    consumed = m2.end()
+    for t2 in t_nodes:
+        if consumed <= 0: break
+        value = _node_value(t2)
+        anchor.fixups.append((t2, value[consumed:])); consumed -= len(value)
+    return anchor
+
+def apply_label(anchor, label, style=True):
+    """Ghi nhãn mới vào đúng chỗ; gọi lại nhiều lần vẫn cho cùng kết quả. style: tô xanh đậm run chứa nhãn"""
+    _set_node_value(anchor.t, anchor.lead + label + anchor.rest)
+    for t2, value in anchor.fixups: _set_node_value(t2, value)
+    if style and anchor.run is not None: style_run_blue_bold(anchor.run)
+
+def _update_label(paragraph, kind, label):
+    anchor = find_label_anchor(paragraph, kind)
+    if anchor is None: return None
+    apply_label(anchor, label)
+    return anchor.t
+
+def update_mcq_label(paragraph, new_label):
+    return _update_label(paragraph, "mcq", new_label[0].upper() + ".")
+
+def update_tf_label(paragraph, new_label):
+    return _update_label(paragraph, "tf", new_label[0].lower() + ")")
+
+def update_question_label(paragraph, new_label):
+    return _update_label(paragraph, "question", new_label)
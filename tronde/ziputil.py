@@ -0,0 +1,92 @@
+"""Chép member zip ở dạng đã nén, không giải nén / nén lại; đổi kiểu nén 1 member; nén 1 member theo từng đoạn độc lập.
+
+zipfile không có API công khai để ghi dữ liệu đã nén sẵn: write_raw_member dùng vài thuộc tính nội bộ của
+ZipFile trong CPython (_lock, _writecheck, _didModify, start_dir...), có từ 3.6 tới nay. Thiếu thuộc tính nào
+(bản Python khác, bản vá đổi nội bộ) thì tự chuyển sang giải nén + writestr: chậm hơn nhưng kết quả vẫn đúng.
+"""
+import io
+import bz2
+import sys
+import copy
+import zlib
+import struct
+import zipfile
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")   # local file header của zip (30 byte)
+_RAW_ATTRS = ("_lock", "_writecheck", "_didModify", "_writing", "_seekable", "start_dir", "fp", "filelist",
+              "NameToInfo")
+
+def iter_raw_members(file_bytes):
+    """Trả về (ZipInfo, dữ liệu đã nén) cho từng member, không giải nén"""
+    view = memoryview(file_bytes)
+    with zipfile.ZipFile(io.BytesIO(file_bytes), 'r') as zin:
+        infos = zin.infolist()
+    for info in infos:
+        header = _LOCAL_HEADER.unpack_from(view, info.header_offset)
+        if header[0] != zipfile.stringFileHeader: raise zipfile.BadZipFile(f"Header hỏng: {info.filename}")
+        start = info.header_offset + _LOCAL_HEADER.size + header[9] + header[10]
+        yield info, view[start:start + info.compress_size]
+
+def raw_copy_supported(zout):
+    """zout có đủ nội bộ của zipfile CPython để chép thẳng dữ liệu đã nén không"""
+    return sys.implementation.name == "cpython" and all(hasattr(zout, name) for name in _RAW_ATTRS)
+
+def _decompress(info, raw):
+    if info.compress_type == zipfile.ZIP_STORED: return bytes(raw)
+    if info.compress_type == zipfile.ZIP_DEFLATED: return zlib.decompress(raw, -15)
+    if info.compress_type == zipfile.ZIP_BZIP2: return bz2.decompress(raw)
+    raise NotImplementedError(f"Không chép được member nén kiểu {info.compress_type}: {info.filename}")
+
+def write_raw_member(zout, info, raw, level=None):
+    """Ghi member đã nén sẵn vào zout, giữ nguyên CRC, kích thước và kiểu nén gốc.
+    Khi không chép thẳng được (raw_copy_supported): giải nén rồi writestr cùng kiểu nén, mức level."""
+    zinfo = copy.copy(info)
+    if not raw_copy_supported(zout) or zout._writing:
+        zout.writestr(zinfo, _decompress(info, raw), compresslevel=level); return
+    zinfo.flag_bits &= ~0x08       # CRC/kích thước nằm ngay trong local header, không cần data descriptor
+    with zout._lock:
+        zout._writecheck(zinfo)
+        if zout._seekable: zout.fp.seek(zout.start_dir)
+        zout._didModify = True
+        zinfo.header_offset = zout.fp.tell()
+        zout.fp.write(zinfo.FileHeader())
+        zout.fp.write(raw)
+        zout.filelist.append(zinfo)
+        zout.NameToInfo[zinfo.filename] = zinfo
+        zout.start_dir = zout.fp.tell()
+
+def recompress_member(info, raw, compress_type, level=zlib.Z_DEFAULT_COMPRESSION):
+    """(ZipInfo, dữ liệu nén) của member chuyển sang compress_type (ZIP_STORED / ZIP_DEFLATED).
+    Member đã đúng kiểu, hoặc nén kiểu khác (bzip2, lzma), được giữ nguyên."""
+    kinds = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+    if info.compress_type == compress_type or info.compress_type not in kinds or compress_type not in kinds:
+        return info, raw
+    data = bytes(raw) if info.compress_type == zipfile.ZIP_STORED else zlib.decompress(raw, -15)
+    if compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15); data = compressor.compress(data) + compressor.flush()
+    zinfo = copy.copy(info)
+    zinfo.compress_type = compress_type; zinfo.compress_size = len(data); zinfo.flag_bits &= ~0x06
+    return zinfo, data
+
+def deflate_chunks(chunks, level=zlib.Z_DEFAULT_COMPRESSION, previous=None):
+    """Nén raw deflate từng đoạn độc lập (mỗi đoạn 1 bộ nén mới, kết thúc bằng full flush; đoạn cuối: finish):
+    nối các đoạn nén là 1 luồng deflate hợp lệ. previous: [(CRC, cỡ, bytes đã nén)] của lần nén trước -
+    đoạn cùng vị trí, cùng CRC và cỡ được dùng lại không nén. Trả về (các đoạn nén, [(CRC, cỡ)] từng đoạn, CRC cả member)."""
+    out = []; table = []; total_crc = 0; last = len(chunks) - 1
+    for i, chunk in enumerate(chunks):
+        crc = zlib.crc32(chunk); total_crc = zlib.crc32(chunk, total_crc)
+        old = previous[i] if previous and i < len(previous) else None
+        if old is not None and old[:2] == (crc, len(chunk)) and (i == last) == (i == len(previous) - 1):
+            data = old[2]
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_FINISH if i == last else zlib.Z_FULL_FLUSH)
+        out.append(data); table.append((crc, len(chunk)))
+    return out, table, total_crc
+
+def deflated_info(info, chunks, table, crc):
+    """ZipInfo (bản sao của info) cho dữ liệu nén của deflate_chunks"""
+    zinfo = copy.copy(info)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED; zinfo.CRC = crc
+    zinfo.file_size = sum(size for _, size in table); zinfo.compress_size = sum(len(data) for data in chunks)
+    return zinfo